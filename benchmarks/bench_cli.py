@@ -0,0 +1,98 @@
+
+# Cold start of the command-line entry point (traffic_cli.py). Saves a
+# seeded synthetic network as a snapshot, then times fresh interpreter
+# processes (best of --repeats):
+#   python -c pass                       interpreter start-up alone
+#   traffic_cli.py --help                argument parsing, no optimizer imports
+#   import traffic_optimizer             numpy and the optimizer module
+#   import networkx                      what an eager networkx import would add
+#   traffic_cli.py optimize ...          a one-generation run on the snapshot
+# Cold start is the optimize run's wall time minus its reported optimize
+# seconds: interpreter, imports, snapshot load and plan write. The script
+# exits with status 1 when it exceeds --budget seconds, or when the run
+# imported networkx. Bytecode is compiled first, as in an installed tree.
+#
+#   python benchmarks/bench_cli.py [--size 1000] [--kind grid] [--repeats 5] [--budget 1.0]
+
+import argparse
+import compileall
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CLI = os.path.join(ROOT, 'traffic_cli.py')
+
+def best_wall_time(command, repeats):
+    # Best wall time of `repeats` runs and the stdout of the last one
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True)
+        times.append(time.perf_counter() - start)
+    return min(times), result.stdout
+
+def run(size=1000, kind='grid', repeats=5, budget=1.0, generations=1):
+    from traffic_optimizer import generate_network
+
+    compileall.compile_dir(ROOT, maxlevels=0, quiet=1)
+    network = generate_network(kind, size, seed=0, backend='csr')
+    compiled = network.get_compiled_network()
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot = os.path.join(directory, 'network.snap')
+        plan = os.path.join(directory, 'plan.json')
+        network.save_snapshot(snapshot)
+        print(f"Network: {kind}, {compiled.num_nodes} nodes, {compiled.num_edges} edges; best of {repeats} runs")
+
+        for label, command in (
+            ("interpreter (python -c pass)", [sys.executable, '-c', 'pass']),
+            ("traffic_cli.py --help", [sys.executable, CLI, '--help']),
+            ("import traffic_optimizer", [sys.executable, '-c', 'import traffic_optimizer']),
+            ("import networkx (avoided)", [sys.executable, '-c', 'import networkx']),
+        ):
+            elapsed, _ = best_wall_time(command, repeats)
+            print(f"  {label:<32} {elapsed * 1000:7.1f} ms")
+
+        # Runs the CLI in-process under -c so the check sees its sys.modules
+        probe = ("import sys, traffic_cli; status = traffic_cli.main(sys.argv[1:]); "
+                 "module = sys.modules.get('networkx'); "
+                 "sys.stderr.write('networkx loaded\\n' if module is not None and type(module).__name__ != '_LazyModule' else ''); "
+                 "sys.exit(status)")
+        command = [sys.executable, '-c', probe, 'optimize', '--snapshot', snapshot, '--generations', str(generations),
+                   '--seed', '0', '--output', plan]
+        cold_starts = []
+        networkx_loaded = False
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True)
+            elapsed = time.perf_counter() - start
+            timings = json.loads(result.stdout)['timings']
+            cold_starts.append((elapsed - timings['optimize'], elapsed, timings))
+            networkx_loaded = networkx_loaded or 'networkx loaded' in result.stderr
+        cold_start, elapsed, timings = min(cold_starts, key=lambda run: run[0])
+        print(f"  {'traffic_cli.py optimize':<32} {elapsed * 1000:7.1f} ms (start-up {timings['startup'] * 1000:.1f}, "
+              f"load {timings['load'] * 1000:.1f}, optimize {timings['optimize'] * 1000:.1f}, write {timings['write'] * 1000:.1f} ms)")
+
+    print(f"Cold start: {cold_start * 1000:.1f} ms (budget {budget * 1000:.0f} ms)")
+    status = 0
+    if networkx_loaded:
+        print("FAILED: the snapshot run imported networkx")
+        status = 1
+    if cold_start > budget:
+        print("FAILED: cold start over budget")
+        status = 1
+    return status
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold start of traffic_cli.py")
+    parser.add_argument('--size', type=int, default=1000, help="intersections of the synthetic network")
+    parser.add_argument('--kind', default='grid')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=1.0, help="cold start budget in seconds")
+    args = parser.parse_args()
+    sys.exit(run(args.size, args.kind, args.repeats, args.budget))
@@ -0,0 +1,82 @@
+
+# Compares the dict-based EnhancedTrafficSimulator path walk with the
+# array-based CompiledTrafficSimulator on the same trips and candidate, and
+# checks that both produce the same travel times and stop probabilities.
+#
+#   python benchmarks/bench_compiled_fitness.py [grid_size] [num_trips]
+
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from traffic_optimizer import (TrafficNetwork, EnhancedTrafficSimulator, CompiledTrafficSimulator, CompiledRouteSet,
+                               generate_grid_gis_data, generate_sample_traffic_light_locations, generate_sample_vehicle_count_data)
+
+def build_grid_network(grid_size):
+    # Two-way grid with a light at every intersection that has enough approaches
+    network = TrafficNetwork()
+    network.load_gis_data(generate_grid_gis_data(grid_size, grid_size))
+    traffic_light_locations = generate_sample_traffic_light_locations(network.graph, num_lights=grid_size * grid_size)
+    network.load_traffic_light_locations(traffic_light_locations)
+    network.load_vehicle_count_data(generate_sample_vehicle_count_data(traffic_light_locations, avg_daily_count=200))
+    return network
+
+def random_candidate(network):
+    speed_limits = {(u, v): random.uniform(30, 100) for u, v in network.graph.edges()}
+    cycles = {}
+    for light_node, light_info in network.traffic_lights.items():
+        cycles[light_node] = {}
+        for approach in light_info['approaches']:
+            cycles[light_node][approach] = {'green': random.uniform(20, 60), 'yellow': random.uniform(2, 5), 'red': random.uniform(20, 60)}
+    return speed_limits, cycles
+
+def run(grid_size=20, num_trips=2000, repeats=5):
+    random.seed(0)
+    network = build_grid_network(grid_size)
+    speed_limits, cycles = random_candidate(network)
+
+    dict_simulator = EnhancedTrafficSimulator(network)
+    compiled_simulator = CompiledTrafficSimulator(network)
+    compiled = network.get_compiled_network()
+    route_cache = compiled.route_cache
+
+    od_pairs = []
+    while len(od_pairs) < num_trips:
+        start_node, end_node = random.sample(route_cache.nodes, 2)
+        if route_cache.distance(start_node, end_node) != float('inf'):
+            od_pairs.append((start_node, end_node))
+    paths = [route_cache.path(start_node, end_node) for start_node, end_node in od_pairs]
+    route_set = CompiledRouteSet(compiled, [compiled.route_edges(start_node, end_node) for start_node, end_node in od_pairs])
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        dict_times = np.array([dict_simulator.calculate_travel_time(path, speed_limits, cycles) for path in paths])
+        dict_stops = np.array([sum(dict_simulator.stop_probabilities(path, cycles)) for path in paths])
+    dict_elapsed = (time.perf_counter() - start) / repeats
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        speeds = compiled.encode_speed_limits(speed_limits)
+        phases = compiled.encode_cycles(cycles)
+        compiled_times = compiled_simulator.trip_travel_times(route_set, speeds, phases)
+        compiled_stops = compiled_simulator.trip_stop_probabilities(route_set, phases)
+    compiled_elapsed = (time.perf_counter() - start) / repeats
+
+    assert np.allclose(dict_times, compiled_times, rtol=1e-9, atol=0), "travel times differ"
+    assert np.allclose(dict_stops, compiled_stops, rtol=1e-9, atol=1e-12), "stop probabilities differ"
+
+    print(f"Network: {network.graph.number_of_nodes()} nodes, {compiled.num_edges} edges, {compiled.num_approaches} signal approaches")
+    print(f"Trips: {num_trips}, {len(route_set.edge_ids)} trip-edge entries")
+    print(f"Dict-based:  {dict_elapsed * 1000:.2f} ms per evaluation")
+    print(f"Compiled:    {compiled_elapsed * 1000:.2f} ms per evaluation (including encoding)")
+    print(f"Speedup:     {dict_elapsed / compiled_elapsed:.1f}x")
+    print("Results match.")
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    run(*args)
@@ -0,0 +1,58 @@
+
+# Loads the same two-way grid through TrafficNetwork(backend='networkx') and
+# TrafficNetwork(backend='csr') and compares load time, memory held by the
+# graph (tracemalloc, measured in a separate pass) and single-source
+# shortest-path time. Routes from both backends are checked to be identical.
+#
+#   python benchmarks/bench_graph_backend.py [grid_size] [num_sources]
+
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from traffic_optimizer import TrafficNetwork, generate_grid_gis_data
+
+def load(backend, segments):
+    network = TrafficNetwork(backend)
+    network.load_gis_data(segments)
+    network.get_graph_backend()
+    return network
+
+def run(grid_size=225, num_sources=20):
+    random.seed(0)
+    segments = list(generate_grid_gis_data(grid_size, grid_size))
+    networks = {}
+    for backend in ('networkx', 'csr'):
+        gc.collect()
+        tracemalloc.start()
+        network = load(backend, segments)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del network
+
+        gc.collect()
+        start = time.perf_counter()
+        network = load(backend, segments)
+        load_elapsed = time.perf_counter() - start
+        graph = network.get_graph_backend()
+        sources = range(0, graph.number_of_nodes(), graph.number_of_nodes() // num_sources)[:num_sources]
+        start = time.perf_counter()
+        trees = [graph.shortest_path_tree(source) for source in sources]
+        route_elapsed = (time.perf_counter() - start) / len(trees)
+        networks[backend] = trees
+        print(f"{backend:>8}: {graph.number_of_nodes()} nodes, {graph.number_of_edges()} edges, load {load_elapsed:.2f} s, "
+              f"{memory / 1e6:.1f} MB, shortest-path tree {route_elapsed * 1000:.1f} ms")
+    for (pred_a, dist_a), (pred_b, dist_b) in zip(networks['networkx'], networks['csr']):
+        assert np.array_equal(pred_a, pred_b) and np.array_equal(dist_a, dist_b), "routes differ"
+    print("Routes match.")
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    run(*args)
@@ -0,0 +1,122 @@
+
+# Delta re-evaluation of mutated children (DeltaEvaluator) against full
+# evaluation on the same trips. A scored parent population is mutated in a
+# few genes per child (local mutations); both evaluators score the children
+# and must agree exactly. Reports time per child (median of interleaved
+# repeats) and the share of trips the delta path had to recompute, and
+# fails unless the delta path is at least MIN_SPEEDUP times faster with one
+# mutated gene and no slower where it falls back to full evaluation. Then
+# runs the GA with incremental=False (the default) and True on one trip
+# sample, with the same results required. Children of uniform crossover
+# (mutation_only=0) differ from both parents in many genes, so they must
+# skip the delta path and the run must be no slower; mutation-only children
+# (mutation_only=1) must be scored from their parent's records and the run
+# must be faster.
+#
+#   python benchmarks/bench_incremental.py [grid_size] [num_vehicles] [population_size]
+
+import os
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from traffic_optimizer import CompiledTrafficSimulator, DeltaEvaluator, TrafficOptimizer, TripSampler
+from bench_compiled_fitness import build_grid_network
+
+# Slack on "no slower" for timing noise
+TOLERANCE = 1.05
+# Required speedup of the delta path with one mutated gene
+MIN_SPEEDUP = 2.0
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+def run(grid_size=60, num_vehicles=2000, population_size=20, repeats=15, generations=20):
+    random.seed(0)
+    network = build_grid_network(grid_size)
+    compiled = network.get_compiled_network()
+    simulator = CompiledTrafficSimulator(network)
+    lower, upper = TrafficOptimizer(network, simulator).gene_bounds(compiled)
+    rng = np.random.default_rng(0)
+    trip_sample = TripSampler(num_vehicles).sample(network, 0)
+    parents = rng.uniform(lower, upper, size=(population_size, compiled.num_genes))
+    simulator.evaluate_population(parents, trip_sample) # Route the trips outside the timed runs
+    print(f"Network: {compiled.num_edges} edges, {compiled.num_approaches} signal approaches, {len(trip_sample.od_pairs)} trips")
+
+    failures = []
+    for genes_mutated in (1, 10, 100):
+        children = parents.copy()
+        for child in children:
+            genes = rng.choice(compiled.num_genes, genes_mutated, replace=False)
+            child[genes] = rng.uniform(lower[genes], upper[genes])
+
+        delta = DeltaEvaluator(simulator)
+        delta.evaluate_population(parents, trip_sample)
+        delta.evaluate_population(children, trip_sample, (parents, parents)) # Builds the edge -> trips index
+        # Full and delta runs alternate and both follow a parent evaluation
+        # (which the delta run needs for its records), so they see the same
+        # machine load and cache state
+        full_times, delta_times = [], []
+        for _ in range(repeats):
+            simulator.evaluate_population(parents, trip_sample)
+            elapsed, full = timed(lambda: simulator.evaluate_population(children, trip_sample))
+            full_times.append(elapsed)
+            delta.evaluate_population(parents, trip_sample) # The parents' records are the bases
+            delta.stats = dict.fromkeys(delta.stats, 0)
+            elapsed, incremental = timed(lambda: delta.evaluate_population(children, trip_sample, (parents, parents)))
+            delta_times.append(elapsed)
+        full_elapsed, delta_elapsed = statistics.median(full_times), statistics.median(delta_times)
+
+        assert all(np.array_equal(a, b) for a, b in zip(full, incremental)), "results differ"
+        recomputed = delta.stats['trips_recomputed'] / delta.stats['trips_total']
+        speedup = full_elapsed / delta_elapsed
+        print(f"  {genes_mutated:>3} genes mutated: full {full_elapsed / population_size * 1000:.2f} ms/child, "
+              f"delta {delta_elapsed / population_size * 1000:.2f} ms/child ({speedup:.1f}x), "
+              f"{recomputed:.1%} of trips recomputed, {delta.stats['full']} full fallbacks")
+        if genes_mutated == 1 and speedup < MIN_SPEEDUP:
+            failures.append(f"delta path under {MIN_SPEEDUP}x faster with {genes_mutated} gene mutated ({speedup:.2f}x)")
+        elif speedup * TOLERANCE < 1:
+            failures.append(f"delta evaluator slower than full with {genes_mutated} genes mutated ({speedup:.2f}x)")
+    print("Results match.")
+
+    def optimize(incremental, mutation_only):
+        optimizer = TrafficOptimizer(network, simulator)
+        result = optimizer.genetic_algorithm_optimize(generations=generations, population_size=population_size, seed=0,
+                                                      trip_sampler=TripSampler(num_vehicles), resample_trips=False,
+                                                      incremental=incremental, mutation_only=mutation_only, verbose=False)
+        return result, optimizer.run_stats
+    optimize(False, 0.0) # Routes the GA's trip sample
+    for mutation_only in (0.0, 1.0):
+        runs = {False: [], True: []}
+        for _ in range(max(3, repeats // 3)):
+            for incremental in (False, True):
+                runs[incremental].append(timed(lambda: optimize(incremental, mutation_only)))
+        plain_elapsed = statistics.median(elapsed for elapsed, _ in runs[False])
+        incremental_elapsed = statistics.median(elapsed for elapsed, _ in runs[True])
+        (plain, _), (result, run_stats) = runs[False][0][1], runs[True][0][1]
+        stats = run_stats['incremental']
+        print(f"GA, {generations} generations of {population_size}, mutation_only={mutation_only}: "
+              f"incremental=False {plain_elapsed:.2f} s, incremental=True {incremental_elapsed:.2f} s; {stats}")
+        if plain[1:] != result[1:]:
+            failures.append(f"GA results differ with mutation_only={mutation_only}")
+        if mutation_only == 0 and incremental_elapsed > plain_elapsed * TOLERANCE:
+            failures.append(f"GA with incremental=True slower than without ({incremental_elapsed:.2f} s vs {plain_elapsed:.2f} s)")
+        if mutation_only > 0 and stats['delta'] < stats['full']:
+            failures.append(f"GA scored only {stats['delta']} mutation-only children from their parent's records ({stats['full']} in full)")
+        if mutation_only > 0 and incremental_elapsed >= plain_elapsed:
+            failures.append(f"GA with incremental=True not faster on mutation-only children ({incremental_elapsed:.2f} s vs {plain_elapsed:.2f} s)")
+
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    sys.exit(run(*args))
@@ -0,0 +1,52 @@
+
+# Island-model GA (IslandOptimizer) against single populations. Runs one
+# population of population_size, one of num_islands * population_size (the
+# same evaluations as the islands) and num_islands islands of
+# population_size with ring migration, then scores every run's best plan on
+# the same held-out trip sample so the comparison is not biased by the trips
+# each run happened to draw. Islands run in parallel, so with as many cores
+# as islands their wall time is close to the small single population's.
+#
+#   python benchmarks/bench_islands.py [grid_size] [num_islands] [generations] [population_size]
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from traffic_optimizer import CompiledTrafficSimulator, TrafficOptimizer, TripSampler
+from traffic_islands import IslandOptimizer
+from bench_compiled_fitness import build_grid_network
+
+def held_out_fitness(simulator, solution, trip_sample):
+    velocity, stops = simulator.evaluate_solution(*solution, trip_sample=trip_sample)
+    return velocity - stops * 0.1, velocity, stops
+
+def run(grid_size=8, num_islands=4, generations=30, population_size=10, num_vehicles=200):
+    random.seed(0)
+    network = build_grid_network(grid_size)
+    compiled = network.get_compiled_network()
+    simulator = CompiledTrafficSimulator(network)
+    held_out = TripSampler(2000).sample(network, 12345)
+    print(f"Network: {compiled.num_nodes} nodes, {compiled.num_genes} genes; {generations} generations, {num_vehicles} trips per sample, "
+          f"held-out sample of {len(held_out.od_pairs)} trips")
+
+    runs = [
+        (f"single population of {population_size}", TrafficOptimizer(network, simulator), population_size),
+        (f"single population of {num_islands * population_size}", TrafficOptimizer(network, simulator), num_islands * population_size),
+        (f"{num_islands} islands of {population_size}, ring", IslandOptimizer(network, simulator, num_islands), population_size),
+    ]
+    for label, optimizer, size in runs:
+        start = time.perf_counter()
+        solution, velocity, stops = optimizer.genetic_algorithm_optimize(
+            generations=generations, population_size=size, seed=0, trip_sampler=TripSampler(num_vehicles), verbose=False)
+        elapsed = time.perf_counter() - start
+        fitness, velocity, stops = held_out_fitness(simulator, solution, held_out)
+        print(f"  {label:<32} held-out fitness {fitness:7.3f} (velocity {velocity:.2f}, stops {stops:.2f}), "
+              f"{optimizer.run_stats['evaluations']:>5} evaluations, {elapsed:6.2f} s")
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    run(*args)
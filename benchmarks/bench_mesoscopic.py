@@ -0,0 +1,72 @@
+# Throughput of MesoscopicTrafficSimulator: simulates num_vehicles trips
+# departing over a one-hour horizon on a two-way grid and reports events and
+# vehicles processed per second of wall time. Trip sampling (one
+# shortest-path tree per origin) and building the trips' routes are timed
+# separately from the event loop. The default demand is one the random,
+# uncoordinated signal plans of the sample data can carry: much heavier
+# demand (e.g. 40000 vehicles on the 30x30 grid) ends in gridlock, which
+# would time a network of stopped queues instead of traffic, so the run
+# fails unless min_completed of the vehicles arrive. Then checks that the
+# genetic algorithm, given no trip_sampler, simulates the simulator's own
+# num_vehicles trips per evaluation.
+#
+#   python benchmarks/bench_mesoscopic.py [grid_size] [num_vehicles]
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from traffic_optimizer import MesoscopicTrafficSimulator, TrafficOptimizer
+from bench_compiled_fitness import build_grid_network, random_candidate
+
+def run(grid_size=30, num_vehicles=20000, min_completed=0.99):
+    random.seed(0)
+    network = build_grid_network(grid_size)
+    speed_limits, cycles = random_candidate(network)
+    simulator = MesoscopicTrafficSimulator(network, num_vehicles=num_vehicles, horizon=3600)
+
+    start = time.perf_counter()
+    trip_sample = simulator.trip_sampler.sample(network, 0)
+    sampling_elapsed = time.perf_counter() - start
+    compiled = network.get_compiled_network()
+    start = time.perf_counter()
+    trip_sample.get_route_set(compiled)
+    routing_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    average_velocity, average_stops = simulator.evaluate_solution(speed_limits, cycles, trip_sample=trip_sample)
+    total_elapsed = time.perf_counter() - start
+    stats = simulator.last_run
+
+    print(f"Network: {network.graph.number_of_nodes()} nodes, {compiled.num_edges} edges, {compiled.num_approaches} signal approaches")
+    print(f"Vehicles: {stats['vehicles']} ({stats['completed']} completed, {stats['incomplete']} still in the network)")
+    print(f"Trip sampling: {sampling_elapsed:.2f} s, routing: {routing_elapsed:.2f} s")
+    print(f"Event loop: {stats['events']} events in {stats['wall_time']:.2f} s, simulated {stats['simulated_time']:.0f} s")
+    print(f"  {stats['events_per_sec']:,.0f} events/sec, {stats['vehicles_per_sec']:,.0f} vehicles/sec")
+    print(f"evaluate_solution total: {total_elapsed:.2f} s")
+    print(f"Average velocity {average_velocity:.2f} m/s, {average_stops:.2f} stops per vehicle")
+    if stats['completed'] < min_completed * stats['vehicles']:
+        print(f"FAILED: gridlock, only {stats['completed']} of {stats['vehicles']} vehicles arrived")
+        return 1
+    check_ga_trip_count()
+    return 0
+
+def check_ga_trip_count(grid_size=5, vehicle_counts=(50, 400)):
+    network = build_grid_network(grid_size)
+    fitnesses = []
+    for num_vehicles in vehicle_counts:
+        simulator = MesoscopicTrafficSimulator(network, num_vehicles=num_vehicles)
+        _, velocity, stops = TrafficOptimizer(network, simulator).genetic_algorithm_optimize(
+            generations=1, population_size=4, seed=0, verbose=False)
+        # (Samples drop the few trips without a route)
+        assert 0.9 * num_vehicles <= simulator.last_run['vehicles'] <= num_vehicles, "the GA ignored the simulator's num_vehicles"
+        fitnesses.append(velocity - stops * 0.1)
+    assert fitnesses[0] != fitnesses[1], "GA fitness does not depend on num_vehicles"
+    print("GA fitness with " + ", ".join(f"num_vehicles={count}: {fitness:.3f}" for count, fitness in zip(vehicle_counts, fitnesses)))
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    sys.exit(run(*args))
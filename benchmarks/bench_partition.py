@@ -0,0 +1,104 @@
+
+# Spatial decomposition (PartitionedOptimizer) against one GA over the whole
+# network, with the same generations and population size per run. Every
+# run's plan is scored on the same held-out city-wide trip sample. The
+# district runs use one process each when there are enough cores; the
+# reported time is wall time on this machine. Then checks that districts
+# of a ScenarioTrafficSimulator score under the same time-of-day scenarios,
+# that 'exchange' districts score their segments along the travel-time
+# routes they were cut from, and that importing traffic_partition leaves
+# networkx unloaded.
+#
+#   python benchmarks/bench_partition.py [grid_size] [num_partitions] [generations] [population_size]
+
+import os
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from traffic_optimizer import (CompiledTrafficSimulator, ScenarioTrafficSimulator, TrafficOptimizer, TripSampler,
+                               scenarios_from_count_store)
+from traffic_partition import PartitionedOptimizer, SegmentTripSampler
+from bench_compiled_fitness import build_grid_network, random_candidate
+from bench_scenarios import diurnal_counts
+
+def run(grid_size=20, num_partitions=4, generations=40, population_size=10, num_vehicles=200):
+    random.seed(0)
+    network = build_grid_network(grid_size)
+    compiled = network.get_compiled_network()
+    simulator = CompiledTrafficSimulator(network)
+    held_out = TripSampler(2000).sample(network, 12345)
+    print(f"Network: {compiled.num_nodes} nodes, {compiled.num_genes} genes; {generations} generations of {population_size}, "
+          f"held-out sample of {len(held_out.od_pairs)} trips")
+    velocity, stops = simulator.evaluate_solution(*compiled.decode_genome(compiled.encode_solution({}, {})), trip_sample=held_out)
+    print(f"  {'current plan':<28} held-out fitness {velocity - stops * 0.1:7.3f} (velocity {velocity:.2f}, stops {stops:.2f})")
+
+    runs = [('whole network', TrafficOptimizer(network, simulator)),
+            (f"{num_partitions} districts, fixed", PartitionedOptimizer(network, simulator, num_partitions))]
+    for label, optimizer in runs:
+        start = time.perf_counter()
+        solution, velocity, stops = optimizer.genetic_algorithm_optimize(
+            generations=generations, population_size=population_size, seed=0, trip_sampler=TripSampler(num_vehicles), verbose=False)
+        elapsed = time.perf_counter() - start
+        velocity, stops = simulator.evaluate_solution(*solution, trip_sample=held_out)
+        print(f"  {label:<28} held-out fitness {velocity - stops * 0.1:7.3f} (velocity {velocity:.2f}, stops {stops:.2f}), "
+              f"{optimizer.run_stats['evaluations']:>5} evaluations, {elapsed:6.2f} s")
+        if isinstance(optimizer, PartitionedOptimizer):
+            genes = [district['genes'] for district in optimizer.run_stats['districts']]
+            print(f"  {'':<28} {optimizer.run_stats['cut_edges']} cut edges, {min(genes)}-{max(genes)} genes per district")
+    check_scenario_districts()
+    check_exchange_segments()
+    check_lazy_networkx()
+
+def check_scenario_districts(grid_size=6, num_partitions=2):
+    network = build_grid_network(grid_size)
+    network.load_vehicle_count_data(diurnal_counts(network.vehicle_counts, days=1))
+    simulator = ScenarioTrafficSimulator(network, scenarios_from_count_store(network), aggregate='worst')
+    optimizer = PartitionedOptimizer(network, simulator, num_partitions)
+    compiled = network.get_compiled_network()
+    district = optimizer.district_simulator(optimizer.district_network(compiled, optimizer.edge_owners(compiled), 0))
+    assert type(district) is ScenarioTrafficSimulator and district.scenarios is simulator.scenarios and district.aggregate == 'worst'
+    solution, _, _ = optimizer.genetic_algorithm_optimize(generations=2, population_size=4, seed=0,
+                                                          trip_sampler=TripSampler(50), verbose=False)
+    assert solution, "no plan from the scenario districts"
+    print(f"{num_partitions} districts of a ScenarioTrafficSimulator ({simulator.scenarios.num_scenarios} scenarios): ok")
+
+def check_exchange_segments(grid_size=8, num_partitions=2, num_trips=400):
+    # Under a random plan the fastest routes differ from the shortest ones;
+    # every district sample must keep the edges of its cut segments
+    random.seed(1)
+    network = build_grid_network(grid_size)
+    optimizer = PartitionedOptimizer(network, CompiledTrafficSimulator(network), num_partitions, boundary='exchange')
+    compiled = network.get_compiled_network()
+    owners = optimizer.edge_owners(compiled)
+    od_pairs = TripSampler(num_trips).sample(network, 0).od_pairs
+    genome = compiled.encode_solution(*random_candidate(network))
+    routes = optimizer.trip_routes(compiled, od_pairs, genome)
+    rerouted = sum(1 for (start_node, end_node), route in zip(od_pairs, routes)
+                   if not np.array_equal(route, compiled.route_edges(start_node, end_node)))
+    segments, segment_routes = optimizer.district_segments(compiled, owners, routes)
+    for part in range(num_partitions):
+        district = optimizer.district_network(compiled, owners, part).get_compiled_network()
+        sample = SegmentTripSampler(segments[part], len(segments[part]), part, segment_routes[part]).sample(None, 0)
+        route_set = sample.get_route_set(district)
+        for trip, route in enumerate(sample.routes):
+            edges = route_set.edge_ids[route_set.indptr[trip]:route_set.indptr[trip + 1]]
+            assert [district.edges[e] for e in edges.tolist()] == route, "district re-routed a boundary segment"
+    assert rerouted, "the plan did not change any route"
+    print(f"Exchange segments follow the travel-time routes ({rerouted} of {len(routes)} trips off their shortest path): ok")
+
+def check_lazy_networkx():
+    probe = ("import sys, traffic_partition; module = sys.modules.get('networkx'); "
+             "sys.exit(int(module is not None and type(module).__name__ != '_LazyModule'))")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    assert subprocess.run([sys.executable, '-c', probe], cwd=root).returncode == 0, "importing traffic_partition loaded networkx"
+    print("import traffic_partition leaves networkx unloaded: ok")
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    run(*args)
@@ -0,0 +1,86 @@
+
+# Travel-time routing with ReroutingTrafficSimulator. First checks that the
+# shortest-path trees DynamicShortestPaths repairs after random weight
+# changes (including edges that become impassable) equal trees built from
+# scratch; then times the evaluation of a chain of candidates that each
+# differ from the previous one in a few genes, as GA children differ from
+# their parents, against rebuilding every tree for every candidate.
+#
+#   python benchmarks/bench_rerouting.py [grid_size] [num_vehicles] [num_candidates]
+
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from traffic_optimizer import DynamicShortestPaths, ReroutingTrafficSimulator, TrafficOptimizer, TripSampler
+from bench_compiled_fitness import build_grid_network
+
+def check_repairs(network, rng, num_sources=20, rounds=30):
+    simulator = ReroutingTrafficSimulator(network)
+    compiled = network.get_compiled_network()
+    lower, upper = TrafficOptimizer(network, None).gene_bounds(compiled)
+    speeds, phases = compiled.split_genomes(rng.uniform(lower, upper))
+    weights = simulator.network_edge_times(speeds, phases)
+    sources = rng.choice(compiled.num_nodes, num_sources, replace=False).tolist()
+    router = DynamicShortestPaths(simulator.get_router(compiled, sources, weights).graph, sources, weights, max_changed=1.0)
+    for _ in range(rounds):
+        weights = weights.copy()
+        changed = rng.choice(len(weights), int(rng.integers(1, 20)), replace=False)
+        weights[changed] *= rng.uniform(0.2, 5.0, len(changed))
+        weights[changed[:len(changed) // 5]] = np.inf
+        router.update(weights)
+        reference = DynamicShortestPaths(router.graph, sources, weights)
+        assert np.allclose(router.dist, reference.dist, rtol=1e-12, atol=0), "repaired distances differ"
+        # Ties may pick different routes, but every tree edge must be tight
+        reached = np.isfinite(router.dist) & (router.pred >= 0)
+        rows, nodes = np.nonzero(reached)
+        edges = router.pred[rows, nodes]
+        tails = router.graph.edge_source[edges]
+        assert np.allclose(router.dist[rows, tails] + weights[edges], router.dist[rows, nodes], rtol=1e-12, atol=0), "repaired tree is not a shortest-path tree"
+    print(f"Repair check: {rounds} rounds over {num_sources} trees match a rebuild ({router.stats['repairs']} repairs).")
+
+def run(grid_size=20, num_vehicles=300, num_candidates=20, genes_changed=(1, 10, 100)):
+    random.seed(0)
+    rng = np.random.default_rng(0)
+    network = build_grid_network(grid_size)
+    compiled = network.get_compiled_network()
+    print(f"Network: {compiled.num_nodes} nodes, {compiled.num_edges} edges, {compiled.num_approaches} signal approaches")
+    check_repairs(network, rng)
+
+    lower, upper = TrafficOptimizer(network, None).gene_bounds(compiled)
+    trip_sample = TripSampler(num_vehicles).sample(network, 0)
+    origins = len({start_node for start_node, end_node in trip_sample.od_pairs})
+    print(f"Trips: {len(trip_sample.od_pairs)} from {origins} origins, {num_candidates} candidates per run")
+    for num_changed in genes_changed:
+        population = np.empty((num_candidates, compiled.num_genes))
+        population[0] = rng.uniform(lower, upper)
+        for i in range(1, num_candidates):
+            population[i] = population[i - 1]
+            genes = rng.choice(compiled.num_genes, num_changed, replace=False)
+            population[i, genes] = rng.uniform(lower[genes], upper[genes])
+
+        simulator = ReroutingTrafficSimulator(network)
+        simulator.evaluate_population(population[:1], trip_sample) # Initial trees
+        start = time.perf_counter()
+        repaired = simulator.evaluate_population(population[1:], trip_sample)
+        repair_elapsed = (time.perf_counter() - start) / (num_candidates - 1)
+
+        start = time.perf_counter()
+        rebuilt = [ReroutingTrafficSimulator(network).evaluate_population(genome[np.newaxis], trip_sample) for genome in population[1:]]
+        rebuild_elapsed = (time.perf_counter() - start) / (num_candidates - 1)
+
+        assert np.allclose(repaired[0], [r[0][0] for r in rebuilt]), "velocities differ"
+        assert np.allclose(repaired[1], [r[1][0] for r in rebuilt]), "stops differ"
+        stats = simulator._router.stats
+        print(f"  {num_changed:>4} genes changed: repair {repair_elapsed * 1000:8.1f} ms, rebuild {rebuild_elapsed * 1000:8.1f} ms per candidate "
+              f"({rebuild_elapsed / repair_elapsed:.1f}x, {stats['repairs']} repairs, {stats['rebuilds']} full rebuilds)")
+    print("Results match.")
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    run(*args)
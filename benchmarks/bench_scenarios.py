@@ -0,0 +1,126 @@
+
+# Time-of-day demand scenarios (ScenarioTrafficSimulator). Builds two days
+# of synthetic quarter-hour counts with morning and evening peaks, so the
+# CountStore yields 96 scenarios, then
+#   - times one vectorized pass over all scenarios against a loop that
+#     evaluates the population once per quarter-hour (and checks both agree)
+#   - optimizes on the static (mean hourly) counts and with the 'weighted'
+#     and 'worst' scenario aggregates, and scores every run's best plan under
+#     all scenarios on the same held-out trip sample.
+# Before that it checks that the counts load the same when their time bins
+# arrive out of order across chunks (the store has to grow to the left).
+#
+#   python benchmarks/bench_scenarios.py [grid_size] [generations] [population_size]
+
+import math
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from traffic_optimizer import (CompiledTrafficSimulator, ScenarioTrafficSimulator, TrafficNetwork, TrafficOptimizer, TripSampler,
+                               scenarios_from_count_store)
+from bench_compiled_fitness import build_grid_network
+
+def diurnal_counts(vehicle_counts, days=2, interval=900, seed=1):
+    # Timed count records: the hourly volume shaped by a morning (8:00) and
+    # an evening (17:30) peak, with +-20% noise per record
+    rng = random.Random(seed)
+    records = []
+    for day in range(days):
+        for slot in range(86400 // interval):
+            hour = slot * interval / 3600
+            shape = 0.4 + 2.0 * math.exp(-(hour - 8) ** 2 / 2) + 1.6 * math.exp(-(hour - 17.5) ** 2 / 2)
+            for light_node, counts in vehicle_counts.items():
+                for approach, count in counts.items():
+                    records.append({'light': light_node, 'approach': approach, 'time': day * 86400 + slot * interval,
+                                    'count': count * interval / 3600 * shape * rng.uniform(0.8, 1.2)})
+    return records
+
+def check_out_of_order_counts(vehicle_counts, days=4, interval=900, bins_per_chunk=32):
+    # Loads the last day first, in chunks of 32 bins, then the others: the
+    # store grows past the day's 96 bins to 128, and the first day lands
+    # further left of them than that capacity. The store must match one
+    # loaded in time order.
+    records = diurnal_counts(vehicle_counts, days=days, interval=interval)
+    last_day = [record for record in records if record['time'] >= (days - 1) * 86400]
+    chunk_size = bins_per_chunk * len(records) // (days * 86400 // interval)
+    stores = []
+    for ordered in (records, last_day + records[:len(records) - len(last_day)]):
+        network = TrafficNetwork()
+        network.load_vehicle_count_data(ordered, interval=interval, chunk_size=chunk_size)
+        stores.append(network.count_store)
+    expected, store = stores
+    assert store.first_bin == expected.first_bin and store.num_bins == expected.num_bins, "out-of-order counts span other bins"
+    assert np.array_equal(store.observed(), expected.observed()), "out-of-order counts observed in other bins"
+    assert np.allclose(store.counts(), expected.counts()), "out-of-order counts differ"
+
+def per_scenario_loop(network, scenarios, population, trip_sample):
+    # The same results one quarter-hour at a time on CompiledTrafficSimulator
+    compiled = network.get_compiled_network()
+    simulator = CompiledTrafficSimulator(network)
+    static_rate = compiled.arrival_rate
+    velocities, stops = [], []
+    try:
+        for rates in scenarios.align(compiled):
+            compiled.arrival_rate = rates
+            trip_sample._route_set = None # Route sets copy the arrival rates
+            v, s = simulator.evaluate_population(population, trip_sample)
+            velocities.append(v)
+            stops.append(s)
+    finally:
+        compiled.arrival_rate = static_rate
+        trip_sample._route_set = None
+    return np.stack(velocities, axis=1), np.stack(stops, axis=1)
+
+def run(grid_size=8, generations=30, population_size=20, num_vehicles=200):
+    random.seed(0)
+    network = build_grid_network(grid_size)
+    check_out_of_order_counts(network.vehicle_counts)
+    network.load_vehicle_count_data(diurnal_counts(network.vehicle_counts))
+    scenarios = scenarios_from_count_store(network)
+    compiled = network.get_compiled_network()
+    held_out = TripSampler(2000).sample(network, 12345)
+    print(f"Network: {compiled.num_nodes} nodes, {compiled.num_approaches} approaches; {scenarios.num_scenarios} scenarios, "
+          f"held-out sample of {len(held_out.od_pairs)} trips")
+
+    simulator = ScenarioTrafficSimulator(network, scenarios)
+    lower, upper = TrafficOptimizer(network, None).gene_bounds(compiled)
+    population = np.random.default_rng(0).uniform(lower, upper, size=(population_size, compiled.num_genes))
+    trip_sample = TripSampler(num_vehicles).sample(network, 0)
+    simulator.evaluate_scenarios(population[:1], trip_sample) # Routes once for both timings
+    start = time.perf_counter()
+    velocities, stops = simulator.evaluate_scenarios(population, trip_sample)
+    vectorized = time.perf_counter() - start
+    start = time.perf_counter()
+    loop_velocities, loop_stops = per_scenario_loop(network, scenarios, population, trip_sample)
+    loop = time.perf_counter() - start
+    assert np.allclose(velocities, loop_velocities) and np.allclose(stops, loop_stops), "scenario pass differs from the loop"
+    print(f"{population_size} candidates x {scenarios.num_scenarios} scenarios: vectorized {vectorized * 1000:.1f} ms, "
+          f"per-scenario loop {loop * 1000:.1f} ms ({loop / vectorized:.1f}x)")
+
+    runs = [
+        ("static counts", CompiledTrafficSimulator(network)),
+        ("scenarios, weighted", ScenarioTrafficSimulator(network, scenarios, 'weighted')),
+        ("scenarios, worst", ScenarioTrafficSimulator(network, scenarios, 'worst')),
+    ]
+    print("Best plans under all scenarios (held-out trips):")
+    for label, run_simulator in runs:
+        optimizer = TrafficOptimizer(network, run_simulator)
+        start = time.perf_counter()
+        solution, velocity, stops = optimizer.genetic_algorithm_optimize(
+            generations=generations, population_size=population_size, seed=0, trip_sampler=TripSampler(num_vehicles), verbose=False)
+        elapsed = time.perf_counter() - start
+        report = simulator.scenario_report(*solution, trip_sample=held_out)
+        fitness = np.array(report['velocity']) - np.array(report['stops']) * 0.1
+        print(f"  {label:<20} weighted fitness {np.average(fitness, weights=scenarios.weights):7.3f}, "
+              f"worst {fitness.min():7.3f} (velocity {report['worst']['velocity']:.2f}, stops {report['worst']['stops']:.2f}), "
+              f"{elapsed:6.2f} s")
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    run(*args)
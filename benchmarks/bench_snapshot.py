@@ -0,0 +1,74 @@
+
+# Start-up cost of a network: loading the JSON-lines inputs and compiling
+# them versus loading a binary snapshot of the same network (memory-mapped
+# and read into memory) and compiling that.
+#
+#   python benchmarks/bench_snapshot.py [grid_size]
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from traffic_optimizer import TrafficNetwork
+from bench_compiled_fitness import build_grid_network
+
+def timed(load):
+    start = time.perf_counter()
+    network = load()
+    compiled = network.get_compiled_network()
+    return time.perf_counter() - start, network, compiled
+
+def run(grid_size=150):
+    random.seed(0)
+    source = build_grid_network(grid_size)
+    with tempfile.TemporaryDirectory() as directory:
+        segments_path = os.path.join(directory, 'segments.jsonl')
+        signals_path = os.path.join(directory, 'signals.jsonl')
+        counts_path = os.path.join(directory, 'counts.jsonl')
+        snapshot_path = os.path.join(directory, 'network.snap')
+        with open(segments_path, 'w') as f:
+            for u, v, data in source.graph.edges(data=True):
+                f.write(json.dumps({'from': u, 'to': v, 'length': data['length'], 'speed_limit': data['speed_limit']}) + '\n')
+        with open(signals_path, 'w') as f:
+            for light_node, light_info in source.traffic_lights.items():
+                for approach, phase in light_info['cycle_phases'].items():
+                    f.write(json.dumps(dict(phase, light=light_node, approach=approach)) + '\n')
+        with open(counts_path, 'w') as f:
+            for light_node, counts in source.vehicle_counts.items():
+                for approach, count in counts.items():
+                    f.write(json.dumps({'light': light_node, 'approach': approach, 'count': count}) + '\n')
+        source.save_snapshot(snapshot_path)
+
+        def from_files():
+            network = TrafficNetwork()
+            network.load_gis_data(segments_path)
+            network.load_traffic_light_locations(signals_path)
+            network.load_vehicle_count_data(counts_path)
+            return network
+
+        def from_snapshot(mmap):
+            def load():
+                network = TrafficNetwork()
+                network.load_snapshot(snapshot_path, mmap=mmap)
+                return network
+            return load
+
+        files_elapsed, network, compiled = timed(from_files)
+        expected = source.get_compiled_network()
+        print(f"Network: {compiled.num_nodes} nodes, {compiled.num_edges} edges, {compiled.num_approaches} signal approaches")
+        print(f"Snapshot size: {os.path.getsize(snapshot_path) / 1e6:.1f} MB")
+        print(f"JSON-lines load + compile:        {files_elapsed:.3f} s")
+        for name, mmap in (("memory-mapped", True), ("read into memory", False)):
+            elapsed, network, snapshot_compiled = timed(from_snapshot(mmap))
+            assert snapshot_compiled.edges == expected.edges and snapshot_compiled.approaches == expected.approaches
+            print(f"Snapshot ({name}) load + compile: {elapsed:.3f} s ({files_elapsed / elapsed:.1f}x faster)")
+            del network, snapshot_compiled # release the memory map before the directory is removed
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    run(*args)
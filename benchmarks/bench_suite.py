@@ -0,0 +1,209 @@
+
+# Reproducible benchmark suite over the synthetic networks of
+# generate_network. For every network kind and size it measures
+#   load_seconds         loading segments, signals and counts and compiling the network
+#   peak_memory_mb       tracemalloc peak of the same load (separate pass)
+#   first_evaluation_ms  first evaluate_solution on a trip sample, including routing
+#   evaluation_ms        median evaluate_solution once routes are cached
+#   generations_per_sec  genetic_algorithm_optimize throughput (one trip sample per run)
+# Timings are medians of --repeats runs (at least 5 for --compare). The
+# repeats take turns over all networks, so each median draws on runs spread
+# over the whole suite rather than on one burst, where a slow or fast spell
+# of the machine (a busy host, a collection) would move all of them.
+# Networks, trips and candidates are seeded, so runs on different commits
+# measure the same work. --output saves the results as JSON, with the
+# range of every timing over the repeats; --compare checks them against a
+# saved run and exits with status 1 when a metric got worse by more than
+# --threshold (relative), by more than the metric's noise floor (absolute:
+# milliseconds of load or evaluation time, or of time per generation, so
+# jitter on small networks does not count), and beyond the slowest of the
+# baseline's own repeats.
+#
+#   python benchmarks/bench_suite.py [--sizes 100,1000,10000] [--kinds grid,radial,geometric]
+#                                    [--output results.json] [--compare baseline.json]
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from traffic_optimizer import (NETWORK_KINDS, CompiledTrafficSimulator, TrafficNetwork, TrafficOptimizer, TripSampler,
+                               generate_gis_data, generate_network)
+
+# Metric name -> (higher is better, noise floor in the units of cost())
+METRICS = {
+    'load_seconds': (False, 5.0),
+    'peak_memory_mb': (False, 0.5),
+    'first_evaluation_ms': (False, 5.0),
+    'evaluation_ms': (False, 1.0),
+    'generations_per_sec': (True, 5.0),
+}
+MIN_COMPARE_REPEATS = 5
+EVALUATIONS_PER_REPEAT = 5 # Steady-state evaluations are cheap, so each repeat times several
+
+def cost(metric, value):
+    # Timings in milliseconds (per generation for the throughput), memory in MB
+    if metric == 'load_seconds':
+        return value * 1000
+    if metric == 'generations_per_sec':
+        return 1000 / value
+    return value
+
+def load(segments, traffic_lights, vehicle_counts, backend):
+    network = TrafficNetwork(backend=backend)
+    network.load_gis_data(segments)
+    network.load_traffic_light_locations(traffic_lights)
+    network.load_vehicle_count_data(vehicle_counts)
+    network.get_compiled_network()
+    return network
+
+def prepare(kind, size, backend='networkx', seed=0):
+    # Records and peak load memory of one network. The generated network
+    # fixes signals and counts; segments are regenerated from the same seed
+    # so loading is timed on plain records.
+    reference = generate_network(kind, size, seed=seed, backend=backend)
+    segments = list(generate_gis_data(kind, size, rng=random.Random(seed)))
+    case = {'kind': kind, 'size': size, 'backend': backend, 'records': (segments, reference.traffic_lights, reference.vehicle_counts),
+            'network': None, 'samples': {'load_seconds': [], 'first_evaluation_ms': [], 'evaluation_ms': [], 'ga_seconds': []}}
+    del reference
+
+    gc.collect()
+    tracemalloc.start()
+    load(*case['records'], backend)
+    case['peak_memory_mb'] = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return case
+
+def sample(case, seed=0, num_vehicles=200, generations=5, population_size=10):
+    # One repeat of every timing. The load starts from scratch, so the first
+    # evaluation routes from scratch; the steady-state evaluation and the GA
+    # run on the network kept from the first repeat, with routes cached.
+    samples = case['samples']
+    gc.collect()
+    start = time.perf_counter()
+    network = load(*case['records'], case['backend'])
+    samples['load_seconds'].append(time.perf_counter() - start)
+    compiled = network.get_compiled_network()
+    simulator = CompiledTrafficSimulator(network, expected_stops=True)
+    lower, upper = TrafficOptimizer(network, None).gene_bounds(compiled)
+    candidate = compiled.decode_genome(np.random.default_rng(seed).uniform(lower, upper))
+    trip_sample = TripSampler(num_vehicles).sample(network, seed)
+    start = time.perf_counter()
+    simulator.evaluate_solution(*candidate, trip_sample=trip_sample)
+    samples['first_evaluation_ms'].append((time.perf_counter() - start) * 1000)
+    if case['network'] is None:
+        case['network'] = (network, simulator, candidate, trip_sample)
+    network, simulator, candidate, trip_sample = case['network']
+
+    for _ in range(EVALUATIONS_PER_REPEAT):
+        start = time.perf_counter()
+        simulator.evaluate_solution(*candidate, trip_sample=trip_sample)
+        samples['evaluation_ms'].append((time.perf_counter() - start) * 1000)
+
+    optimizer = TrafficOptimizer(network, simulator)
+    start = time.perf_counter()
+    optimizer.genetic_algorithm_optimize(generations=generations, population_size=population_size, seed=seed,
+                                         trip_sampler=TripSampler(num_vehicles), resample_trips=False, verbose=False)
+    samples['ga_seconds'].append(time.perf_counter() - start)
+
+def summarize(case, generations=5):
+    compiled = case['network'][0].get_compiled_network()
+    samples = dict(case['samples'])
+    samples['generations_per_sec'] = [generations / seconds for seconds in samples.pop('ga_seconds')]
+    return {
+        'kind': case['kind'], 'size': case['size'], 'backend': case['backend'],
+        'nodes': compiled.num_nodes, 'edges': compiled.num_edges, 'approaches': compiled.num_approaches,
+        'load_seconds': statistics.median(samples['load_seconds']),
+        'peak_memory_mb': case['peak_memory_mb'],
+        'first_evaluation_ms': statistics.median(samples['first_evaluation_ms']),
+        'evaluation_ms': statistics.median(samples['evaluation_ms']),
+        'generations_per_sec': statistics.median(samples['generations_per_sec']),
+        'spread': {metric: [min(values), max(values)] for metric, values in samples.items()},
+    }
+
+def compare(results, baseline, threshold):
+    # Prints metric changes against baseline; returns the regressions
+    baseline_runs = {(run['kind'], run['size'], run['backend']): run for run in baseline['results']}
+    regressions = []
+    for run in results['results']:
+        previous = baseline_runs.get((run['kind'], run['size'], run['backend']))
+        if previous is None:
+            continue
+        for metric, (higher_is_better, noise) in METRICS.items():
+            if not previous.get(metric):
+                continue
+            change = run[metric] / previous[metric] - 1
+            worse = -change if higher_is_better else change
+            # Slowest of the baseline's repeats (older results have no spread)
+            slowest = max((cost(metric, value) for value in previous.get('spread', {}).get(metric, [])), default=cost(metric, previous[metric]))
+            flag = "REGRESSION" if worse > threshold and abs(cost(metric, run[metric]) - cost(metric, previous[metric])) > noise and \
+                cost(metric, run[metric]) > slowest else ""
+            if flag:
+                regressions.append((run['kind'], run['size'], metric, change))
+            print(f"  {run['kind']:<10} {run['size']:>7} {metric:<20} {previous[metric]:12.3f} -> {run[metric]:12.3f} ({change:+7.1%}) {flag}")
+    return regressions
+
+def run(sizes=(100, 1000, 10000), kinds=NETWORK_KINDS, backend='networkx', seed=0, num_vehicles=200, repeats=MIN_COMPARE_REPEATS,
+        output=None, baseline=None, threshold=0.25):
+    if baseline and repeats < MIN_COMPARE_REPEATS:
+        raise ValueError(f"Comparing needs medians of at least {MIN_COMPARE_REPEATS} repeats, got {repeats}")
+    results = {
+        'meta': {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+                 'seed': seed, 'num_vehicles': num_vehicles, 'repeats': repeats},
+        'results': [],
+    }
+    cases = [prepare(kind, size, backend, seed) for kind in kinds for size in sizes]
+    for _ in range(repeats):
+        for case in cases:
+            sample(case, seed, num_vehicles)
+    print(f"{'kind':<10} {'size':>7} {'nodes':>7} {'edges':>8} {'load s':>8} {'peak MB':>8} {'first ms':>9} {'eval ms':>8} {'gen/s':>7}")
+    for case in cases:
+        result = summarize(case)
+        results['results'].append(result)
+        print(f"{result['kind']:<10} {result['size']:>7} {result['nodes']:>7} {result['edges']:>8} {result['load_seconds']:8.2f} "
+              f"{result['peak_memory_mb']:8.1f} {result['first_evaluation_ms']:9.1f} {result['evaluation_ms']:8.2f} "
+              f"{result['generations_per_sec']:7.2f}")
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {output}")
+    if baseline:
+        with open(baseline) as f:
+            baseline_results = json.load(f)
+        if baseline_results['meta'].get('repeats', 0) < MIN_COMPARE_REPEATS:
+            print(f"Warning: {baseline} was measured with {baseline_results['meta'].get('repeats')} repeats; "
+                  f"its timings may be noisy")
+        print(f"Compared with {baseline} (threshold {threshold:.0%}):")
+        regressions = compare(results, baseline_results, threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s).")
+            return 1
+        print("No regressions.")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark suite over synthetic networks")
+    parser.add_argument('--sizes', default='100,1000,10000', help="comma-separated intersection counts")
+    parser.add_argument('--kinds', default=','.join(NETWORK_KINDS), help="comma-separated network kinds")
+    parser.add_argument('--backend', default='networkx', choices=('networkx', 'csr'))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--vehicles', type=int, default=200, help="trips per evaluation")
+    parser.add_argument('--repeats', type=int, default=MIN_COMPARE_REPEATS, help="runs per timing (median)")
+    parser.add_argument('--output', help="save results to this JSON file")
+    parser.add_argument('--compare', help="JSON results of an earlier run to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.25, help="relative change counted as a regression")
+    args = parser.parse_args()
+    if args.compare and args.repeats < MIN_COMPARE_REPEATS:
+        parser.error(f"--compare needs --repeats of at least {MIN_COMPARE_REPEATS}")
+    sys.exit(run([int(size) for size in args.sizes.split(',')], args.kinds.split(','), args.backend, args.seed,
+                 args.vehicles, args.repeats, args.output, args.compare, args.threshold))
@@ -0,0 +1,89 @@
+# Surrogate pre-screening (SurrogateModel) against the plain GA. Both runs
+# use the same seeds and generations; the surrogate run simulates only the
+# children its ridge model ranks best outside its audit generations, once
+# its last audits show a rank correlation of at least min_rank_correlation
+# (the surrogate run keeps one trip sample, which its model is trained and
+# audited on). Each run's best plan is scored on the same held-out trip
+# sample, and the surrogate's rank correlation with the simulator (measured
+# on the audit generations) and the number of screened generations are
+# reported. A last plain run gets only as many generations as the 50%
+# surrogate run's simulations pay for. Exits with status 1 unless every
+# screened run screens, makes at least MIN_CUT fewer simulator calls than
+# full simulation and ends with a mean held-out fitness no lower than full
+# simulation's and than the plain run on the same simulation budget.
+#
+#   python benchmarks/bench_surrogate.py [grid_size] [generations] [population_size] [num_seeds] [num_vehicles]
+
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from traffic_optimizer import CompiledTrafficSimulator, SurrogateModel, TrafficOptimizer, TripSampler
+from bench_compiled_fitness import build_grid_network
+
+# Share of simulator calls a screened run must save
+MIN_CUT = 0.2
+
+def run(grid_size=8, generations=60, population_size=20, num_seeds=5, num_vehicles=200):
+    random.seed(0)
+    network = build_grid_network(grid_size)
+    compiled = network.get_compiled_network()
+    simulator = CompiledTrafficSimulator(network)
+    held_out = TripSampler(2000).sample(network, 12345)
+    print(f"Network: {compiled.num_nodes} nodes, {compiled.num_genes} genes; {generations} generations of {population_size}, "
+          f"{num_seeds} seeds, held-out sample of {len(held_out.od_pairs)} trips")
+
+    def optimize(ratio, run_generations):
+        scores, evaluations, correlations, screened, elapsed = [], [], [], [], 0.0
+        for seed in range(num_seeds):
+            optimizer = TrafficOptimizer(network, simulator)
+            surrogate = SurrogateModel(screening_ratio=ratio) if ratio is not None else None
+            start = time.perf_counter()
+            solution, velocity, stops = optimizer.genetic_algorithm_optimize(
+                generations=run_generations, population_size=population_size, seed=seed,
+                trip_sampler=TripSampler(num_vehicles), surrogate=surrogate, verbose=False)
+            elapsed += time.perf_counter() - start
+            velocity, stops = simulator.evaluate_solution(*solution, trip_sample=held_out)
+            scores.append(velocity - stops * 0.1)
+            evaluations.append(optimizer.run_stats['evaluations'])
+            if surrogate is not None:
+                screened.append(surrogate.stats_counts['screened_generations'])
+                if surrogate.correlations:
+                    correlations.append(optimizer.run_stats['surrogate']['rank_correlation'])
+        details = f", rank correlation {np.mean(correlations):.2f}" if correlations else ""
+        details += f", {np.mean(screened):.1f} generations screened" if screened else ""
+        label = "full simulation" if ratio is None else f"surrogate, screening {ratio:.0%}"
+        if run_generations != generations:
+            label += f", {run_generations} gens"
+        print(f"  {label:<26} held-out fitness {np.mean(scores):7.3f} (min {np.min(scores):.3f}), "
+              f"{np.mean(evaluations):6.0f} simulations per run, {elapsed / num_seeds:5.2f} s per run{details}")
+        return np.mean(scores), np.mean(evaluations), np.mean(screened) if screened else 0.0
+
+    full_fitness, full_simulations, _ = optimize(None, generations)
+    failures, screened_runs = [], {}
+    for ratio in (0.5, 0.25):
+        screened_runs[ratio] = fitness, simulations, screened = optimize(ratio, generations)
+        if not screened:
+            failures.append(f"screening {ratio:.0%} never screened a generation")
+        if simulations > (1 - MIN_CUT) * full_simulations:
+            failures.append(f"screening {ratio:.0%} made {simulations:.0f} simulator calls per run, "
+                            f"not {MIN_CUT:.0%} fewer than full simulation's {full_simulations:.0f}")
+        if fitness < full_fitness:
+            failures.append(f"screening {ratio:.0%} held-out fitness {fitness:.3f} below full simulation's {full_fitness:.3f}")
+    matched = int(screened_runs[0.5][1] // population_size)
+    matched_fitness, _, _ = optimize(None, matched)
+    if screened_runs[0.5][0] < matched_fitness:
+        failures.append(f"screening 50% held-out fitness {screened_runs[0.5][0]:.3f} below the plain run's "
+                        f"{matched_fitness:.3f} on the same simulations")
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    sys.exit(run(*args))
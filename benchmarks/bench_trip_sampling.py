@@ -0,0 +1,108 @@
+
+# Measures how well candidates are ranked by fitness under different trip
+# sampling setups. A reference ranking is computed once from a large
+# stratified, demand-weighted sample with expected stops; each setup is then
+# repeated with fresh seeds and its ranking compared to the reference
+# (Spearman rank correlation, 1.0 = identical ordering). First checks that
+# a dict-based simulator scores a population on a trip sample the same way
+# twice without touching the random module's state, and that a FitnessCache
+# shared between runs on different vehicle counts or simulator settings
+# returns what a fresh run would.
+#
+#   python benchmarks/bench_trip_sampling.py [grid_size] [population_size] [repeats]
+
+import os
+import random
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from traffic_optimizer import (CompiledTrafficSimulator, EnhancedTrafficSimulator, FitnessCache, TrafficOptimizer, TripSampler,
+                               evaluate_on_trip_sample)
+from bench_compiled_fitness import build_grid_network
+
+def fitness(velocities, stops):
+    return velocities - stops * 0.1 # Same weighting as genetic_algorithm_optimize
+
+def spearman(a, b):
+    rank_a = np.argsort(np.argsort(a))
+    rank_b = np.argsort(np.argsort(b))
+    return np.corrcoef(rank_a, rank_b)[0, 1]
+
+def check_dict_simulator_draws(network, population):
+    simulator = EnhancedTrafficSimulator(network)
+    trip_sample = TripSampler(200).sample(network, 1)
+    state = random.getstate()
+    first = evaluate_on_trip_sample(simulator, population, trip_sample)
+    assert random.getstate() == state, "evaluation on a trip sample changed the random module's state"
+    second = evaluate_on_trip_sample(simulator, population[::-1], trip_sample)
+    assert all(np.array_equal(a, b[::-1]) for a, b in zip(first, second)), "stop draws depend on the evaluation order"
+
+def check_fitness_cache_context(grid_size=6):
+    def optimize(network, simulator, fitness_cache=None):
+        return TrafficOptimizer(network, simulator).genetic_algorithm_optimize(
+            generations=3, population_size=6, seed=0, trip_sampler=TripSampler(100), resample_trips=False,
+            fitness_cache=fitness_cache, verbose=False)[1:]
+
+    networks = []
+    for scale in (1, 3):
+        random.seed(0)
+        network = build_grid_network(grid_size)
+        network.load_vehicle_count_data({light_node: {approach: count * scale for approach, count in counts.items()}
+                                         for light_node, counts in network.vehicle_counts.items()})
+        networks.append(network)
+    fitness_cache = FitnessCache()
+    optimize(networks[0], CompiledTrafficSimulator(networks[0]), fitness_cache)
+    for network, simulator in ((networks[1], CompiledTrafficSimulator(networks[1])),
+                               (networks[0], CompiledTrafficSimulator(networks[0], expected_stops=True))):
+        hits = fitness_cache.hits
+        assert optimize(network, simulator, fitness_cache) == optimize(network, simulator), \
+            "a shared fitness cache returned another network's or simulator's results"
+        assert fitness_cache.hits == hits, "cache hits across networks or simulator settings"
+    hits = fitness_cache.hits
+    optimize(networks[0], CompiledTrafficSimulator(networks[0]), fitness_cache)
+    assert fitness_cache.hits > hits, "no cache hits on a repeated run"
+
+def run(grid_size=10, population_size=30, repeats=20):
+    random.seed(0)
+    network = build_grid_network(grid_size)
+    compiled = network.get_compiled_network()
+    lower, upper = TrafficOptimizer(network, None).gene_bounds(compiled)
+    population = np.random.default_rng(0).uniform(lower, upper, size=(population_size, compiled.num_genes))
+
+    expected = CompiledTrafficSimulator(network, expected_stops=True)
+    sampled = CompiledTrafficSimulator(network)
+    check_dict_simulator_draws(network, population[:5])
+    check_fitness_cache_context()
+    reference = fitness(*expected.evaluate_population(population, TripSampler(4000, 'demand', True).sample(network, 0)))
+
+    def independent(num_vehicles):
+        # Legacy behavior: every individual gets its own random trips and coin flips
+        def evaluate(seed):
+            random.seed(seed)
+            results = [sampled.evaluate_solution(*compiled.decode_genome(genome)) for genome in population]
+            return fitness(np.array([r[0] for r in results]), np.array([r[1] for r in results]))
+        return evaluate
+
+    def shared(simulator, sampler):
+        def evaluate(seed):
+            return fitness(*simulator.evaluate_population(population, sampler.sample(network, seed)))
+        return evaluate
+
+    setups = [
+        ("independent samples, 200 vehicles", independent(200)),
+        ("common trips, uniform, 200 vehicles", shared(sampled, TripSampler(200))),
+        ("common trips, uniform, expected stops, 200 vehicles", shared(expected, TripSampler(200))),
+        ("common trips, stratified demand, expected stops, 200 vehicles", shared(expected, TripSampler(200, 'demand', True))),
+        ("common trips, stratified demand, expected stops, 20 vehicles", shared(expected, TripSampler(20, 'demand', True))),
+    ]
+    print(f"Network: {network.graph.number_of_nodes()} nodes, population {population_size}, {repeats} repeats")
+    for name, evaluate in setups:
+        correlations = [spearman(reference, evaluate(seed + 1)) for seed in range(repeats)]
+        print(f"  {name:<64} rank correlation {np.mean(correlations):.3f} (min {np.min(correlations):.3f})")
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    run(*args)
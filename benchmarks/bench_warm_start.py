@@ -0,0 +1,59 @@
+
+# Warm-starting genetic_algorithm_optimize after a demand change. A long
+# run on the original vehicle counts saves a checkpoint; the counts then
+# change by up to +-change (the morning update), and short runs on the new
+# counts start either from random genomes or from the checkpoint's plan
+# (warm_start). Every run's best plan is scored on the same held-out trip
+# sample of the new network. Also checks that a run resumed from a
+# mid-run checkpoint ends exactly where the uninterrupted run does.
+#
+#   python benchmarks/bench_warm_start.py [grid_size] [generations] [change]
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from traffic_optimizer import CompiledTrafficSimulator, TrafficOptimizer, TripSampler
+from bench_compiled_fitness import build_grid_network
+
+def optimize(network, **kwargs):
+    optimizer = TrafficOptimizer(network, CompiledTrafficSimulator(network))
+    start = time.perf_counter()
+    result = optimizer.genetic_algorithm_optimize(population_size=20, trip_sampler=TripSampler(200), verbose=False, **kwargs)
+    return result, time.perf_counter() - start
+
+def run(grid_size=8, generations=60, change=0.1):
+    random.seed(0)
+    network = build_grid_network(grid_size)
+    random.seed(0)
+    changed = build_grid_network(grid_size)
+    rng = random.Random(1)
+    changed.load_vehicle_count_data({light_node: {approach: count * rng.uniform(1 - change, 1 + change) for approach, count in counts.items()}
+                                     for light_node, counts in network.vehicle_counts.items()})
+    held_out = TripSampler(2000).sample(changed, 12345)
+    simulator = CompiledTrafficSimulator(changed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        checkpoint = os.path.join(directory, 'run.ckpt')
+        uninterrupted, elapsed = optimize(network, generations=generations, seed=0)
+        optimize(network, generations=generations // 2, seed=0, checkpoint_path=checkpoint)
+        resumed, resume_elapsed = optimize(network, generations=generations, resume_from=checkpoint)
+        assert resumed[1:] == uninterrupted[1:], "resumed run differs"
+        print(f"Resume check: run resumed at generation {generations // 2} matches the uninterrupted run "
+              f"({resume_elapsed:.2f} s instead of {elapsed:.2f} s, checkpoint {os.path.getsize(checkpoint) / 1024:.0f} KiB)")
+
+        optimize(network, generations=generations, seed=0, checkpoint_path=checkpoint)
+        print(f"Vehicle counts changed by up to {change:.0%}; best plan scored on {len(held_out.od_pairs)} held-out trips:")
+        for budget in (5, 10, 20, generations):
+            for label, kwargs in (('cold start', {}), ('warm start', {'warm_start': checkpoint})):
+                (solution, velocity, stops), elapsed = optimize(changed, generations=budget, seed=1, **kwargs)
+                velocity, stops = simulator.evaluate_solution(*solution, trip_sample=held_out)
+                print(f"  {budget:>3} generations, {label}: fitness {velocity - stops * 0.1:7.3f} (velocity {velocity:.2f}, stops {stops:.2f}), {elapsed:.2f} s")
+
+if __name__ == "__main__":
+    args = [float(arg) if '.' in arg else int(arg) for arg in sys.argv[1:]]
+    run(*args)
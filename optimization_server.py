@@ -0,0 +1,492 @@
+
+import argparse
+import asyncio
+import base64
+import collections
+import concurrent.futures
+import hashlib
+import http
+import json
+import multiprocessing
+import struct
+import time
+import uuid
+
+from traffic_optimizer import (TrafficNetwork, TrafficOptimizer, TrafficSimulator, EnhancedTrafficSimulator, CompiledTrafficSimulator,
+                               ReroutingTrafficSimulator, MesoscopicTrafficSimulator, TripSampler)
+
+# Local optimization job server for the dashboard. Plain asyncio with a
+# minimal HTTP/1.1 and WebSocket (RFC 6455) implementation, so it needs
+# nothing beyond the optimizer's own dependencies.
+#
+#   GET    /health                  server limits and job counts
+#   GET    /jobs                    all known jobs (without generation history)
+#   POST   /jobs                    submit {"parameters": {...}, "network": {...}}; 202 with the job
+#   GET    /jobs/<id>               one job with its generation history and result
+#   DELETE /jobs/<id>               cancel a queued or running job
+#   GET    /jobs/<id>/events        WebSocket: a 'snapshot' message (job and history so far),
+#                                   then 'generation' and 'status' messages as they happen;
+#                                   the client may send {"type": "cancel"}
+#
+# At most max_concurrent jobs run at once, each in its own worker process,
+# and at most max_queued wait for a slot (submissions beyond that get 503).
+# Cancelling a running job asks it to stop after the current generation;
+# it keeps the best solution found so far. A job that has not stopped
+# cancel_timeout seconds later is terminated. A cancel that arrives after
+# the last generation leaves the job 'completed' with its full result.
+#
+# Parameters (the dashboard's camelCase names are accepted too):
+#   generations, population_size, mutation_rate, seed, num_vehicles,
+#   simulator ('basic', 'enhanced', 'compiled', 'rerouting', 'mesoscopic'),
+#   algorithm ('genetic') and objective ('velocity_stops')
+# Network: {"segments": [...], "traffic_lights": {...}, "vehicle_counts": {...}}
+# in the forms the TrafficNetwork loaders take, or {"snapshot": path} for a
+# snapshot file on the server host; "backend" selects the graph backend.
+
+SIMULATORS = {
+    'basic': TrafficSimulator,
+    'enhanced': EnhancedTrafficSimulator,
+    'compiled': CompiledTrafficSimulator,
+    'rerouting': ReroutingTrafficSimulator,
+    'mesoscopic': MesoscopicTrafficSimulator,
+}
+
+DEFAULT_PARAMETERS = {
+    'generations': 50,
+    'population_size': 10,
+    'mutation_rate': 0.1,
+    'seed': None,
+    'num_vehicles': 200,
+    'simulator': 'compiled',
+    'algorithm': 'genetic',
+    'objective': 'velocity_stops',
+}
+
+CAMEL_CASE_NAMES = {'populationSize': 'population_size', 'mutationRate': 'mutation_rate', 'numVehicles': 'num_vehicles'}
+
+FINAL_STATUSES = ('completed', 'cancelled', 'failed')
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def parse_parameters(parameters):
+    # Validated job parameters with defaults filled in; ValueError on bad input
+    parameters = {CAMEL_CASE_NAMES.get(key, key): value for key, value in (parameters or {}).items()}
+    unknown = set(parameters) - set(DEFAULT_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+    parameters = dict(DEFAULT_PARAMETERS, **parameters)
+    for name, low, high in (('generations', 1, 100000), ('population_size', 2, 100000), ('num_vehicles', 1, 10000000)):
+        value = parameters[name]
+        if not isinstance(value, int) or isinstance(value, bool) or not low <= value <= high:
+            raise ValueError(f"{name} must be an integer between {low} and {high}")
+    if not isinstance(parameters['mutation_rate'], (int, float)) or not 0 <= parameters['mutation_rate'] <= 1:
+        raise ValueError("mutation_rate must be a number between 0 and 1")
+    if parameters['seed'] is not None and (not isinstance(parameters['seed'], int) or parameters['seed'] < 0):
+        raise ValueError("seed must be a non-negative integer")
+    if parameters['simulator'] not in SIMULATORS:
+        raise ValueError(f"Unknown simulator: {parameters['simulator']}")
+    if parameters['algorithm'] != 'genetic':
+        raise ValueError(f"Unsupported algorithm: {parameters['algorithm']}")
+    if parameters['objective'] != 'velocity_stops':
+        raise ValueError(f"Unsupported objective: {parameters['objective']}")
+    return parameters
+
+def build_network(spec):
+    network = TrafficNetwork(backend=spec.get('backend', 'networkx'))
+    if 'snapshot' in spec:
+        network.load_snapshot(spec['snapshot'])
+    else:
+        network.load_gis_data(spec.get('segments', []))
+        network.load_traffic_light_locations(spec.get('traffic_lights', {}))
+        network.load_vehicle_count_data(spec.get('vehicle_counts', {}))
+    return network
+
+def solution_to_json(best_solution, best_avg_velocity, best_avg_stops):
+    # The dashboard's shapes: speeds keyed "from-to", cycles per light and approach
+    speed_limits, traffic_light_cycles = best_solution if best_solution else ({}, {})
+    return {
+        'speed_limits': {f"{u}-{v}": speed for (u, v), speed in speed_limits.items()},
+        'traffic_light_cycles': {str(light_node): {str(approach): phases for approach, phases in approaches.items()}
+                                 for light_node, approaches in traffic_light_cycles.items()},
+        'metrics': {'avgVelocity': best_avg_velocity if best_solution else None,
+                    'avgStops': best_avg_stops if best_solution else None},
+    }
+
+def run_job(parameters, network_spec, conn, stop_event):
+    # Worker process body: runs one optimization and reports through conn
+    try:
+        network = build_network(network_spec)
+        simulator = SIMULATORS[parameters['simulator']](network)
+        optimizer = TrafficOptimizer(network, simulator)
+
+        stopped = False
+
+        def progress(stats):
+            nonlocal stopped
+            conn.send({'type': 'generation', **stats})
+            stopped = stop_event.is_set() and stats['generation'] < stats['generations']
+            return stopped
+
+        result = optimizer.genetic_algorithm_optimize(
+            generations=parameters['generations'], population_size=parameters['population_size'],
+            mutation_rate=parameters['mutation_rate'], seed=parameters['seed'],
+            trip_sampler=TripSampler(parameters['num_vehicles']), progress=progress, verbose=False)
+        conn.send({'type': 'result', 'result': solution_to_json(*result), 'run_stats': optimizer.run_stats, 'stopped': stopped})
+    except Exception as e:
+        conn.send({'type': 'error', 'error': f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+class Job:
+    def __init__(self, parameters, network_spec):
+        self.id = uuid.uuid4().hex[:12]
+        self.parameters = parameters
+        self.network_spec = network_spec
+        self.status = 'queued'
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.history = [] # Per-generation statistics
+        self.result = None
+        self.error = None
+        self.process = None
+        self.stop_event = None
+        self.subscribers = set() # asyncio.Queue per WebSocket client
+
+    def summary(self, history=False):
+        summary = {
+            'id': self.id, 'status': self.status, 'parameters': self.parameters,
+            'created': self.created, 'started': self.started, 'finished': self.finished,
+            'generation': self.history[-1]['generation'] if self.history else 0,
+            'latest': self.history[-1] if self.history else None,
+            'result': self.result, 'error': self.error,
+        }
+        if history:
+            summary['history'] = self.history
+        return summary
+
+class JobManager:
+    def __init__(self, max_concurrent=2, max_queued=16, max_finished=100, cancel_timeout=10.0):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self.cancel_timeout = cancel_timeout
+        self.jobs = collections.OrderedDict()
+        self.pending = collections.deque()
+        self._wakeup = asyncio.Condition()
+        # Spawned rather than forked: the server process runs an event loop and threads
+        self._context = multiprocessing.get_context('spawn')
+        # One thread per running job waits on its worker's pipe
+        self._readers = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrent)
+        self._slots = []
+
+    def start(self):
+        self._slots = [asyncio.ensure_future(self._run_slot()) for _ in range(self.max_concurrent)]
+
+    async def close(self):
+        for job in self.jobs.values():
+            if job.process is not None and job.process.is_alive():
+                job.process.terminate()
+        for slot in self._slots:
+            slot.cancel()
+        self._readers.shutdown(wait=False)
+
+    def get(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise HTTPError(404, f"No job {job_id}")
+        return job
+
+    async def submit(self, parameters, network_spec):
+        if len(self.pending) >= self.max_queued:
+            raise HTTPError(503, f"Job queue is full ({self.max_queued} waiting)")
+        if not isinstance(network_spec, dict) or not ('segments' in network_spec or 'snapshot' in network_spec):
+            raise HTTPError(400, "network must give 'segments' or 'snapshot'")
+        try:
+            parameters = parse_parameters(parameters)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        job = Job(parameters, network_spec)
+        self.jobs[job.id] = job
+        self._evict_finished()
+        async with self._wakeup:
+            self.pending.append(job)
+            self._wakeup.notify()
+        return job
+
+    def position(self, job):
+        return self.pending.index(job) + 1 if job in self.pending else None
+
+    def cancel(self, job):
+        if job.status == 'queued':
+            self.pending.remove(job)
+            job.finished = time.time()
+            self._set_status(job, 'cancelled')
+        elif job.status == 'running':
+            job.stop_event.set()
+            self._set_status(job, 'cancelling')
+            asyncio.get_running_loop().call_later(self.cancel_timeout, self._terminate, job)
+
+    def _terminate(self, job):
+        if job.process is not None and job.process.is_alive():
+            job.process.terminate()
+
+    def _evict_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINAL_STATUSES]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
+
+    def publish(self, job, message):
+        for queue in job.subscribers:
+            queue.put_nowait(message)
+
+    def _set_status(self, job, status):
+        job.status = status
+        self.publish(job, {'type': 'status', 'job': job.summary()})
+
+    async def _run_slot(self):
+        while True:
+            async with self._wakeup:
+                await self._wakeup.wait_for(lambda: self.pending)
+                job = self.pending.popleft()
+            await self._run(job)
+
+    async def _run(self, job):
+        loop = asyncio.get_running_loop()
+        receiver, sender = self._context.Pipe(duplex=False)
+        job.stop_event = self._context.Event()
+        job.process = self._context.Process(target=run_job, args=(job.parameters, job.network_spec, sender, job.stop_event), daemon=True)
+        job.started = time.time()
+        job.process.start()
+        sender.close() # The worker holds the only write end, so recv ends when it exits
+        self._set_status(job, 'running')
+        stopped = False # Whether the worker stopped before its last generation
+        try:
+            while True:
+                try:
+                    message = await loop.run_in_executor(self._readers, receiver.recv)
+                except (EOFError, OSError):
+                    break
+                if message['type'] == 'generation':
+                    del message['type']
+                    job.history.append(message)
+                    self.publish(job, {'type': 'generation', 'id': job.id, **message})
+                elif message['type'] == 'result':
+                    job.result = dict(message['result'], run_stats=message['run_stats'])
+                    stopped = message['stopped']
+                elif message['type'] == 'error':
+                    job.error = message['error']
+        finally:
+            receiver.close()
+            await loop.run_in_executor(self._readers, job.process.join)
+        job.finished = time.time()
+        # A cancel that arrives after the last generation keeps the job
+        # 'completed'; one that stopped it early, or a terminated worker that
+        # sent no result, makes it 'cancelled'
+        if job.error is not None:
+            self._set_status(job, 'failed')
+        elif job.result is None and job.stop_event.is_set():
+            self._set_status(job, 'cancelled')
+        elif job.result is None:
+            job.error = f"Worker exited with code {job.process.exitcode}"
+            self._set_status(job, 'failed')
+        elif stopped:
+            self._set_status(job, 'cancelled')
+        else:
+            self._set_status(job, 'completed')
+        job.process = None
+
+# --- HTTP and WebSocket plumbing ---
+
+WEBSOCKET_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+MAX_BODY_BYTES = 256 * 1024 * 1024 # A large network's segment list
+MAX_FRAME_BYTES = 1024 * 1024
+
+async def read_request(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    method, target, _ = lines[0].split(' ', 2)
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b''
+    return method, target.split('?', 1)[0], headers, body
+
+def write_response(writer, status, payload=None):
+    body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    headers = [
+        f"HTTP/1.1 {status} {http.HTTPStatus(status).phrase}",
+        "Content-Type: application/json",
+        f"Content-Length: {len(body)}",
+        # The dashboard's dev server runs on another origin
+        "Access-Control-Allow-Origin: *",
+        "Access-Control-Allow-Methods: GET, POST, DELETE, OPTIONS",
+        "Access-Control-Allow-Headers: Content-Type",
+        "Connection: close",
+    ]
+    writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + body)
+
+def websocket_frame(opcode, payload):
+    # Server frames are sent unmasked and unfragmented
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+async def read_websocket_frame(reader):
+    # (opcode, payload) of the next client frame
+    first, second = await reader.readexactly(2)
+    opcode = first & 0x0F
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack('!H', await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', await reader.readexactly(8))[0]
+    if length > MAX_FRAME_BYTES:
+        raise ValueError("WebSocket frame too large")
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+    return opcode, payload
+
+class OptimizationServer:
+    def __init__(self, manager):
+        self.manager = manager
+
+    async def handle(self, reader, writer):
+        try:
+            method, path, headers, body = await read_request(reader)
+            parts = [part for part in path.split('/') if part]
+            if method == 'GET' and len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'events' \
+                    and headers.get('upgrade', '').lower() == 'websocket':
+                await self.stream_events(self.manager.get(parts[1]), headers, reader, writer)
+                return
+            status, payload = await self.route(method, parts, body)
+            write_response(writer, status, payload)
+        except HTTPError as e:
+            write_response(writer, e.status, {'error': str(e)})
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass # Malformed request or client went away
+        finally:
+            try:
+                await writer.drain()
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def route(self, method, parts, body):
+        manager = self.manager
+        if method == 'OPTIONS':
+            return 204, None
+        if parts == ['health'] and method == 'GET':
+            statuses = collections.Counter(job.status for job in manager.jobs.values())
+            return 200, {'max_concurrent': manager.max_concurrent, 'max_queued': manager.max_queued, 'jobs': dict(statuses)}
+        if parts == ['jobs'] and method == 'GET':
+            return 200, {'jobs': [dict(job.summary(), position=manager.position(job)) for job in manager.jobs.values()]}
+        if parts == ['jobs'] and method == 'POST':
+            try:
+                request = json.loads(body or b'{}')
+            except json.JSONDecodeError as e:
+                raise HTTPError(400, f"Invalid JSON: {e}")
+            if not isinstance(request, dict):
+                raise HTTPError(400, "Request body must be a JSON object")
+            job = await manager.submit(request.get('parameters'), request.get('network'))
+            return 202, dict(job.summary(), position=manager.position(job))
+        if len(parts) == 2 and parts[0] == 'jobs':
+            job = manager.get(parts[1])
+            if method == 'GET':
+                return 200, dict(job.summary(history=True), position=manager.position(job))
+            if method == 'DELETE':
+                manager.cancel(job)
+                return 200, job.summary()
+        raise HTTPError(404 if method in ('GET', 'POST', 'DELETE') else 405, f"No route for {method} /{'/'.join(parts)}")
+
+    async def stream_events(self, job, headers, reader, writer):
+        key = headers.get('sec-websocket-key')
+        if key is None:
+            raise HTTPError(400, "Missing Sec-WebSocket-Key")
+        accept = base64.b64encode(hashlib.sha1(key.encode('latin-1') + WEBSOCKET_GUID).digest()).decode('ascii')
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode('latin-1'))
+
+        def send(message):
+            writer.write(websocket_frame(0x1, json.dumps(message).encode('utf-8')))
+
+        queue = asyncio.Queue()
+        job.subscribers.add(queue)
+        try:
+            send({'type': 'snapshot', 'job': dict(job.summary(history=True), position=self.manager.position(job))})
+            await writer.drain()
+            sender = asyncio.ensure_future(self._send_updates(job, queue, send, writer))
+            receiver = asyncio.ensure_future(self._receive_commands(job, reader, writer))
+            done, pending = await asyncio.wait((sender, receiver), return_when=asyncio.FIRST_COMPLETED)
+            for task in pending:
+                task.cancel()
+            writer.write(websocket_frame(0x8, struct.pack('!H', 1000)))
+        finally:
+            job.subscribers.discard(queue)
+
+    async def _send_updates(self, job, queue, send, writer):
+        if job.status in FINAL_STATUSES:
+            return
+        while True:
+            message = await queue.get()
+            send(message)
+            await writer.drain()
+            if message['type'] == 'status' and message['job']['status'] in FINAL_STATUSES:
+                return
+
+    async def _receive_commands(self, job, reader, writer):
+        while True:
+            opcode, payload = await read_websocket_frame(reader)
+            if opcode == 0x8: # Close
+                return
+            if opcode == 0x9: # Ping
+                writer.write(websocket_frame(0xA, payload))
+            elif opcode == 0x1:
+                try:
+                    command = json.loads(payload)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(command, dict) and command.get('type') == 'cancel':
+                    self.manager.cancel(job)
+
+async def serve(host='127.0.0.1', port=8765, max_concurrent=2, max_queued=16, ready=None):
+    manager = JobManager(max_concurrent=max_concurrent, max_queued=max_queued)
+    manager.start()
+    server = await asyncio.start_server(OptimizationServer(manager).handle, host, port)
+    print(f"Optimization server on http://{host}:{server.sockets[0].getsockname()[1]} "
+          f"({max_concurrent} concurrent jobs, {max_queued} queued)")
+    if ready is not None:
+        ready(server)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await manager.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Optimization job server for the traffic optimizer dashboard")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--max-concurrent', type=int, default=2, help="jobs running at once, one worker process each")
+    parser.add_argument('--max-queued', type=int, default=16, help="jobs waiting for a worker before submissions are refused")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_concurrent, args.max_queued))
+    except KeyboardInterrupt:
+        pass
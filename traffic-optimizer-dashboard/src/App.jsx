@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Badge } from '@/components/ui/badge';
@@ -7,6 +7,7 @@ import NetworkVisualization from './components/NetworkVisualization';
 import OptimizationResults from './components/OptimizationResults';
 import PerformanceCharts from './components/PerformanceCharts';
 import OptimizationControls from './components/OptimizationControls';
+import { submitJob, cancelJob, watchJob, FINAL_STATUSES } from './lib/optimizationServer';
 import './App.css';
 
 function App() {
@@ -17,6 +18,11 @@ function App() {
   const [optimizedCycles, setOptimizedCycles] = useState({});
   const [metrics, setMetrics] = useState({});
   const [isOptimizing, setIsOptimizing] = useState(false);
+  const [jobId, setJobId] = useState(null);
+  const [jobStatus, setJobStatus] = useState(null);
+  const [jobError, setJobError] = useState(null);
+  const [progress, setProgress] = useState([]);
+  const closeStream = useRef(null);
   const [optimizationParams, setOptimizationParams] = useState({
     generations: 50,
     populationSize: 10,
@@ -97,37 +103,67 @@ function App() {
     setMetrics(sampleMetrics);
   }, []);
 
+  // Close the progress stream when the dashboard unmounts
+  useEffect(() => () => closeStream.current?.(), []);
+
+  const finishJob = (job) => {
+    setJobStatus(job.status);
+    if (job.result) {
+      setOptimizedSpeeds(job.result.speed_limits);
+      setOptimizedCycles(job.result.traffic_light_cycles);
+      setMetrics(job.result.metrics);
+    }
+    if (job.error) setJobError(job.error);
+    setIsOptimizing(false);
+    closeStream.current?.();
+    closeStream.current = null;
+  };
+
   const handleRunOptimization = async (params) => {
     setIsOptimizing(true);
-    
-    // Simulate optimization process
+    setJobError(null);
+    setProgress([]);
+
     try {
-      // In a real application, this would call your Python backend
-      await new Promise(resolve => setTimeout(resolve, 3000)); // Simulate 3 second optimization
-      
-      // Generate some random optimization results for demo
-      const newOptimizedSpeeds = {};
-      networkData.forEach(edge => {
-        const baseSpeed = edge.speed_limit;
-        const variation = (Math.random() - 0.5) * 30; // ±15 km/h variation
-        newOptimizedSpeeds[`${edge.from}-${edge.to}`] = Math.max(30, Math.min(100, baseSpeed + variation));
+      const job = await submitJob(params, {
+        segments: networkData,
+        traffic_lights: trafficLights,
+        vehicle_counts: vehicleCounts
+      });
+      setJobId(job.id);
+      setJobStatus(job.status);
+      closeStream.current = watchJob(job.id, {
+        onSnapshot: (snapshot) => {
+          setProgress(snapshot.history);
+          setJobStatus(snapshot.status);
+          if (FINAL_STATUSES.includes(snapshot.status)) finishJob(snapshot);
+        },
+        onGeneration: (stats) => setProgress((history) => [...history, stats]),
+        onStatus: (update) => {
+          if (FINAL_STATUSES.includes(update.status)) finishJob(update);
+          else setJobStatus(update.status);
+        },
+        onError: (error) => {
+          setJobError(error.message);
+          setIsOptimizing(false);
+        }
       });
-
-      const newMetrics = {
-        avgVelocity: 10 + Math.random() * 10, // Random velocity between 10-20 m/s
-        avgStops: Math.random() * 2 // Random stops between 0-2
-      };
-
-      setOptimizedSpeeds(newOptimizedSpeeds);
-      setMetrics(newMetrics);
-      
     } catch (error) {
       console.error('Optimization failed:', error);
-    } finally {
+      setJobError(error.message);
       setIsOptimizing(false);
     }
   };
 
+  const handleCancelOptimization = async () => {
+    if (!jobId) return;
+    try {
+      await cancelJob(jobId);
+    } catch (error) {
+      setJobError(error.message);
+    }
+  };
+
   const handleParameterChange = (params) => {
     setOptimizationParams(params);
   };
@@ -230,6 +266,7 @@ function App() {
               optimizedSpeeds={optimizedSpeeds}
               trafficLights={trafficLights}
               metrics={metrics}
+              progress={progress}
             />
           </TabsContent>
 
@@ -299,7 +336,11 @@ function App() {
           <TabsContent value="controls" className="space-y-6">
             <OptimizationControls
               onRunOptimization={handleRunOptimization}
+              onCancelOptimization={handleCancelOptimization}
               isRunning={isOptimizing}
+              jobStatus={jobStatus}
+              jobError={jobError}
+              latestGeneration={progress[progress.length - 1]}
               onParameterChange={handleParameterChange}
               parameters={optimizationParams}
             />
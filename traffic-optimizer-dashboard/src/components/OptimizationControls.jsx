@@ -8,7 +8,7 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@
 import { Badge } from '@/components/ui/badge';
 import { Play, Square, Settings, Download } from 'lucide-react';
 
-const OptimizationControls = ({ onRunOptimization, isRunning, onParameterChange, parameters }) => {
+const OptimizationControls = ({ onRunOptimization, onCancelOptimization, isRunning, jobStatus, jobError, latestGeneration, onParameterChange, parameters }) => {
   const [localParams, setLocalParams] = useState({
     generations: parameters?.generations || 50,
     populationSize: parameters?.populationSize || 10,
@@ -135,23 +135,25 @@ const OptimizationControls = ({ onRunOptimization, isRunning, onParameterChange,
         </CardHeader>
         <CardContent className="space-y-4">
           <div className="flex gap-2">
-            <Button
-              onClick={handleRunOptimization}
-              disabled={isRunning}
-              className="flex-1"
-            >
-              {isRunning ? (
-                <>
-                  <Square className="h-4 w-4 mr-2" />
-                  Running...
-                </>
-              ) : (
-                <>
-                  <Play className="h-4 w-4 mr-2" />
-                  Run Optimization
-                </>
-              )}
-            </Button>
+            {isRunning ? (
+              <Button
+                variant="destructive"
+                onClick={onCancelOptimization}
+                disabled={jobStatus === 'cancelling'}
+                className="flex-1"
+              >
+                <Square className="h-4 w-4 mr-2" />
+                {jobStatus === 'cancelling' ? 'Stopping...' : 'Stop'}
+              </Button>
+            ) : (
+              <Button
+                onClick={handleRunOptimization}
+                className="flex-1"
+              >
+                <Play className="h-4 w-4 mr-2" />
+                Run Optimization
+              </Button>
+            )}
             <Button
               variant="outline"
               onClick={exportResults}
@@ -166,9 +168,30 @@ const OptimizationControls = ({ onRunOptimization, isRunning, onParameterChange,
           <div className="flex items-center justify-between">
             <span className="text-sm text-muted-foreground">Status:</span>
             <Badge variant={isRunning ? "default" : "secondary"}>
-              {isRunning ? "Optimizing..." : "Ready"}
+              {isRunning ? (jobStatus === 'queued' ? "Queued" : "Optimizing...") : (jobStatus || "Ready")}
             </Badge>
           </div>
+
+          {/* Live progress from the job server */}
+          {latestGeneration && (
+            <div className="space-y-1 text-sm">
+              <div className="flex justify-between">
+                <span className="text-muted-foreground">Generation:</span>
+                <span>{latestGeneration.generation} / {latestGeneration.generations}</span>
+              </div>
+              <div className="flex justify-between">
+                <span className="text-muted-foreground">Best / mean fitness:</span>
+                <span>{latestGeneration.best_fitness.toFixed(2)} / {latestGeneration.mean_fitness.toFixed(2)}</span>
+              </div>
+              <div className="flex justify-between">
+                <span className="text-muted-foreground">Best velocity, stops:</span>
+                <span>{latestGeneration.best_velocity.toFixed(2)} m/s, {latestGeneration.best_stops.toFixed(2)}</span>
+              </div>
+            </div>
+          )}
+          {jobError && (
+            <p className="text-sm text-destructive">{jobError}</p>
+          )}
         </CardContent>
       </Card>
 
@@ -2,7 +2,7 @@ import React from 'react';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer, LineChart, Line, PieChart, Pie, Cell } from 'recharts';
 
-const PerformanceCharts = ({ networkData, optimizedSpeeds, trafficLights, metrics }) => {
+const PerformanceCharts = ({ networkData, optimizedSpeeds, trafficLights, metrics, progress }) => {
   // Prepare data for speed distribution chart
   const speedData = networkData?.map(edge => ({
     road: `${edge.from}-${edge.to}`,
@@ -44,6 +44,51 @@ const PerformanceCharts = ({ networkData, optimizedSpeeds, trafficLights, metric
 
   return (
     <div className="space-y-6">
+      {/* Convergence of the running or last optimization job */}
+      {progress?.length > 0 && (
+        <div className="grid grid-cols-1 lg:grid-cols-2 gap-6">
+          <Card>
+            <CardHeader>
+              <CardTitle>Fitness by Generation</CardTitle>
+            </CardHeader>
+            <CardContent>
+              <ResponsiveContainer width="100%" height={300}>
+                <LineChart data={progress}>
+                  <CartesianGrid strokeDasharray="3 3" />
+                  <XAxis dataKey="generation" />
+                  <YAxis />
+                  <Tooltip formatter={(value) => value.toFixed(3)} />
+                  <Legend />
+                  <Line type="monotone" dataKey="best_fitness" stroke="#10b981" strokeWidth={2} dot={false} name="Best Fitness" />
+                  <Line type="monotone" dataKey="mean_fitness" stroke="#94a3b8" strokeWidth={2} dot={false} name="Mean Fitness" />
+                </LineChart>
+              </ResponsiveContainer>
+            </CardContent>
+          </Card>
+          <Card>
+            <CardHeader>
+              <CardTitle>Velocity and Stops by Generation</CardTitle>
+            </CardHeader>
+            <CardContent>
+              <ResponsiveContainer width="100%" height={300}>
+                <LineChart data={progress}>
+                  <CartesianGrid strokeDasharray="3 3" />
+                  <XAxis dataKey="generation" />
+                  <YAxis yAxisId="velocity" label={{ value: 'Velocity (m/s)', angle: -90, position: 'insideLeft' }} />
+                  <YAxis yAxisId="stops" orientation="right" label={{ value: 'Stops/vehicle', angle: 90, position: 'insideRight' }} />
+                  <Tooltip formatter={(value) => value.toFixed(3)} />
+                  <Legend />
+                  <Line yAxisId="velocity" type="monotone" dataKey="best_velocity" stroke="#3b82f6" strokeWidth={2} dot={false} name="Best Velocity" />
+                  <Line yAxisId="velocity" type="monotone" dataKey="mean_velocity" stroke="#93c5fd" dot={false} name="Mean Velocity" />
+                  <Line yAxisId="stops" type="monotone" dataKey="best_stops" stroke="#f59e0b" strokeWidth={2} dot={false} name="Best Stops" />
+                  <Line yAxisId="stops" type="monotone" dataKey="mean_stops" stroke="#fcd34d" dot={false} name="Mean Stops" />
+                </LineChart>
+              </ResponsiveContainer>
+            </CardContent>
+          </Card>
+        </div>
+      )}
+
       {/* Speed Optimization Chart */}
       <Card>
         <CardHeader>
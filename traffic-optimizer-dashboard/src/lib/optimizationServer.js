@@ -0,0 +1,41 @@
+// Client for the optimization job server (optimization_server.py). The dev
+// server proxies /jobs to it (see vite.config.js), so URLs are relative.
+
+async function request(method, path, body) {
+  const response = await fetch(path, {
+    method,
+    headers: body ? { 'Content-Type': 'application/json' } : undefined,
+    body: body ? JSON.stringify(body) : undefined
+  });
+  const payload = await response.json().catch(() => null);
+  if (!response.ok) {
+    throw new Error(payload?.error || `${method} ${path} failed with ${response.status}`);
+  }
+  return payload;
+}
+
+export function submitJob(parameters, network) {
+  return request('POST', '/jobs', { parameters, network });
+}
+
+export function cancelJob(jobId) {
+  return request('DELETE', `/jobs/${jobId}`);
+}
+
+// Streams a job's progress: onSnapshot(job) once with the history so far,
+// onGeneration(stats) per generation and onStatus(job) on every status
+// change. Returns a function that closes the stream.
+export function watchJob(jobId, { onSnapshot, onGeneration, onStatus, onError }) {
+  const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+  const socket = new WebSocket(`${protocol}//${window.location.host}/jobs/${jobId}/events`);
+  socket.onmessage = (event) => {
+    const message = JSON.parse(event.data);
+    if (message.type === 'snapshot') onSnapshot?.(message.job);
+    else if (message.type === 'generation') onGeneration?.(message);
+    else if (message.type === 'status') onStatus?.(message.job);
+  };
+  socket.onerror = () => onError?.(new Error('Lost connection to the optimization server'));
+  return () => socket.close();
+}
+
+export const FINAL_STATUSES = ['completed', 'cancelled', 'failed'];
@@ -11,4 +11,11 @@ export default defineConfig({
       "@": path.resolve(__dirname, "./src"),
     },
   },
+  server: {
+    proxy: {
+      // Optimization job server (python3 optimization_server.py)
+      '/jobs': { target: 'http://127.0.0.1:8765', ws: true },
+      '/health': 'http://127.0.0.1:8765',
+    },
+  },
 })
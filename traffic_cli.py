@@ -0,0 +1,244 @@
+
+import argparse
+import contextlib
+import functools
+import json
+import os
+import sys
+import time
+
+_started = time.perf_counter() # Start-up is timed from here to the end of the optimize imports
+
+# Command-line entry point for scheduled optimization runs:
+#
+#   python traffic_cli.py optimize --snapshot city.snap --generations 50 --seed 1 --output plan.json
+#   python traffic_cli.py optimize --segments roads.csv --lights signals.csv --counts counts.jsonl --output plan.json
+#   python traffic_cli.py snapshot --segments roads.csv --lights signals.csv --counts counts.jsonl --output city.snap
+#
+# Unlike `python traffic_optimizer.py` (the demo) it prints nothing but its
+# result: the plan goes to --output (stdout with '-') as JSON, and when the
+# plan is written to a file a one-line JSON summary goes to stdout instead.
+# Generation lines and load progress go to stderr with --verbose. Errors in
+# the inputs print "error: ..." to stderr and exit with status 1.
+#
+# Start-up is kept short for schedulers that run it many times a day:
+# traffic_optimizer (and with it numpy) is only imported once the arguments
+# parse, networkx only when the 'networkx' backend or a simulator that needs
+# it is used, and loading a snapshot with the default 'csr' backend maps its
+# arrays instead of parsing records. Every result carries the seconds spent
+# in start-up (imports), load, optimize and write;
+# benchmarks/bench_cli.py checks the cold start against a budget.
+#
+# Plan format (JSON object):
+#   format, version             'traffic-plan', 1
+#   network                     network_signature of the network it was optimized on
+#   metrics                     velocity (m/s), stops per vehicle and fitness (velocity - 0.1 * stops)
+#   speed_limits                [{from, to, speed_limit}] in km/h, the record form of the segment loader
+#   traffic_light_cycles        [{light, approach, green, yellow, red}], the record form of the signal loader
+#   parameters, run_stats, timings
+# A plan file can be passed back as --warm-start.
+
+PLAN_FORMAT = 'traffic-plan'
+PLAN_VERSION = 1
+
+# Name -> traffic_optimizer class, as in optimization_server
+SIMULATORS = {
+    'basic': 'TrafficSimulator',
+    'enhanced': 'EnhancedTrafficSimulator',
+    'compiled': 'CompiledTrafficSimulator',
+    'rerouting': 'ReroutingTrafficSimulator',
+    'mesoscopic': 'MesoscopicTrafficSimulator',
+}
+SCENARIO_AGGREGATES = ('weighted', 'mean', 'worst')
+
+def load_network(args, progress=None):
+    import traffic_optimizer
+
+    network = traffic_optimizer.TrafficNetwork(backend=args.backend)
+    if args.snapshot:
+        network.load_snapshot(args.snapshot)
+    else:
+        network.load_gis_data(args.segments, progress=progress)
+        if args.lights:
+            network.load_traffic_light_locations(args.lights, progress=progress)
+        if args.counts:
+            network.load_vehicle_count_data(args.counts, interval=args.count_interval, progress=progress)
+    network.get_compiled_network()
+    return network
+
+def plan_to_json(network, solution, velocity, stops, parameters=None, run_stats=None, timings=None):
+    from traffic_optimizer import network_signature
+
+    speed_limits, traffic_light_cycles = solution
+    return {
+        'format': PLAN_FORMAT, 'version': PLAN_VERSION,
+        'network': network_signature(network.get_compiled_network()),
+        'metrics': {'velocity': velocity, 'stops': stops, 'fitness': velocity - stops * 0.1},
+        'speed_limits': [{'from': u, 'to': v, 'speed_limit': speed} for (u, v), speed in speed_limits.items()],
+        'traffic_light_cycles': [{'light': light_node, 'approach': approach, **phases}
+                                 for light_node, approaches in traffic_light_cycles.items() for approach, phases in approaches.items()],
+        'parameters': parameters or {}, 'run_stats': run_stats or {}, 'timings': timings or {},
+    }
+
+def _label(value):
+    # JSON turns tuple node labels (e.g. coordinates) into lists
+    return tuple(_label(item) for item in value) if isinstance(value, list) else value
+
+def read_plan(path):
+    # (speed_limits, traffic_light_cycles) of a plan file, the solution form
+    # of evaluate_solution and warm_start
+    with open(path) as f:
+        plan = json.load(f)
+    if not isinstance(plan, dict) or plan.get('format') != PLAN_FORMAT:
+        raise ValueError(f"{path} is not a {PLAN_FORMAT} file")
+    if plan.get('version') != PLAN_VERSION:
+        raise ValueError(f"Unsupported plan version {plan.get('version')!r} in {path}")
+    speed_limits = {(_label(row['from']), _label(row['to'])): row['speed_limit'] for row in plan['speed_limits']}
+    traffic_light_cycles = {}
+    for row in plan['traffic_light_cycles']:
+        traffic_light_cycles.setdefault(_label(row['light']), {})[_label(row['approach'])] = {phase: row[phase] for phase in ('green', 'yellow', 'red')}
+    return speed_limits, traffic_light_cycles
+
+def write_json(path, document):
+    # '-' is stdout; files are written beside path and renamed over it, so a
+    # reader never sees half a plan. json.dumps rather than json.dump: only
+    # the former uses the C encoder, several times faster on large plans.
+    text = json.dumps(document)
+    if path == '-':
+        sys.stdout.write(text + '\n')
+        sys.stdout.flush()
+        return
+    temporary = f"{os.fspath(path)}.tmp"
+    with open(temporary, 'w') as f:
+        f.write(text)
+    os.replace(temporary, path)
+
+def load_progress(args):
+    # Loader progress callback for --verbose, on stderr so stdout keeps only the result
+    from traffic_io import print_progress
+    return functools.partial(print_progress, file=sys.stderr) if args.verbose else None
+
+def print_generation(stats):
+    print(f"Generation {stats['generation']}/{stats['generations']}", file=sys.stderr)
+
+def optimize(args):
+    import traffic_optimizer
+    timings = {'startup': time.perf_counter() - _started}
+
+    parameters = {
+        'simulator': args.simulator, 'scenarios': args.scenarios, 'generations': args.generations,
+        'population_size': args.population_size, 'mutation_rate': args.mutation_rate, 'seed': args.seed,
+        'num_vehicles': args.vehicles, 'workers': args.workers,
+    }
+    start = time.perf_counter()
+    network = load_network(args, load_progress(args))
+    if args.scenarios:
+        scenarios = traffic_optimizer.scenarios_from_count_store(network)
+        simulator = traffic_optimizer.ScenarioTrafficSimulator(network, scenarios, aggregate=args.scenarios)
+    else:
+        simulator = getattr(traffic_optimizer, SIMULATORS[args.simulator])(network)
+    warm_start = args.warm_start
+    if warm_start and os.path.splitext(warm_start)[1].lower() == '.json':
+        warm_start = read_plan(warm_start)
+    timings['load'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    optimizer = traffic_optimizer.TrafficOptimizer(network, simulator)
+    with contextlib.ExitStack() as stack:
+        telemetry = None
+        if args.trace:
+            from traffic_telemetry import JSONLinesSink, Telemetry
+            telemetry = Telemetry([stack.enter_context(JSONLinesSink(args.trace))])
+        solution, velocity, stops = optimizer.genetic_algorithm_optimize(
+            generations=args.generations, population_size=args.population_size, mutation_rate=args.mutation_rate,
+            workers=args.workers, seed=args.seed, trip_sampler=traffic_optimizer.TripSampler(args.vehicles),
+            progress=print_generation if args.verbose else None, telemetry=telemetry,
+            checkpoint_path=args.checkpoint, checkpoint_every=args.checkpoint_every, resume_from=args.resume,
+            warm_start=warm_start, warm_start_spread=args.warm_start_spread, verbose=False)
+    timings['optimize'] = time.perf_counter() - start
+    if not solution:
+        raise ValueError("No solution found")
+
+    start = time.perf_counter()
+    run_stats = {key: value for key, value in optimizer.run_stats.items() if key != 'telemetry'}
+    plan = plan_to_json(network, solution, velocity, stops, parameters, run_stats, timings)
+    write_json(args.output, plan)
+    timings['write'] = time.perf_counter() - start
+    if args.output != '-':
+        write_json('-', {'status': 'ok', 'output': args.output, 'network': plan['network'], 'metrics': plan['metrics'],
+                         'timings': timings})
+    return 0
+
+def snapshot(args):
+    # Parses record inputs once into a snapshot that later optimize runs map in
+    start = time.perf_counter()
+    network = load_network(args, load_progress(args))
+    network.save_snapshot(args.output)
+    compiled = network.get_compiled_network()
+    write_json('-', {'status': 'ok', 'output': args.output, 'nodes': compiled.num_nodes, 'edges': compiled.num_edges,
+                     'approaches': compiled.num_approaches, 'seconds': time.perf_counter() - start})
+    return 0
+
+def add_input_arguments(parser, snapshot=True):
+    inputs = parser.add_argument_group('network inputs')
+    if snapshot:
+        inputs.add_argument('--snapshot', help="network snapshot (TrafficNetwork.save_snapshot or the snapshot command)")
+    inputs.add_argument('--segments', help="road segments: CSV, JSON lines or GeoJSON records")
+    inputs.add_argument('--lights', help="signal records (light, approach, green, yellow, red)")
+    inputs.add_argument('--counts', help="vehicle count records (light, approach, count and optional time)")
+    inputs.add_argument('--count-interval', type=int, default=900, help="seconds per bin of timed counts")
+    inputs.add_argument('--backend', default='csr', choices=('csr', 'networkx'),
+                        help="graph backend; 'csr' avoids importing networkx")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Optimize speed limits and signal timings from the command line")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('optimize', help="load a network, run the genetic algorithm and write the plan")
+    add_input_arguments(run)
+    run.add_argument('--simulator', default='compiled', choices=sorted(SIMULATORS))
+    run.add_argument('--scenarios', choices=SCENARIO_AGGREGATES,
+                     help="score plans under the time-of-day scenarios of timed counts with this aggregate")
+    run.add_argument('--generations', type=int, default=50)
+    run.add_argument('--population-size', type=int, default=10)
+    run.add_argument('--mutation-rate', type=float, default=0.1)
+    run.add_argument('--seed', type=int)
+    run.add_argument('--vehicles', type=int, default=200, help="trips per sample")
+    run.add_argument('--workers', type=int, help="evaluation processes")
+    run.add_argument('--checkpoint', help="checkpoint file, written every --checkpoint-every generations")
+    run.add_argument('--checkpoint-every', type=int, default=10)
+    run.add_argument('--resume', help="continue the run saved in this checkpoint")
+    run.add_argument('--warm-start', help="start from a plan (.json) or a checkpoint's best solution")
+    run.add_argument('--warm-start-spread', type=float, default=0.05)
+    run.add_argument('--trace', help="append per-generation telemetry to this JSON lines file")
+    run.add_argument('--output', '-o', default='-', help="plan file ('-' for stdout)")
+    run.add_argument('--verbose', '-v', action='store_true', help="load progress and generation lines on stderr")
+    run.set_defaults(handler=optimize)
+
+    save = commands.add_parser('snapshot', help="convert record inputs to a snapshot for fast loading")
+    add_input_arguments(save, snapshot=False)
+    save.add_argument('--output', '-o', required=True, help="snapshot file")
+    save.add_argument('--verbose', '-v', action='store_true', help="load progress on stderr")
+    save.set_defaults(handler=snapshot, snapshot=None)
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.snapshot and not args.segments:
+        parser.error("one of --snapshot or --segments is required")
+    if args.snapshot and (args.segments or args.lights or args.counts):
+        parser.error("--snapshot cannot be combined with --segments, --lights or --counts")
+    if args.command == 'optimize':
+        if args.scenarios and args.simulator != 'compiled':
+            parser.error("--scenarios evaluates with the compiled simulator")
+        if args.generations < 1 or args.population_size < 2 or args.vehicles < 1 or args.checkpoint_every < 1:
+            parser.error("--generations, --vehicles and --checkpoint-every must be at least 1, --population-size at least 2")
+    try:
+        return args.handler(args)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"error: {type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+
+import csv
+import importlib.util
+import itertools
+import json
+import math
+import os
+import struct
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Record readers for the streaming loaders of TrafficNetwork. A source is
+# either an iterable of dict records or a path to a file:
+#   .csv                                 one record per row (header required)
+#   .jsonl / .ndjson                     one JSON object per line
+#   .geojsonl / .geojsons / .geojsonseq  one GeoJSON Feature per line (RFC 8142)
+#   .geojson                             a FeatureCollection (parsed as a whole)
+# Files are read lazily, so only one chunk of records is in memory at a time
+# (except for .geojson, which the json module can only parse in one piece).
+
+def lazy_import(name):
+    # Module `name`, executed on its first attribute access, so heavy
+    # imports (networkx) stay off the start-up path of runs that never use them
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+def is_path(source):
+    return isinstance(source, (str, os.PathLike))
+
+def read_records(source):
+    if not is_path(source):
+        return iter(source)
+    extension = os.path.splitext(os.fspath(source))[1].lower()
+    if extension == '.csv':
+        return _read_csv(source)
+    if extension in ('.jsonl', '.ndjson'):
+        return _read_json_lines(source)
+    if extension in ('.geojsonl', '.geojsons', '.geojsonseq'):
+        return (feature_to_record(feature) for feature in _read_json_lines(source))
+    if extension == '.geojson':
+        return _read_feature_collection(source)
+    raise ValueError(f"Unsupported file type: {source}")
+
+def chunked(records, chunk_size):
+    records = iter(records)
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def _read_csv(path):
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            # Empty cells mean "not given", like a missing key in a dict record
+            yield {key: value for key, value in row.items() if value != ''}
+
+def _read_json_lines(path):
+    with open(path) as f:
+        for line in f:
+            line = line.strip().lstrip('\x1e') # GeoJSON text sequences prefix records with RS
+            if line:
+                yield json.loads(line)
+
+def _read_feature_collection(path):
+    with open(path) as f:
+        collection = json.load(f)
+    for feature in collection.get('features', []):
+        yield feature_to_record(feature)
+
+def feature_to_record(feature):
+    # A LineString Feature as a segment record. Missing 'from'/'to' become
+    # the rounded end coordinates, and a missing 'length' is measured along
+    # the line, assuming WGS84 longitude/latitude coordinates.
+    record = dict(feature.get('properties') or {})
+    coordinates = (feature.get('geometry') or {}).get('coordinates') or []
+    if coordinates:
+        record.setdefault('from', f"{coordinates[0][0]:.7f},{coordinates[0][1]:.7f}")
+        record.setdefault('to', f"{coordinates[-1][0]:.7f},{coordinates[-1][1]:.7f}")
+        if 'length' not in record:
+            record['length'] = sum(haversine(a, b) for a, b in zip(coordinates, coordinates[1:]))
+    return record
+
+def haversine(a, b):
+    # Great-circle distance in meters between two (lon, lat) points
+    lon1, lat1, lon2, lat2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2)**2
+    return 2 * 6371000 * math.asin(math.sqrt(h))
+
+def parse_time(value):
+    # Seconds since the epoch from a number or an ISO 8601 timestamp
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+class LoadProgress:
+    # Rows-per-second bookkeeping for one streaming load. `callback` gets a
+    # dict after every chunk: {'source', 'rows', 'elapsed', 'rows_per_sec'}.
+    def __init__(self, source_name, callback=None):
+        self.source_name = source_name
+        self.callback = callback
+        self.rows = 0
+        self.start = time.perf_counter()
+
+    def update(self, rows):
+        self.rows += rows
+        if self.callback is not None:
+            self.callback(self.stats())
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.start
+        return {'source': self.source_name, 'rows': self.rows, 'elapsed': elapsed,
+                'rows_per_sec': self.rows / elapsed if elapsed > 0 else 0.0}
+
+def print_progress(stats, file=None):
+    # Ready-made progress callback for the loaders; file defaults to stdout
+    print(f"  {stats['source']}: {stats['rows']:,} rows in {stats['elapsed']:.1f}s ({stats['rows_per_sec']:,.0f} rows/s)", file=file)
+
+# Binary snapshot container: a small JSON header followed by raw arrays,
+# each aligned to SNAPSHOT_ALIGNMENT bytes so it can be memory-mapped and
+# viewed in place without copying.
+#   magic (8 bytes) | format version (uint32 LE) | header length (uint32 LE) | header JSON | arrays
+# The header holds free-form metadata plus {'arrays': {name: {'dtype', 'shape', 'offset'}}}.
+SNAPSHOT_MAGIC = b'TRAFSNAP'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_ALIGNMENT = 64
+
+def _align(offset):
+    return -(-offset // SNAPSHOT_ALIGNMENT) * SNAPSHOT_ALIGNMENT
+
+def write_snapshot(path, metadata, arrays):
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset = _align(offset + array.nbytes)
+    header = json.dumps(dict(metadata, arrays=layout)).encode('utf-8')
+    data_start = _align(len(SNAPSHOT_MAGIC) + 8 + len(header))
+    header += b' ' * (data_start - len(SNAPSHOT_MAGIC) - 8 - len(header))
+    with open(path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(struct.pack('<II', SNAPSHOT_VERSION, len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+
+def read_snapshot(path, mmap=True):
+    # Returns (metadata, arrays). With mmap=True the arrays are read-only
+    # views into one memory map of the file; otherwise the file is read once.
+    with open(path, 'rb') as f:
+        magic = f.read(len(SNAPSHOT_MAGIC))
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a network snapshot")
+        version, header_length = struct.unpack('<II', f.read(8))
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {version} (expected {SNAPSHOT_VERSION})")
+        metadata = json.loads(f.read(header_length))
+    data_start = _align(len(SNAPSHOT_MAGIC) + 8 + header_length)
+    if mmap:
+        buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    else:
+        with open(path, 'rb') as f:
+            buffer = f.read()
+    arrays = {}
+    for name, layout in metadata.pop('arrays').items():
+        dtype = np.dtype(layout['dtype'])
+        count = int(np.prod(layout['shape'], dtype=np.int64))
+        arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + layout['offset']).reshape(layout['shape'])
+    return metadata, arrays
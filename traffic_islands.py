@@ -0,0 +1,260 @@
+
+import collections
+import multiprocessing
+import queue
+import random
+import time
+
+import numpy as np
+
+from traffic_optimizer import TrafficOptimizer
+
+# Island-model genetic algorithm: num_islands independent populations, each
+# a TrafficOptimizer.genetic_algorithm_optimize run in its own process with
+# its own seed and trip samples. Every migration_interval generations each
+# island sends copies of its migration_size best individuals to the islands
+# the topology names; they replace the last children of the receiving
+# island's next population (at most half of it) and are evaluated there on
+# that island's trips.
+#
+# Topologies (the graph may change every migration epoch):
+#   'ring'      island i sends to island i + 1
+#   'complete'  every island sends to every other island
+#   'random'    every island sends to one other island, redrawn each epoch
+#               from the run's seed, so all islands agree on it
+#   or a dict {island: [target islands]}
+#
+# With synchronous migration an island waits (up to migration_timeout
+# seconds) for the migrants due to it before it continues, so a seeded run
+# is reproducible; otherwise it takes whatever has arrived.
+#
+# Islands talk through a transport: any picklable object with
+# send(address, message) and receive(address, timeout) -> message or None,
+# where an address is an island number or COORDINATOR. LocalTransport
+# (multiprocessing queues) serves islands on this host. For islands on other
+# hosts, pass a network transport and local_islands, the islands to start
+# here; each remote host calls run_island() for its islands with the same
+# settings (island_settings() with the same arguments and an explicit seed).
+
+COORDINATOR = 'coordinator'
+TOPOLOGIES = ('ring', 'complete', 'random')
+
+def migration_targets(topology, num_islands, epoch, seed):
+    # island -> islands it sends its migrants to in this epoch
+    if isinstance(topology, dict):
+        return {island: list(topology.get(island, ())) for island in range(num_islands)}
+    if num_islands < 2:
+        return {island: [] for island in range(num_islands)}
+    if topology == 'ring':
+        return {island: [(island + 1) % num_islands] for island in range(num_islands)}
+    if topology == 'complete':
+        return {island: [target for target in range(num_islands) if target != island] for island in range(num_islands)}
+    if topology == 'random':
+        rng = random.Random(seed * 1000003 + epoch)
+        return {island: [(island + rng.randrange(1, num_islands)) % num_islands] for island in range(num_islands)}
+    raise ValueError(f"Unknown topology: {topology!r} (expected one of {', '.join(TOPOLOGIES)} or a dict)")
+
+class LocalTransport:
+    # One multiprocessing queue per island plus one for the coordinator
+    def __init__(self, num_islands, context=None):
+        context = context if context is not None else multiprocessing.get_context()
+        self.inboxes = {island: context.Queue() for island in range(num_islands)}
+        self.inboxes[COORDINATOR] = context.Queue()
+
+    def send(self, address, message):
+        self.inboxes[address].put(message)
+
+    def receive(self, address, timeout=None):
+        try:
+            return self.inboxes[address].get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        for inbox in self.inboxes.values():
+            inbox.close()
+
+class _IslandMigration:
+    # Island side of the exchange, passed to genetic_algorithm_optimize as
+    # both its progress and its migration callback
+    def __init__(self, island, settings, transport):
+        self.island = island
+        self.settings = settings
+        self.transport = transport
+        self.arrived = collections.defaultdict(list) # epoch -> [(source, genomes)]
+        self.stopped = False
+        self.stats = {'sent': 0, 'received': 0, 'timeouts': 0}
+
+    def poll(self, timeout=0):
+        # Handles one message from the inbox; False when there was none
+        message = self.transport.receive(self.island, timeout)
+        if message is None:
+            return False
+        if message['type'] == 'stop':
+            self.stopped = True
+        elif message['type'] == 'migrants':
+            self.arrived[message['epoch']].append((message['source'], message['genomes']))
+        return True
+
+    def progress(self, stats):
+        self.transport.send(COORDINATOR, dict(stats, type='generation', island=self.island))
+        while self.poll():
+            pass
+        return self.stopped
+
+    def __call__(self, generation, elite, elite_fitness):
+        settings = self.settings
+        if generation % settings['migration_interval']:
+            return None
+        epoch = generation // settings['migration_interval']
+        targets = migration_targets(settings['topology'], settings['num_islands'], epoch, settings['topology_seed'])
+        emigrants = np.array(elite[:settings['migration_size']])
+        for target in targets[self.island]:
+            self.transport.send(target, {'type': 'migrants', 'source': self.island, 'epoch': epoch, 'genomes': emigrants})
+            self.stats['sent'] += len(emigrants)
+
+        if settings['synchronous']:
+            expected = sum(self.island in islands for islands in targets.values())
+            deadline = time.monotonic() + settings['migration_timeout']
+            while len(self.arrived[epoch]) < expected and not self.stopped:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    break
+                self.poll(remaining)
+        else:
+            while self.poll():
+                pass
+
+        # Ordered by epoch and source so the result does not depend on arrival order
+        arrivals = sorted((e, source, genomes) for e in list(self.arrived) if e <= epoch
+                          for source, genomes in self.arrived.pop(e))
+        if not arrivals:
+            return None
+        immigrants = np.concatenate([genomes for e, source, genomes in arrivals])[:len(elite)]
+        self.stats['received'] += len(immigrants)
+        return immigrants
+
+def run_island(network, simulator, island, settings, transport):
+    # Process body of one island: runs its GA and reports the result to the coordinator
+    migration = _IslandMigration(island, settings, transport)
+    try:
+        optimizer = TrafficOptimizer(network, simulator)
+        solution, velocity, stops = optimizer.genetic_algorithm_optimize(
+            generations=settings['generations'], population_size=settings['population_size'],
+            mutation_rate=settings['mutation_rate'], seed=settings['seeds'][island],
+            trip_sampler=settings['trip_sampler'], resample_trips=settings['resample_trips'],
+            incremental=settings['incremental'], mutation_only=settings['mutation_only'], progress=migration.progress,
+            migration=migration, verbose=False)
+        run_stats = dict(optimizer.run_stats, migration=dict(migration.stats))
+        transport.send(COORDINATOR, {'type': 'result', 'island': island, 'solution': solution,
+                                     'velocity': velocity, 'stops': stops, 'run_stats': run_stats})
+    except Exception as e:
+        transport.send(COORDINATOR, {'type': 'error', 'island': island, 'error': f"{type(e).__name__}: {e}"})
+
+class IslandOptimizer:
+    def __init__(self, network, simulator, num_islands=4, topology='ring', migration_interval=5, migration_size=2,
+                 synchronous=True, migration_timeout=60.0, transport=None, local_islands=None):
+        if not isinstance(topology, dict) and topology not in TOPOLOGIES:
+            raise ValueError(f"Unknown topology: {topology!r} (expected one of {', '.join(TOPOLOGIES)} or a dict)")
+        self.network = network
+        self.simulator = simulator
+        self.num_islands = num_islands
+        self.topology = topology
+        self.migration_interval = max(1, migration_interval)
+        self.migration_size = migration_size
+        self.synchronous = synchronous
+        self.migration_timeout = migration_timeout
+        self.transport = transport
+        self.local_islands = list(range(num_islands)) if local_islands is None else list(local_islands)
+        # Counters from the most recent run, per island under 'islands'
+        self.run_stats = {}
+
+    def island_settings(self, generations=50, population_size=10, mutation_rate=0.1, seed=None, trip_sampler=None,
+                        resample_trips=True, incremental=False, mutation_only=0.0):
+        # Everything run_island needs; the island seeds are spawned from seed
+        root = np.random.SeedSequence(seed)
+        return {
+            'generations': generations, 'population_size': population_size, 'mutation_rate': mutation_rate,
+            'trip_sampler': trip_sampler, 'resample_trips': resample_trips, 'incremental': incremental,
+            'mutation_only': mutation_only,
+            'seeds': [int(child.generate_state(1, np.uint64)[0]) for child in root.spawn(self.num_islands)],
+            'topology_seed': int(root.generate_state(1, np.uint64)[0]),
+            'num_islands': self.num_islands, 'topology': self.topology,
+            'migration_interval': self.migration_interval, 'migration_size': self.migration_size,
+            'synchronous': self.synchronous, 'migration_timeout': self.migration_timeout,
+        }
+
+    def genetic_algorithm_optimize(self, generations=50, population_size=10, mutation_rate=0.1, seed=None,
+                                   trip_sampler=None, resample_trips=True, incremental=False, progress=None, verbose=True,
+                                   mutation_only=0.0):
+        # Runs every island and returns the best of their results, ranked the
+        # way a single run ranks generations (higher velocity, then fewer
+        # stops), as (best_solution, best_avg_velocity, best_avg_stops).
+        # progress gets each island's generation statistics (see
+        # TrafficOptimizer.genetic_algorithm_optimize) with an 'island' key;
+        # when it returns True all islands stop after their current generation.
+        # verbose=False leaves out the start and per-island result lines.
+        settings = self.island_settings(generations, population_size, mutation_rate, seed, trip_sampler,
+                                        resample_trips, incremental, mutation_only)
+        transport = self.transport if self.transport is not None else LocalTransport(self.num_islands)
+        # Compile once here so forked islands inherit the arrays
+        self.network.get_compiled_network()
+        context = multiprocessing.get_context()
+        processes = {island: context.Process(target=run_island, args=(self.network, self.simulator, island, settings, transport),
+                                             daemon=True)
+                     for island in self.local_islands}
+        for process in processes.values():
+            process.start()
+
+        if verbose:
+            print(f"Running {self.num_islands} islands of {population_size} ({len(processes)} local processes)...")
+        results = {}
+        stopping = False
+        try:
+            while len(results) < self.num_islands:
+                message = transport.receive(COORDINATOR, timeout=1.0)
+                if message is None:
+                    for island, process in processes.items():
+                        if island not in results and process.exitcode not in (None, 0):
+                            raise RuntimeError(f"Island {island} exited with code {process.exitcode}")
+                    continue
+                if message['type'] == 'generation':
+                    if progress is not None and progress(message) and not stopping:
+                        stopping = True
+                        for island in range(self.num_islands):
+                            transport.send(island, {'type': 'stop'})
+                elif message['type'] == 'result':
+                    results[message['island']] = message
+                    if verbose:
+                        print(f"Island {message['island']}: velocity {message['velocity']:.2f}, stops {message['stops']:.2f}")
+                elif message['type'] == 'error':
+                    raise RuntimeError(f"Island {message['island']} failed: {message['error']}")
+        finally:
+            if len(results) < self.num_islands:
+                for process in processes.values():
+                    process.terminate()
+            else:
+                # Unread migrants would keep a finished island's queue feeder from exiting
+                for island in self.local_islands:
+                    while transport.receive(island, timeout=0.05) is not None:
+                        pass
+            for process in processes.values():
+                process.join()
+            if self.transport is None:
+                transport.close()
+
+        best = None
+        for island in sorted(results):
+            result = results[island]
+            if best is None or result['velocity'] > best['velocity'] or \
+               (result['velocity'] == best['velocity'] and result['stops'] < best['stops']):
+                best = result
+        island_stats = [results[island]['run_stats'] for island in sorted(results)]
+        self.run_stats = {
+            'evaluations': sum(stats['evaluations'] for stats in island_stats),
+            'generations': max(stats['generations'] for stats in island_stats),
+            'best_island': best['island'],
+            'islands': island_stats,
+        }
+        return best['solution'], best['velocity'], best['stops']
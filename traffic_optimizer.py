@@ -1,45 +1,981 @@
 
-import networkx as nx
+import collections
+import hashlib
+import heapq
+import math
+import multiprocessing
+import numpy as np
+import os
 import random
+import time
+
+from traffic_io import LoadProgress, chunked, lazy_import, parse_time, read_records, read_snapshot, write_snapshot
+from traffic_telemetry import get_telemetry, use_telemetry
+
+# Imported on first use: snapshot loads with backend='csr' and the compiled
+# simulators never need it
+nx = lazy_import('networkx')
+
+# --- Graph backends ---
+
+# TrafficNetwork.get_graph_backend() returns one of two read-only views of
+# the road graph with the same interface, used by routing and the
+# simulators' edge lookups:
+#   nodes, node_index                  node labels and label -> integer id
+#   number_of_nodes(), number_of_edges()
+#   has_edge(u, v), get_edge_data(u, v, default=None) -> {'length', 'speed_limit'}
+#   successors(node), predecessors(node), edges()
+#   shortest_path_tree(source_index) -> (predecessor row, distance row) by length
+#   is_stale(network)
+# NetworkXGraph wraps network.graph as before. CSRGraph keeps integer node
+# ids with CSR (out-edge) and CSC (in-edge) index arrays and one float64
+# array per edge attribute, a few dozen bytes per edge instead of NetworkX's
+# dict per node and per edge; TrafficNetwork(backend='csr') also loads
+# straight into arrays, so the NetworkX graph is only built if legacy code
+# touches network.graph.
+
+class NetworkXGraph:
+    def __init__(self, graph):
+        self.graph = graph
+        self.nodes = list(graph.nodes())
+        self.node_index = {node: i for i, node in enumerate(self.nodes)}
+        self.num_edges = graph.number_of_edges()
+
+    def is_stale(self, network):
+        # Cheap guard for code that edits network.graph directly instead of
+        # going through load_gis_data (which drops the backend explicitly)
+        graph = network._graph
+        return graph is not self.graph or graph.number_of_nodes() != len(self.nodes) or graph.number_of_edges() != self.num_edges
+
+    def number_of_nodes(self):
+        return len(self.nodes)
+
+    def number_of_edges(self):
+        return self.num_edges
+
+    def has_edge(self, u, v):
+        return self.graph.has_edge(u, v)
+
+    def get_edge_data(self, u, v, default=None):
+        return self.graph.get_edge_data(u, v, default)
+
+    def successors(self, node):
+        return list(self.graph.successors(node))
+
+    def predecessors(self, node):
+        return list(self.graph.predecessors(node))
+
+    def edges(self):
+        return list(self.graph.edges())
+
+    def shortest_path_tree(self, source_index):
+        pred = np.full(len(self.nodes), -1, dtype=np.int32)
+        dist = np.full(len(self.nodes), np.inf)
+        pred_lists, lengths = nx.dijkstra_predecessor_and_distance(self.graph, self.nodes[source_index], weight='length')
+        for node, length in lengths.items():
+            i = self.node_index[node]
+            dist[i] = length
+            if pred_lists[node]:
+                pred[i] = self.node_index[pred_lists[node][0]]
+        return pred, dist
+
+class CSRGraph:
+    # Edge ids are CSR positions: the out-edges of node i are
+    # indptr[i]:indptr[i+1], with targets in indices. in_edges lists edge ids
+    # grouped by target (CSC order), bounded by in_indptr.
+    def __init__(self, nodes, indptr, indices, edge_length, edge_speed_limit):
+        self.nodes = list(nodes)
+        self.node_index = {node: i for i, node in enumerate(self.nodes)}
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.edge_length = np.asarray(edge_length, dtype=np.float64)
+        self.edge_speed_limit = np.asarray(edge_speed_limit, dtype=np.float64)
+        self.edge_source = np.repeat(np.arange(len(self.nodes), dtype=np.int32), np.diff(self.indptr))
+        self.in_edges = np.argsort(self.indices, kind='stable').astype(np.int32)
+        self.in_indptr = np.zeros(len(self.nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.indices, minlength=len(self.nodes)), out=self.in_indptr[1:])
+        self._adjacency = None
+
+    def is_stale(self, network):
+        # Loaders drop the backend explicitly; this catches direct edits of
+        # a graph that legacy code materialized through network.graph
+        graph = network._graph
+        return graph is not None and (graph.number_of_nodes() != len(self.nodes) or graph.number_of_edges() != len(self.indices))
+
+    def number_of_nodes(self):
+        return len(self.nodes)
+
+    def number_of_edges(self):
+        return len(self.indices)
+
+    def edge_id(self, u, v):
+        # CSR position of edge (u, v), -1 when there is none
+        i = self.node_index.get(u)
+        j = self.node_index.get(v)
+        if i is None or j is None:
+            return -1
+        start = self.indptr[i]
+        hits = np.flatnonzero(self.indices[start:self.indptr[i + 1]] == j)
+        return int(start + hits[0]) if len(hits) else -1
+
+    def has_edge(self, u, v):
+        return self.edge_id(u, v) >= 0
+
+    def get_edge_data(self, u, v, default=None):
+        e = self.edge_id(u, v)
+        if e < 0:
+            return default
+        return {'length': float(self.edge_length[e]), 'speed_limit': float(self.edge_speed_limit[e])}
+
+    def successors(self, node):
+        i = self.node_index[node]
+        return [self.nodes[j] for j in self.indices[self.indptr[i]:self.indptr[i + 1]].tolist()]
+
+    def predecessors(self, node):
+        i = self.node_index[node]
+        return [self.nodes[j] for j in self.edge_source[self.in_edges[self.in_indptr[i]:self.in_indptr[i + 1]]].tolist()]
+
+    def edges(self):
+        return [(self.nodes[u], self.nodes[v]) for u, v in zip(self.edge_source.tolist(), self.indices.tolist())]
+
+    def shortest_path_tree(self, source_index):
+        # Dijkstra over the CSR arrays. Ties are broken like
+        # nx.dijkstra_predecessor_and_distance (first relaxation wins, heap
+        # ordered by insertion), so both backends return the same routes.
+        if self._adjacency is None:
+            self._adjacency = (self.indptr.tolist(), self.indices.tolist(), self.edge_length.tolist())
+        indptr, indices, edge_length = self._adjacency
+        pred = [-1] * len(self.nodes)
+        dist = {}
+        seen = {source_index: 0}
+        fringe = [(0, 0, source_index)]
+        counter = 1
+        while fringe:
+            d, _, u = heapq.heappop(fringe)
+            if u in dist:
+                continue
+            dist[u] = d
+            for e in range(indptr[u], indptr[u + 1]):
+                v = indices[e]
+                vu_dist = d + edge_length[e]
+                if v not in dist and (v not in seen or vu_dist < seen[v]):
+                    seen[v] = vu_dist
+                    heapq.heappush(fringe, (vu_dist, counter, v))
+                    counter += 1
+                    pred[v] = u
+        distances = np.full(len(self.nodes), np.inf)
+        distances[list(dist)] = list(dist.values())
+        return np.array(pred, dtype=np.int32), distances
+
+class RouteCache:
+    # Shortest-path index (weight='length') over a fixed graph backend.
+    # Each source node gets a single Dijkstra run, stored compactly as a
+    # predecessor row (int32 node indices) and a distance row (float64), so
+    # looking up a route or its length is a table walk instead of a search.
+    # Rows are filled the first time a source is queried; build() fills all
+    # of them up front (true all-pairs) for small and medium networks.
+    def __init__(self, graph):
+        self.graph = graph
+        self.nodes = graph.nodes
+        self.node_index = graph.node_index
+        self.predecessors = {} # source index -> np.int32 array, -1 for no predecessor
+        self.distances = {} # source index -> np.float64 array, inf when unreachable
+
+    def _row(self, source_index):
+        telemetry = get_telemetry()
+        if source_index not in self.distances:
+            with telemetry.timer('path_finding'):
+                self.predecessors[source_index], self.distances[source_index] = self.graph.shortest_path_tree(source_index)
+            telemetry.count('shortest_path_trees')
+            telemetry.count('route_cache_misses')
+        else:
+            telemetry.count('route_cache_hits')
+        return self.predecessors[source_index], self.distances[source_index]
+
+    def build(self):
+        for source_index in range(len(self.nodes)):
+            self._row(source_index)
+        return self
+
+    def distance(self, source, target):
+        # Route length in meters, inf when target is unreachable
+        return float(self._row(self.node_index[source])[1][self.node_index[target]])
+
+    def path(self, source, target):
+        # Same contract as nx.shortest_path(graph, source, target, weight='length')
+        source_index = self.node_index[source]
+        target_index = self.node_index[target]
+        pred, dist = self._row(source_index)
+        if dist[target_index] == np.inf:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+        path = [target]
+        i = target_index
+        while i != source_index:
+            i = pred[i]
+            path.append(self.nodes[i])
+        path.reverse()
+        return path
+
+def _number(value):
+    # Numeric field of a record; CSV readers deliver strings
+    return value if isinstance(value, (int, float)) else float(value)
+
+class CountStore:
+    # Time-indexed detector counts as a dense float32 array of shape
+    # (approaches, time bins), where bin = floor(time / interval) relative to
+    # the earliest bin seen. The array grows in place as chunks arrive, so
+    # days of 15-minute counts cost 4 bytes per reading instead of a nested
+    # dict entry. A parallel mask records which cells were actually reported,
+    # so detector gaps do not read as zero traffic.
+    def __init__(self, interval=900):
+        self.interval = interval # seconds per bin
+        self.approaches = [] # (light_node, approach)
+        self.approach_index = {}
+        self.first_bin = None
+        self.num_bins = 0
+        self._counts = np.zeros((0, 0), dtype=np.float32)
+        self._observed = np.zeros((0, 0), dtype=bool)
+
+    def _reserve(self, num_rows, num_columns, shift=0):
+        # Make room for num_rows x num_columns cells, moving existing data
+        # `shift` columns right (for bins earlier than first_bin). num_columns
+        # counts the shift, so the used bins are the first num_columns - shift
+        # columns; the spare capacity past them is empty and is not moved.
+        rows, columns = self._counts.shape
+        if num_rows <= rows and num_columns <= columns and shift == 0 and self._counts.flags.writeable:
+            return
+        # (Arrays memory-mapped from a snapshot are read-only and get copied here)
+        # Only a dimension that is too small grows (doubling, to amortize copies)
+        new_shape = (rows if num_rows <= rows else max(num_rows, 2 * rows),
+                     columns if num_columns <= columns else max(num_columns, 2 * columns))
+        counts = np.zeros(new_shape, dtype=np.float32)
+        observed = np.zeros(new_shape, dtype=bool)
+        kept = min(columns, num_columns - shift)
+        counts[:rows, shift:shift + kept] = self._counts[:, :kept]
+        observed[:rows, shift:shift + kept] = self._observed[:, :kept]
+        self._counts, self._observed = counts, observed
+
+    def add(self, light_nodes, approaches, times, counts):
+        rows = []
+        for key in zip(light_nodes, approaches):
+            if key not in self.approach_index:
+                self.approach_index[key] = len(self.approaches)
+                self.approaches.append(key)
+            rows.append(self.approach_index[key])
+        bins = np.floor(np.asarray(times, dtype=np.float64) / self.interval).astype(np.int64)
+        shift = 0
+        if self.first_bin is None:
+            self.first_bin = int(bins.min())
+        elif bins.min() < self.first_bin:
+            shift = self.first_bin - int(bins.min())
+            self.first_bin = int(bins.min())
+            self.num_bins += shift
+        columns = bins - self.first_bin
+        self.num_bins = max(self.num_bins, int(columns.max()) + 1)
+        self._reserve(len(self.approaches), self.num_bins, shift)
+        np.add.at(self._counts, (rows, columns), np.asarray(counts, dtype=np.float32))
+        self._observed[rows, columns] = True
+
+    def counts(self):
+        # (approaches, bins) view of the stored counts
+        return self._counts[:len(self.approaches), :self.num_bins]
+
+    def observed(self):
+        return self._observed[:len(self.approaches), :self.num_bins]
+
+    def bin_times(self):
+        # Start time of every bin, in seconds since the epoch
+        return (self.first_bin + np.arange(self.num_bins)) * self.interval
+
+    def hourly_volumes(self):
+        # Mean vehicles per hour of each approach over its reported bins
+        hours = self.observed().sum(axis=1) * self.interval / 3600
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(hours > 0, self.counts().sum(axis=1) / hours, 0.0)
+
+    def to_vehicle_counts(self):
+        # The {light: {approach: volume}} form TrafficNetwork.vehicle_counts uses
+        vehicle_counts = {}
+        for (light_node, approach), volume in zip(self.approaches, self.hourly_volumes().tolist()):
+            vehicle_counts.setdefault(light_node, {})[approach] = volume
+        return vehicle_counts
 
 class TrafficNetwork:
-    def __init__(self):
-        self.graph = nx.DiGraph()
+    # backend selects the graph behind routing and edge lookups (see
+    # get_graph_backend): 'networkx' keeps network.graph as the source of
+    # truth, 'csr' loads segments straight into CSR arrays for large networks.
+    def __init__(self, backend='networkx'):
+        if backend not in ('networkx', 'csr'):
+            raise ValueError(f"Unknown graph backend: {backend}")
+        self.backend = backend
         self.traffic_lights = {}
         self.vehicle_counts = {}
-
-    def load_gis_data(self, gis_data):
+        self.count_store = None # CountStore when time-indexed counts were loaded
+        self._route_cache = None
+        self._compiled_network = None
+        self._graph_backend = None
+        if backend == 'csr':
+            self._graph = None
+            self._csr = {'nodes': [], 'indptr': np.zeros(1, dtype=np.int64), 'indices': np.zeros(0, dtype=np.int32),
+                         'edge_length': np.zeros(0), 'edge_speed_limit': np.zeros(0)}
+        else:
+            self.graph = nx.DiGraph()
+
+    # With CSR arrays loaded (load_snapshot, or any load with backend='csr')
+    # the NetworkX graph is only built when something asks for network.graph;
+    # from then on the graph is the source of truth.
+    @property
+    def graph(self):
+        if self._graph is None:
+            self._graph = self._graph_from_csr()
+            self._csr = None
+        return self._graph
+
+    @graph.setter
+    def graph(self, graph):
+        self._graph = graph
+        self._csr = None
+
+    # The loaders accept the in-memory forms shown below, or for large inputs
+    # any iterator of flat records or a CSV / JSON-lines / GeoJSON file path
+    # (see traffic_io). Records are ingested in chunks of chunk_size, and
+    # progress, if given, is called after every chunk with row counts and
+    # rows/sec (traffic_io.print_progress prints them).
+
+    def load_gis_data(self, gis_data, chunk_size=50000, progress=None):
         # Placeholder for loading GIS data (polylines with lengths)
         # gis_data would be a list of dictionaries, e.g.,
         # [{'from': 'A', 'to': 'B', 'length': 100, 'speed_limit': 60}]
-        for segment in gis_data:
-            self.graph.add_edge(segment['from'], segment['to'], length=segment['length'], speed_limit=segment.get('speed_limit', 50))
-
-    def load_traffic_light_locations(self, light_locations):
+        load = LoadProgress('segments', progress)
+        if self.backend == 'csr':
+            self._load_segments_csr(read_records(gis_data), chunk_size, load)
+        else:
+            for chunk in chunked(read_records(gis_data), chunk_size):
+                self.graph.add_edges_from((segment['from'], segment['to'], {'length': _number(segment['length']), 'speed_limit': _number(segment.get('speed_limit', 50))})
+                                          for segment in chunk)
+                load.update(len(chunk))
+        # Edge lengths may have changed, so previously computed routes are invalid
+        self._graph_backend = None
+        self._route_cache = None
+        self._compiled_network = None
+
+    def _load_segments_csr(self, records, chunk_size, load):
+        # Merges segments into the CSR arrays with DiGraph.add_edges_from
+        # semantics: nodes are numbered in order of first appearance, an
+        # edge keeps the position it was first added at and the attributes
+        # it was last given.
+        nodes, indptr, indices, edge_length, edge_speed_limit = self._csr_arrays()
+        nodes = list(nodes)
+        node_index = {node: i for i, node in enumerate(nodes)}
+        sources = [np.repeat(np.arange(len(nodes), dtype=np.int64), np.diff(indptr))]
+        targets = [np.asarray(indices, dtype=np.int64)]
+        lengths = [np.asarray(edge_length)]
+        speed_limits = [np.asarray(edge_speed_limit)]
+        for chunk in chunked(records, chunk_size):
+            chunk_sources = []
+            chunk_targets = []
+            for segment in chunk:
+                for node, ids in ((segment['from'], chunk_sources), (segment['to'], chunk_targets)):
+                    if node not in node_index:
+                        node_index[node] = len(nodes)
+                        nodes.append(node)
+                    ids.append(node_index[node])
+            sources.append(np.array(chunk_sources, dtype=np.int64))
+            targets.append(np.array(chunk_targets, dtype=np.int64))
+            lengths.append(np.array([_number(segment['length']) for segment in chunk], dtype=np.float64))
+            speed_limits.append(np.array([_number(segment.get('speed_limit', 50)) for segment in chunk], dtype=np.float64))
+            load.update(len(chunk))
+        sources, targets = np.concatenate(sources), np.concatenate(targets)
+        keys = sources * max(len(nodes), 1) + targets
+        unique_keys, first = np.unique(keys, return_index=True)
+        last = len(keys) - 1 - np.unique(keys[::-1], return_index=True)[1]
+        order = np.lexsort((first, unique_keys // max(len(nodes), 1)))
+        first, last = first[order], last[order]
+        indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources[first], minlength=len(nodes)), out=indptr[1:])
+        self._graph = None
+        self._csr = {'nodes': nodes, 'indptr': indptr, 'indices': targets[first].astype(np.int32),
+                     'edge_length': np.concatenate(lengths)[last], 'edge_speed_limit': np.concatenate(speed_limits)[last]}
+
+    def load_traffic_light_locations(self, light_locations, chunk_size=50000, progress=None):
         # Placeholder for loading traffic light locations
         # light_locations would be a dictionary, e.g.,
         # {'B': {'approaches': ['A', 'C'], 'cycle_phases': {'A': {'green': 30, 'yellow': 3, 'red': 27}}}}
-        self.traffic_lights = light_locations
-
-    def load_vehicle_count_data(self, count_data):
+        # Record form: one row per approach with light, approach, green,
+        # yellow, red and an optional per-light offset (seconds)
+        if isinstance(light_locations, dict):
+            self.traffic_lights = light_locations
+        else:
+            self.traffic_lights = {}
+            load = LoadProgress('signals', progress)
+            for chunk in chunked(read_records(light_locations), chunk_size):
+                for row in chunk:
+                    light_info = self.traffic_lights.setdefault(row['light'], {'approaches': [], 'cycle_phases': {}})
+                    if row['approach'] not in light_info['cycle_phases']:
+                        light_info['approaches'].append(row['approach'])
+                    light_info['cycle_phases'][row['approach']] = {'green': _number(row['green']), 'yellow': _number(row['yellow']), 'red': _number(row['red'])}
+                    if 'offset' in row:
+                        light_info['offset'] = _number(row['offset'])
+                load.update(len(chunk))
+        self._compiled_network = None
+
+    def load_vehicle_count_data(self, count_data, interval=900, chunk_size=50000, progress=None):
         # Placeholder for loading vehicle count data
         # count_data would be a dictionary, e.g.,
         # {'B': {'A': 100, 'C': 80}} (vehicles from A to B, C to B)
-        self.vehicle_counts = count_data
+        # Record form: light, approach, count and an optional time (seconds
+        # since the epoch or ISO 8601). Timed rows go into a CountStore with
+        # bins of `interval` seconds and vehicle_counts becomes the mean
+        # hourly volume per approach; untimed rows are summed as a snapshot.
+        if isinstance(count_data, dict):
+            self.vehicle_counts = count_data
+            self.count_store = None
+        else:
+            snapshot = {}
+            count_store = CountStore(interval)
+            load = LoadProgress('counts', progress)
+            for chunk in chunked(read_records(count_data), chunk_size):
+                timed = [row for row in chunk if 'time' in row]
+                for row in chunk:
+                    if 'time' not in row:
+                        counts = snapshot.setdefault(row['light'], {})
+                        counts[row['approach']] = counts.get(row['approach'], 0) + _number(row['count'])
+                if timed:
+                    count_store.add([row['light'] for row in timed], [row['approach'] for row in timed],
+                                    [parse_time(row['time']) for row in timed], [_number(row['count']) for row in timed])
+                load.update(len(chunk))
+            self.count_store = count_store if count_store.approaches else None
+            self.vehicle_counts = snapshot
+            if self.count_store is not None:
+                for light_node, counts in self.count_store.to_vehicle_counts().items():
+                    self.vehicle_counts.setdefault(light_node, {}).update(counts)
+        self._compiled_network = None
+
+    # Binary snapshot (see traffic_io.write_snapshot), version 1 layout:
+    #   metadata   labels (graph nodes first, then light/approach labels that
+    #              are not nodes), num_nodes, count_interval, count_first_bin
+    #   CSR graph  indptr int64[nodes+1], indices int32[edges],
+    #              edge_length / edge_speed_limit float64[edges]
+    #   signals    signal_light / signal_approach int32, signal_flags uint8
+    #              (1 = entry of 'approaches', 2 = entry of 'cycle_phases'),
+    #              signal_phases float64[rows, 3]; offset_light int32, offset float64
+    #   counts     count_light / count_approach int32, count float64 (vehicle_counts);
+    #              store_light / store_approach int32, store_counts float32 and
+    #              store_observed bool [approaches, bins] (the CountStore, if any)
+    # Labels are stored as JSON, so nodes must be strings or numbers. Extra
+    # per-light fields other than 'offset' are not saved.
+
+    def _csr_arrays(self):
+        # (nodes, indptr, indices, edge_length, edge_speed_limit); the edge
+        # order is that of graph.edges(), which groups edges by source node
+        if self._graph is None:
+            csr = self._csr
+            return csr['nodes'], csr['indptr'], csr['indices'], csr['edge_length'], csr['edge_speed_limit']
+        nodes = list(self._graph.nodes())
+        node_index = {node: i for i, node in enumerate(nodes)}
+        edges = list(self._graph.edges(data=True))
+        sources = np.fromiter((node_index[u] for u, v, data in edges), dtype=np.int64, count=len(edges))
+        indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(nodes)), out=indptr[1:])
+        indices = np.fromiter((node_index[v] for u, v, data in edges), dtype=np.int32, count=len(edges))
+        edge_length = np.fromiter((data['length'] for u, v, data in edges), dtype=np.float64, count=len(edges))
+        edge_speed_limit = np.fromiter((data['speed_limit'] for u, v, data in edges), dtype=np.float64, count=len(edges))
+        return nodes, indptr, indices, edge_length, edge_speed_limit
+
+    def _graph_from_csr(self):
+        nodes, indptr, indices, edge_length, edge_speed_limit = self._csr_arrays()
+        graph = nx.DiGraph()
+        graph.add_nodes_from(nodes)
+        sources = np.repeat(np.arange(len(nodes)), np.diff(indptr))
+        graph.add_edges_from((nodes[u], nodes[v], {'length': length, 'speed_limit': speed_limit})
+                             for u, v, length, speed_limit in zip(sources.tolist(), indices.tolist(), edge_length.tolist(), edge_speed_limit.tolist()))
+        return graph
+
+    def save_snapshot(self, path):
+        nodes, indptr, indices, edge_length, edge_speed_limit = self._csr_arrays()
+        labels = list(nodes)
+        label_index = {node: i for i, node in enumerate(labels)}
+        def index(label):
+            if label not in label_index:
+                label_index[label] = len(labels)
+                labels.append(label)
+            return label_index[label]
+
+        signal_rows = []
+        offsets = []
+        for light_node, light_info in self.traffic_lights.items():
+            # Approach list rows, then cycle phase rows, so both keep their order
+            for approach in light_info.get('approaches', []):
+                signal_rows.append((index(light_node), index(approach), 1, (0, 0, 0)))
+            for approach, phase in light_info.get('cycle_phases', {}).items():
+                signal_rows.append((index(light_node), index(approach), 2, (phase['green'], phase['yellow'], phase['red'])))
+            if 'offset' in light_info:
+                offsets.append((index(light_node), light_info['offset']))
+        count_rows = [(index(light_node), index(approach), count)
+                      for light_node, counts in self.vehicle_counts.items() for approach, count in counts.items()]
+
+        arrays = {
+            'indptr': indptr, 'indices': indices, 'edge_length': edge_length, 'edge_speed_limit': edge_speed_limit,
+            'signal_light': np.array([row[0] for row in signal_rows], dtype=np.int32),
+            'signal_approach': np.array([row[1] for row in signal_rows], dtype=np.int32),
+            'signal_flags': np.array([row[2] for row in signal_rows], dtype=np.uint8),
+            'signal_phases': np.array([row[3] for row in signal_rows], dtype=np.float64).reshape(-1, 3),
+            'offset_light': np.array([row[0] for row in offsets], dtype=np.int32),
+            'offset': np.array([row[1] for row in offsets], dtype=np.float64),
+            'count_light': np.array([row[0] for row in count_rows], dtype=np.int32),
+            'count_approach': np.array([row[1] for row in count_rows], dtype=np.int32),
+            'count': np.array([row[2] for row in count_rows], dtype=np.float64),
+        }
+        metadata = {'num_nodes': len(nodes), 'count_interval': None, 'count_first_bin': None}
+        if self.count_store is not None:
+            store = self.count_store
+            arrays['store_light'] = np.array([index(light_node) for light_node, approach in store.approaches], dtype=np.int32)
+            arrays['store_approach'] = np.array([index(approach) for light_node, approach in store.approaches], dtype=np.int32)
+            arrays['store_counts'] = store.counts()
+            arrays['store_observed'] = store.observed()
+            metadata['count_interval'] = store.interval
+            metadata['count_first_bin'] = store.first_bin
+        for label in labels:
+            if not isinstance(label, (str, int, float)) or isinstance(label, bool):
+                raise ValueError(f"Snapshot labels must be strings or numbers, got {label!r}")
+        metadata['labels'] = labels
+        write_snapshot(path, metadata, arrays)
+
+    def load_snapshot(self, path, mmap=True):
+        # Replaces the whole network with a saved snapshot. With mmap=True the
+        # edge and count arrays stay memory-mapped (read-only, shared between
+        # processes by the page cache) instead of being copied into memory.
+        metadata, arrays = read_snapshot(path, mmap)
+        labels = metadata['labels']
+        self._graph = None
+        self._csr = {'nodes': labels[:metadata['num_nodes']], 'indptr': arrays['indptr'], 'indices': arrays['indices'],
+                          'edge_length': arrays['edge_length'], 'edge_speed_limit': arrays['edge_speed_limit']}
+
+        self.traffic_lights = {}
+        phases = arrays['signal_phases']
+        for light, approach, flags, green, yellow, red in zip(arrays['signal_light'].tolist(), arrays['signal_approach'].tolist(), arrays['signal_flags'].tolist(),
+                                                              phases[:, GREEN].tolist(), phases[:, YELLOW].tolist(), phases[:, RED].tolist()):
+            light_info = self.traffic_lights.setdefault(labels[light], {'approaches': [], 'cycle_phases': {}})
+            if flags & 1:
+                light_info['approaches'].append(labels[approach])
+            if flags & 2:
+                light_info['cycle_phases'][labels[approach]] = {'green': green, 'yellow': yellow, 'red': red}
+        for light, offset in zip(arrays['offset_light'].tolist(), arrays['offset'].tolist()):
+            self.traffic_lights[labels[light]]['offset'] = offset
+
+        self.vehicle_counts = {}
+        for light, approach, count in zip(arrays['count_light'].tolist(), arrays['count_approach'].tolist(), arrays['count'].tolist()):
+            self.vehicle_counts.setdefault(labels[light], {})[labels[approach]] = count
+        self.count_store = None
+        if 'store_counts' in arrays:
+            store = CountStore(metadata['count_interval'])
+            store.approaches = [(labels[light], labels[approach]) for light, approach in zip(arrays['store_light'].tolist(), arrays['store_approach'].tolist())]
+            store.approach_index = {key: i for i, key in enumerate(store.approaches)}
+            store.first_bin = metadata['count_first_bin']
+            store.num_bins = arrays['store_counts'].shape[1]
+            store._counts = arrays['store_counts']
+            store._observed = arrays['store_observed']
+            self.count_store = store
+        self._graph_backend = None
+        self._route_cache = None
+        self._compiled_network = None
 
     def get_approaches_for_light(self, light_node):
         # Returns incoming edges to a traffic light node
-        return list(self.graph.predecessors(light_node))
+        return self.get_graph_backend().predecessors(light_node)
+
+    def get_graph_backend(self):
+        # NetworkXGraph or CSRGraph over the current graph, per self.backend
+        if self._graph_backend is None or self._graph_backend.is_stale(self):
+            if self.backend == 'csr':
+                self._graph_backend = CSRGraph(*self._csr_arrays())
+            else:
+                self._graph_backend = NetworkXGraph(self.graph)
+        return self._graph_backend
+
+    def get_route_cache(self):
+        # Routes depend only on edge lengths, which stay fixed for a whole
+        # optimization run, so one cache is shared by every fitness evaluation
+        graph = self.get_graph_backend()
+        if self._route_cache is None or self._route_cache.graph is not graph:
+            self._route_cache = RouteCache(graph)
+        return self._route_cache
+
+    def get_compiled_network(self):
+        # Array view of the graph, signal table and counts; see CompiledNetwork
+        if self._compiled_network is None or self._compiled_network.is_stale(self):
+            self._compiled_network = CompiledNetwork(self)
+        return self._compiled_network
+
+# --- Compiled (array-based) network representation ---
+
+# Column order of a phase array row
+GREEN, YELLOW, RED = 0, 1, 2
+
+def numpy_rng():
+    # NumPy generator seeded from the random module, so random.seed() keeps
+    # array-based code paths reproducible too
+    return np.random.default_rng(random.getrandbits(64))
+
+class CompiledNetwork:
+    # Integer-indexed view of a TrafficNetwork for array-based evaluation.
+    # Edges and signal approaches are numbered once, so a candidate solution
+    # becomes two flat arrays instead of nested dicts:
+    #   speeds: float64[num_edges] in km/h
+    #   phases: float64[num_approaches, 3] with GREEN/YELLOW/RED columns
+    # A signal approach is an edge (u, v) where v has a light with cycle
+    # phases for u, i.e. exactly the edges where the dict-based simulators
+    # add signal delay. A genome is the two concatenated: speeds followed by
+    # the flattened phase rows.
+    max_route_cells = 4_000_000 # Bounds the (origins, nodes) table of trip_routes
+
+    def __init__(self, network):
+        self.network = network
+
+        # Edges in CSR order, from the graph or straight from a loaded snapshot
+        nodes, indptr, indices, self.edge_length, self.edge_speed_limit = network._csr_arrays()
+        self.num_nodes = len(nodes)
+        sources = np.repeat(np.arange(len(nodes)), np.diff(indptr))
+        self.edges = [(nodes[u], nodes[v]) for u, v in zip(sources.tolist(), indices.tolist())]
+        self.edge_index = {edge: i for i, edge in enumerate(self.edges)}
+        self.num_edges = len(self.edges)
+        # Node indices (those of the route cache) at both ends of every edge
+        self.edge_source = sources.astype(np.int32)
+        self.edge_target = np.asarray(indices, dtype=np.int32)
+        self._edge_keys = None
+
+        self.approaches = []
+        default_phases = []
+        arrival_rate = []
+        for light_node, light_info in network.traffic_lights.items():
+            for approach, phase in light_info['cycle_phases'].items():
+                if (approach, light_node) not in self.edge_index: continue
+                self.approaches.append((light_node, approach))
+                default_phases.append((phase['green'], phase['yellow'], phase['red']))
+                arrival_rate.append(network.vehicle_counts.get(light_node, {}).get(approach, 0) / 3600) # vehicles per second
+        self.approach_index = {approach: i for i, approach in enumerate(self.approaches)}
+        self.num_approaches = len(self.approaches)
+        self.approach_edge = np.array([self.edge_index[(u, v)] for v, u in self.approaches], dtype=np.int32)
+        self.default_phases = np.array(default_phases, dtype=np.float64).reshape(-1, 3)
+        self.arrival_rate = np.array(arrival_rate, dtype=np.float64)
+
+        # Reverse index: approach id for each edge, -1 when the edge ends at no signal
+        self.edge_approach = np.full(len(self.edges), -1, dtype=np.int32)
+        self.edge_approach[self.approach_edge] = np.arange(len(self.approaches), dtype=np.int32)
+
+        self.num_genes = self.num_edges + 3 * self.num_approaches
+        self._route_edges = {}
+
+    @property
+    def route_cache(self):
+        return self.network.get_route_cache()
+
+    def is_stale(self, network):
+        # Loaders drop the compiled network explicitly; this catches direct
+        # edits of network.graph
+        graph = network._graph
+        return graph is not None and (graph.number_of_nodes() != self.num_nodes or graph.number_of_edges() != self.num_edges)
+
+    def encode_speed_limits(self, speed_limits):
+        speeds = self.edge_speed_limit.copy()
+        for edge, speed in speed_limits.items():
+            i = self.edge_index.get(edge)
+            if i is not None:
+                speeds[i] = speed
+        return speeds
+
+    def encode_cycles(self, traffic_light_cycles):
+        phases = self.default_phases.copy()
+        for i, (light_node, approach) in enumerate(self.approaches):
+            phase = traffic_light_cycles.get(light_node, {}).get(approach)
+            if phase is not None:
+                phases[i] = (phase['green'], phase['yellow'], phase['red'])
+        return phases
+
+    def split_genomes(self, genomes):
+        # Views of the speed and phase parts of one genome or a population
+        speeds = genomes[..., :self.num_edges]
+        phases = genomes[..., self.num_edges:].reshape(genomes.shape[:-1] + (self.num_approaches, 3))
+        return speeds, phases
+
+    def encode_solution(self, speed_limits, traffic_light_cycles):
+        return np.concatenate([self.encode_speed_limits(speed_limits), self.encode_cycles(traffic_light_cycles).ravel()])
+
+    def decode_genome(self, genome):
+        # Back to the (speed_limits, traffic_light_cycles) dicts used by evaluate_solution
+        speeds, phases = self.split_genomes(genome)
+        speed_limits = {edge: float(speed) for edge, speed in zip(self.edges, speeds)}
+        traffic_light_cycles = {light_node: {} for light_node, approach in self.approaches}
+        for (light_node, approach), (green, yellow, red) in zip(self.approaches, phases.tolist()):
+            traffic_light_cycles[light_node][approach] = {'green': green, 'yellow': yellow, 'red': red}
+        return speed_limits, traffic_light_cycles
+
+    def route_edges(self, source, target):
+        # Edge ids along the cached shortest path, memoized per OD pair
+        key = (source, target)
+        if key not in self._route_edges:
+            path = self.route_cache.path(source, target)
+            self._route_edges[key] = np.array([self.edge_index[(path[i], path[i+1])] for i in range(len(path) - 1)], dtype=np.int32)
+        return self._route_edges[key]
+
+    def edge_ids(self, sources, targets):
+        # Edge id of every (source index, target index) pair, like edge_index
+        # (the last of parallel edges)
+        if self._edge_keys is None:
+            order = np.argsort(self.edge_source.astype(np.int64) * self.num_nodes + self.edge_target, kind='stable')
+            self._edge_keys = (self.edge_source[order].astype(np.int64) * self.num_nodes + self.edge_target[order], order)
+        keys, order = self._edge_keys
+        return order[np.searchsorted(keys, np.asarray(sources, dtype=np.int64) * self.num_nodes + targets, side='right') - 1]
+
+    def trip_routes(self, od_pairs):
+        # The route_edges routes of many trips as (indptr, edge_ids), the
+        # CSR form of CompiledRouteSet. Each distinct OD pair is resolved
+        # once: the predecessor trees of a block of origins become a
+        # predecessor-edge table, and all of the block's pairs are walked
+        # back from their destinations together.
+        route_cache = self.route_cache
+        node_index = route_cache.node_index
+        origins = np.array([node_index[start_node] for start_node, end_node in od_pairs], dtype=np.int64)
+        destinations = np.array([node_index[end_node] for start_node, end_node in od_pairs], dtype=np.int64)
+        pairs, trip_pair = np.unique(origins * self.num_nodes + destinations, return_inverse=True)
+        pair_origin, pair_destination = pairs // self.num_nodes, pairs % self.num_nodes # Sorted by origin
+        block_origins = max(1, self.max_route_cells // max(1, self.num_nodes))
+        steps = [] # (pairs, edge ids) of each step back towards the origins
+        distinct_origins = np.unique(pair_origin)
+        for first in range(0, len(distinct_origins), block_origins):
+            block = distinct_origins[first:first + block_origins]
+            pred_edge = np.full((len(block), self.num_nodes), -1, dtype=np.int32)
+            lo, hi = np.searchsorted(pair_origin, [block[0], block[-1] + 1])
+            pending = np.arange(lo, hi)
+            rows = np.searchsorted(block, pair_origin[pending])
+            for row, origin in enumerate(block.tolist()):
+                pred, dist = route_cache._row(origin)
+                reached = np.flatnonzero(pred >= 0)
+                pred_edge[row, reached] = self.edge_ids(pred[reached], reached)
+                targets = pair_destination[lo:hi][rows == row]
+                if not np.isfinite(dist[targets]).all():
+                    target = targets[~np.isfinite(dist[targets])][0]
+                    raise nx.NetworkXNoPath(f"No path between {route_cache.nodes[origin]} and {route_cache.nodes[target]}.")
+            current = pair_destination[pending]
+            walking = current != pair_origin[pending]
+            pending, rows, current = pending[walking], rows[walking], current[walking]
+            while len(pending):
+                edges = pred_edge[rows, current]
+                steps.append((pending, edges))
+                current = self.edge_source[edges]
+                walking = current != pair_origin[pending]
+                pending, rows, current = pending[walking], rows[walking], current[walking]
+
+        lengths = np.zeros(len(pairs), dtype=np.int64)
+        for pending, edges in steps:
+            lengths[pending] += 1
+        pair_end = np.cumsum(lengths)
+        pair_edges = np.zeros(int(pair_end[-1]) if len(pairs) else 0, dtype=np.int32)
+        filled = np.zeros(len(pairs), dtype=np.int64)
+        for pending, edges in steps:
+            filled[pending] += 1
+            pair_edges[pair_end[pending] - filled[pending]] = edges
+        indptr = np.zeros(len(od_pairs) + 1, dtype=np.int64)
+        np.cumsum(lengths[trip_pair], out=indptr[1:])
+        return indptr, pair_edges[_concat_ranges(pair_end[trip_pair] - lengths[trip_pair], pair_end[trip_pair])]
+
+def _concat_ranges(starts, ends):
+    # np.concatenate([np.arange(a, b) for a, b in zip(starts, ends)]) without the loop
+    lengths = ends - starts
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(lengths.sum())
+
+class CompiledRouteSet:
+    # A batch of routes stored as a sparse trip-by-edge incidence matrix in
+    # CSR form: the edges of trip i are edge_ids[indptr[i]:indptr[i+1]].
+    # Every route must have at least one edge. Per-edge values are computed
+    # only for the distinct edges the routes use (edges, with their length,
+    # signal approach and its arrival rate) and gathered into entries
+    # through entry_edge. routes is a list of edge id arrays, or with
+    # indptr their concatenation (as from CompiledNetwork.trip_routes).
+    def __init__(self, compiled, routes, indptr=None):
+        if indptr is None:
+            indptr = np.zeros(len(routes) + 1, dtype=np.int64)
+            np.cumsum([len(route) for route in routes], out=indptr[1:])
+            edge_ids = np.concatenate(routes) if len(routes) else np.zeros(0, dtype=np.int32)
+        else:
+            edge_ids = np.asarray(routes, dtype=np.int32)
+        edges, entry_edge = np.unique(edge_ids, return_inverse=True)
+        edge_approach = compiled.edge_approach[edges]
+        self.signal_arrival_rate = compiled.arrival_rate[edge_approach[edge_approach >= 0]]
+        self._set_entries(indptr, edge_ids, edges, entry_edge, edge_approach, compiled.edge_length[edges])
+
+    def _set_entries(self, indptr, edge_ids, edges, entry_edge, edge_approach, edge_length):
+        self.num_trips = len(indptr) - 1
+        self.indptr = indptr
+        self.edge_ids = edge_ids
+        self.edges = edges
+        self.entry_edge = entry_edge.ravel()
+        self.edge_approach = edge_approach
+        self.edge_length = edge_length
+        # Positions in edges that end at a signal approach, and that approach
+        self.signal_edges = np.flatnonzero(edge_approach >= 0)
+        self.signal_approaches = edge_approach[self.signal_edges]
+        # Entries of the incidence matrix that end at a signal approach
+        self.crossings = np.flatnonzero(edge_approach[self.entry_edge] >= 0)
+        self.distances = self.entry_sum(edge_length[self.entry_edge])
+        self._edge_trips = None
+
+    def entry_sum(self, entry_values):
+        # Per-trip sum of a value given for every (trip, edge) entry; the
+        # last axis indexes entries, leading axes are kept
+        if self.num_trips == 0:
+            return np.zeros(entry_values.shape[:-1] + (0,))
+        return np.add.reduceat(entry_values, self.indptr[:-1], axis=-1)
+
+    def trip_sum(self, edge_values):
+        # Incidence matrix times a per-edge vector (or each row of a matrix)
+        return self.entry_sum(edge_values[..., self.edge_ids])
+
+    def trips_through(self, edge_ids):
+        # Sorted ids of the trips whose route uses any of the given edges,
+        # from an edge -> trips reverse index built on first use
+        if self._edge_trips is None:
+            order = np.argsort(self.edge_ids, kind='stable')
+            entry_trips = np.repeat(np.arange(self.num_trips, dtype=np.int32), np.diff(self.indptr))
+            self._edge_trips = (self.edge_ids[order], entry_trips[order])
+        sorted_edges, trips = self._edge_trips
+        edge_ids = np.asarray(edge_ids, dtype=sorted_edges.dtype) # (Mixed dtypes would copy sorted_edges per search)
+        entries = _concat_ranges(np.searchsorted(sorted_edges, edge_ids, side='left'), np.searchsorted(sorted_edges, edge_ids, side='right'))
+        return np.unique(trips[entries])
+
+    def subset(self, trips):
+        # Route set of the given trips (in that order). crossing_ids maps its
+        # signal crossings to this set's, so stop draws can be shared.
+        entries = _concat_ranges(self.indptr[trips], self.indptr[trips + 1])
+        used, entry_edge = np.unique(self.entry_edge[entries], return_inverse=True)
+        indptr = np.zeros(len(trips) + 1, dtype=np.int64)
+        np.cumsum(self.indptr[trips + 1] - self.indptr[trips], out=indptr[1:])
+        route_set = CompiledRouteSet.__new__(CompiledRouteSet)
+        route_set._set_entries(indptr, self.edge_ids[entries], self.edges[used], entry_edge, self.edge_approach[used], self.edge_length[used])
+        route_set.signal_arrival_rate = self.signal_arrival_rate[np.searchsorted(self.signal_edges, used[self.edge_approach[used] >= 0])]
+        route_set.crossing_ids = np.searchsorted(self.crossings, entries[route_set.crossings])
+        return route_set
+
+# --- Trip sampling ---
+
+class TripSample:
+    # A fixed set of origin/destination trips (all reachable, origin !=
+    # destination) plus the seed for stop draws. One sample is shared by
+    # every individual of a generation, so candidates are compared on common
+    # random numbers. `key` identifies the sample for fitness caching.
+    # routes, when given, fixes each trip's route as a list of edges (u, v)
+    # for the fixed-route simulators instead of the shortest path by length.
+    def __init__(self, od_pairs, seed, key, routes=None):
+        self.od_pairs = od_pairs
+        self.seed = seed
+        self.key = key
+        self.routes = routes
+        self._route_set = None
+
+    def get_route_set(self, compiled):
+        if self._route_set is None:
+            if self.routes is not None:
+                routes = [np.array([compiled.edge_index[edge] for edge in route], dtype=np.int32) for route in self.routes]
+                self._route_set = CompiledRouteSet(compiled, routes)
+            else:
+                indptr, edge_ids = compiled.trip_routes(self.od_pairs)
+                self._route_set = CompiledRouteSet(compiled, edge_ids, indptr)
+        return self._route_set
+
+class TripSampler:
+    # Draws TripSamples of num_vehicles trips.
+    #   weighting='uniform': every node is equally likely as origin/destination
+    #   weighting='demand':  origins and destinations weighted by vehicle_counts;
+    #                        a node's origin weight is the traffic it sends into
+    #                        signal approaches, its destination weight the traffic
+    #                        counted arriving at its light. Nodes with no count
+    #                        data get the mean weight of the counted ones.
+    #   stratified=True:     one draw per 1/num_vehicles stratum of the weight
+    #                        CDF (shuffled) instead of independent draws, so every
+    #                        part of the network is represented in every sample
+    # Pairs that coincide or have no route are dropped, so a sample may hold
+    # slightly fewer than num_vehicles trips.
+    def __init__(self, num_vehicles=200, weighting='uniform', stratified=False):
+        if weighting not in ('uniform', 'demand'):
+            raise ValueError(f"Unknown OD weighting: {weighting}")
+        self.num_vehicles = num_vehicles
+        self.weighting = weighting
+        self.stratified = stratified
+
+    def node_weights(self, network, nodes):
+        if self.weighting == 'uniform':
+            return np.ones(len(nodes)), np.ones(len(nodes))
+        node_index = {node: i for i, node in enumerate(nodes)}
+        origin_weights = np.zeros(len(nodes))
+        destination_weights = np.zeros(len(nodes))
+        for light_node, counts in network.vehicle_counts.items():
+            for approach, count in counts.items():
+                if approach in node_index and light_node in node_index:
+                    origin_weights[node_index[approach]] += count
+                    destination_weights[node_index[light_node]] += count
+        for weights in (origin_weights, destination_weights):
+            counted = weights > 0
+            weights[~counted] = weights[counted].mean() if counted.any() else 1.0
+        return origin_weights, destination_weights
+
+    def draw(self, rng, weights):
+        cdf = np.cumsum(weights) / weights.sum()
+        if self.stratified:
+            u = (rng.permutation(self.num_vehicles) + rng.random(self.num_vehicles)) / self.num_vehicles
+        else:
+            u = rng.random(self.num_vehicles)
+        return np.minimum(np.searchsorted(cdf, u, side='right'), len(weights) - 1)
+
+    def sample(self, network, seed):
+        rng = np.random.default_rng(seed)
+        route_cache = network.get_route_cache()
+        nodes = route_cache.nodes
+        origin_weights, destination_weights = self.node_weights(network, nodes)
+        origins = self.draw(rng, origin_weights)
+        destinations = self.draw(rng, destination_weights)
+        # Reachability from one distance row per distinct origin
+        kept = origins != destinations
+        order = np.argsort(origins, kind='stable')
+        for trips in np.split(order, np.flatnonzero(np.diff(origins[order])) + 1):
+            trips = trips[kept[trips]]
+            if len(trips):
+                kept[trips] = np.isfinite(route_cache._row(int(origins[trips[0]]))[1][destinations[trips]])
+        no_path = int((origins != destinations).sum() - kept.sum())
+        if no_path:
+            get_telemetry().count('no_path_trips', no_path)
+        od_pairs = [(nodes[origin], nodes[destination]) for origin, destination in zip(origins[kept].tolist(), destinations[kept].tolist())]
+        return TripSample(od_pairs, int(rng.integers(2**63)), (seed, self.num_vehicles, self.weighting, self.stratified))
 
 class TrafficSimulator:
     def __init__(self, network):
         self.network = network
 
+    def settings(self):
+        # Constructor options besides the network, by keyword; subclasses
+        # with options extend it
+        return {}
+
+    def for_network(self, network):
+        # A simulator of the same class and settings on another network
+        # (e.g. one district of this one)
+        return type(self)(network, **self.settings())
+
+    def get_phase(self, u, v, traffic_light_cycles):
+        # Signal timing seen by traffic on approach u -> v, or None if v has
+        # no light controlling that approach. The candidate's cycles take
+        # precedence over the plan loaded with the network.
+        light_info = self.network.traffic_lights.get(v)
+        if light_info is None or u not in light_info['cycle_phases']:
+            return None
+        return traffic_light_cycles.get(v, {}).get(u, light_info['cycle_phases'][u])
+
     def calculate_travel_time(self, path, speed_limits, traffic_light_cycles):
+        graph = self.network.get_graph_backend()
         total_time = 0
         for i in range(len(path) - 1):
             u, v = path[i], path[i+1]
-            edge_data = self.network.graph.get_edge_data(u, v)
+            edge_data = graph.get_edge_data(u, v)
             if edge_data:
                 length = edge_data['length']
                 speed_limit = speed_limits.get((u, v), edge_data['speed_limit'])
@@ -47,17 +983,14 @@ class TrafficSimulator:
                 total_time += travel_time_segment
 
                 # Add delay at traffic lights
-                if v in self.network.traffic_lights:
-                    # Simplified delay calculation: assume uniform arrival and fixed cycle
-                    # This is a very basic model, needs to be improved for accuracy
-                    light_info = self.network.traffic_lights[v]
-                    if u in light_info['cycle_phases']:
-                        phase = light_info['cycle_phases'][u]
-                        cycle_length = phase['green'] + phase['yellow'] + phase['red']
-                        # Average delay at a red light (assuming random arrival)
-                        # This is a simplification; actual delay depends on arrival time within cycle
-                        average_red_time = phase['red']
-                        total_time += average_red_time * 0.5 # Average wait is half of red phase
+                # Simplified delay calculation: assume uniform arrival and fixed cycle
+                # This is a very basic model, needs to be improved for accuracy
+                phase = self.get_phase(u, v, traffic_light_cycles)
+                if phase is not None:
+                    # Average delay at a red light (assuming random arrival)
+                    # This is a simplification; actual delay depends on arrival time within cycle
+                    average_red_time = phase['red']
+                    total_time += average_red_time * 0.5 # Average wait is half of red phase
             else:
                 print(f"Warning: Edge ({u}, {v}) not found in graph.")
                 return float('inf') # Indicate invalid path
@@ -67,18 +1000,59 @@ class TrafficSimulator:
         stops = 0
         for i in range(len(path) - 1):
             u, v = path[i], path[i+1]
-            if v in self.network.traffic_lights:
-                # Simplified stop calculation: assume a stop if light is red on arrival
-                # This needs to be more sophisticated, considering arrival time and cycle
-                light_info = self.network.traffic_lights[v]
-                if u in light_info['cycle_phases']:
-                    phase = light_info['cycle_phases'][u]
-                    # For simplicity, if red phase exists, assume potential for stop
-                    if phase['red'] > 0:
-                        stops += 1 # This is a very rough estimate
+            # Simplified stop calculation: assume a stop if light is red on arrival
+            # This needs to be more sophisticated, considering arrival time and cycle
+            phase = self.get_phase(u, v, traffic_light_cycles)
+            if phase is not None:
+                # For simplicity, if red phase exists, assume potential for stop
+                if phase['red'] > 0:
+                    stops += 1 # This is a very rough estimate
         return stops
 
-    def evaluate_solution(self, speed_limits, traffic_light_cycles):
+    def path_stops(self, path, speed_limits, traffic_light_cycles, rng=None):
+        # calculate_stops with the argument list every simulator understands;
+        # rng (a random.Random) replaces the random module for stop draws
+        return self.calculate_stops(path, traffic_light_cycles)
+
+    def evaluate_trip_sample(self, speed_limits, traffic_light_cycles, trip_sample):
+        # evaluate_solution over the trips of a TripSample instead of fresh
+        # random ones; velocity is the distance of the timed trips over their
+        # travel time. Stop draws come from a random.Random seeded with
+        # trip_sample.seed, so every candidate gets the same ones and the
+        # random module's state is left alone.
+        route_cache = self.network.get_route_cache()
+        rng = random.Random(trip_sample.seed)
+        telemetry = get_telemetry()
+        total_travel_time = 0
+        total_stops = 0
+        total_distance = 0
+        num_vehicles = 0
+        # One pass per stage, so each can be timed as a whole; stop draws
+        # still happen in trip order
+        with telemetry.timer('path_finding'):
+            paths = [route_cache.path(start_node, end_node) for start_node, end_node in trip_sample.od_pairs]
+        with telemetry.timer('travel_times'):
+            travel_times = [self.calculate_travel_time(path, speed_limits, traffic_light_cycles) for path in paths]
+        with telemetry.timer('stop_sampling'):
+            trip_stops = [self.path_stops(path, speed_limits, traffic_light_cycles, rng) for path in paths]
+        for (start_node, end_node), travel_time, stops in zip(trip_sample.od_pairs, travel_times, trip_stops):
+            if travel_time != float('inf'): # Only consider valid paths
+                total_travel_time += travel_time
+                total_stops += stops
+                total_distance += route_cache.distance(start_node, end_node)
+                num_vehicles += 1
+
+        if num_vehicles == 0: return 0, 0 # Avoid division by zero
+
+        average_velocity = (total_distance / total_travel_time) if total_travel_time > 0 else 0
+        average_stops = total_stops / num_vehicles
+
+        return average_velocity, average_stops
+
+    def evaluate_solution(self, speed_limits, traffic_light_cycles, trip_sample=None):
+        if trip_sample is not None:
+            return self.evaluate_trip_sample(speed_limits, traffic_light_cycles, trip_sample)
+
         # This function would simulate traffic flow and calculate metrics
         # For now, let's use a simplified approach based on paths
         total_travel_time = 0
@@ -87,15 +1061,16 @@ class TrafficSimulator:
 
         # Example: Simulate vehicles traversing random paths
         # In a real scenario, this would come from actual traffic demand models
-        nodes = list(self.network.graph.nodes())
+        route_cache = self.network.get_route_cache()
+        nodes = route_cache.nodes
         for _ in range(100): # Simulate 100 vehicles
             try:
                 start_node = random.choice(nodes)
                 end_node = random.choice(nodes)
                 if start_node == end_node: continue
 
-                # Find a simple path (for demonstration)
-                path = nx.shortest_path(self.network.graph, source=start_node, target=end_node, weight='length')
+                # Shortest path by length, looked up in the shared route cache
+                path = route_cache.path(start_node, end_node)
                 
                 travel_time = self.calculate_travel_time(path, speed_limits, traffic_light_cycles)
                 stops = self.calculate_stops(path, traffic_light_cycles)
@@ -104,112 +1079,809 @@ class TrafficSimulator:
                 total_stops += stops
                 num_vehicles += 1
             except nx.NetworkXNoPath:
+                get_telemetry().count('no_path_trips')
                 continue # No path between nodes
             except Exception as e:
                 print(f"Error during simulation: {e}")
+                get_telemetry().error('TrafficSimulator.evaluate_solution', e)
                 continue
 
         if num_vehicles == 0: return float('inf'), float('inf')
 
-        average_velocity = (sum(self.network.graph.get_edge_data(path[i], path[i+1])['length'] for i in range(len(path)-1)) / total_travel_time) if total_travel_time > 0 else 0
+        average_velocity = (sum(route_cache.graph.get_edge_data(path[i], path[i+1])['length'] for i in range(len(path)-1)) / total_travel_time) if total_travel_time > 0 else 0
         average_stops = total_stops / num_vehicles
 
         return average_velocity, average_stops
 
+def evaluate_on_trip_sample(simulator, population, trip_sample):
+    # Scores every row of population (genomes in CompiledNetwork layout) on
+    # the same trips and stop draws, so the result for a genome is a
+    # deterministic function of (genome, trip_sample) and differences
+    # between individuals are not sampling noise (dict-based simulators
+    # draw their stops from trip_sample.seed, see evaluate_trip_sample)
+    if hasattr(simulator, 'evaluate_population'):
+        return simulator.evaluate_population(population, trip_sample)
+    compiled = simulator.network.get_compiled_network()
+    velocities = np.zeros(len(population))
+    stops = np.zeros(len(population))
+    for i, genome in enumerate(population):
+        velocities[i], stops[i] = simulator.evaluate_solution(*compiled.decode_genome(genome), trip_sample=trip_sample)
+    return velocities, stops
+
+# Per-process state of a ParallelEvaluator worker, set once by the pool initializer
+_worker_simulator = None
+
+def _init_worker(simulator):
+    global _worker_simulator
+    _worker_simulator = simulator
+
+def _evaluate_chunk(task):
+    population, trip_sample = task
+    return evaluate_on_trip_sample(_worker_simulator, population, trip_sample)
+
+class ParallelEvaluator:
+    # Spreads population evaluation over a process pool. The simulator,
+    # together with its network graph, signal table, compiled arrays and route
+    # cache, is handed to each worker once through the pool initializer; a
+    # task only carries a slice of the population and the generation's
+    # TripSample. Because every chunk uses the same common random numbers,
+    # results match a single-process run with the same seed
+    # regardless of the worker count or which process picks up which chunk.
+    def __init__(self, simulator, workers):
+        self.simulator = simulator
+        self.workers = workers
+        # Compile before the workers start so they do not each repeat it
+        simulator.network.get_compiled_network()
+        if not hasattr(simulator, 'evaluate_population'):
+            # Dict-based simulators route their own sampled vehicles inside
+            # the workers, so ship them a complete route table
+            simulator.network.get_route_cache().build()
+        self.pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(simulator,))
+
+    def evaluate_population(self, population, trip_sample):
+        if hasattr(self.simulator, 'evaluate_population'):
+            # Build the trip-by-edge matrix once here instead of once per worker
+            trip_sample.get_route_set(self.simulator.network.get_compiled_network())
+        chunks = np.array_split(population, self.workers)
+        results = self.pool.map(_evaluate_chunk, [(chunk, trip_sample) for chunk in chunks], chunksize=1)
+        return np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+class DeltaEvaluator:
+    # In-process evaluator for simulators with per-trip records
+    # (trip_records / summarize_trips) whose routes do not depend on the
+    # candidate (fixed_routes). It keeps the per-trip travel times
+    # and stops of every genome it scored on the current trip sample; a
+    # child whose parents are given is then scored from the parent with the
+    # fewest differing genes, recomputing only the trips whose route uses a
+    # changed edge or signal approach (found through the route set's edge ->
+    # trips reverse index). Children that affect more than max_affected of
+    # the trips, or whose parents have no records, are evaluated in full.
+    # Whether a child can stay under that limit is first estimated from its
+    # number of changed genes times the mean number of trips per edge, for
+    # the whole population at once, so children of uniform crossover (which
+    # differ from both parents in many genes) go straight to the full
+    # evaluation without building any edge or trip sets.
+    # Results are identical to a full evaluation.
+    sample_genes = 4096 # Gene columns compared before counting changed genes exactly
+
+    def __init__(self, simulator, max_affected=0.1):
+        self.simulator = simulator
+        self.max_affected = max_affected
+        self.trip_sample = None
+        self.compiled = None
+        # [(genome, travel_times, stops)] over the trips of trip_sample, and
+        # their index fingerprint -> records, built on the first lookup (a
+        # call whose children all fall back to full evaluation never needs
+        # it). Genomes are found by a random projection (hashing their bytes
+        # costs more than the delta itself on large networks) and compared
+        # exactly before a record is used.
+        self.records = []
+        self.record_index = None
+        self.probe = None
+        self.stats = {'full': 0, 'delta': 0, 'trips_recomputed': 0, 'trips_total': 0}
+
+    def fingerprint(self, genome):
+        if self.probe is None or len(self.probe) != len(genome):
+            self.probe = np.random.default_rng(0).random(len(genome))
+        return float(genome @ self.probe)
+
+    def find_record(self, genome):
+        if self.record_index is None:
+            self.record_index = {}
+            for record in self.records:
+                self.record_index.setdefault(self.fingerprint(record[0]), []).append(record)
+        for candidate, travel_times, stops in self.record_index.get(self.fingerprint(genome), ()):
+            if np.array_equal(candidate, genome):
+                return travel_times, stops
+        return None
+
+    def changed_edges(self, compiled, genome, base):
+        # Edges whose speed gene or signal approach phases differ
+        changed = np.flatnonzero(genome != base)
+        speed_edges = changed[changed < compiled.num_edges]
+        approaches = np.unique((changed[changed >= compiled.num_edges] - compiled.num_edges) // 3)
+        return np.concatenate([speed_edges, compiled.approach_edge[approaches]])
+
+    def full_records(self, population, route_set):
+        # The simulator's trip_records, from the compiled network and stop
+        # draws already held for the sample
+        speeds, phases = self.compiled.split_genomes(np.asarray(population, dtype=np.float64))
+        return self.simulator.trip_travel_times(route_set, speeds, phases), self.simulator.trip_stops(route_set, phases, self.draws)
+
+    def changed_genes(self, population, parent, max_genes):
+        # Per individual, the number of its genes that differ from parent's,
+        # or inf where that is estimated to be over max_genes. The changed
+        # share of a block of sample_genes columns, scaled to the genome,
+        # rejects most children first (a wrong rejection only costs a child
+        # the delta path), so the exact count over whole genomes is only taken
+        # for the few that may pass. The GA mutates and recombines genes
+        # independently, so one contiguous block samples as well as scattered
+        # columns at a fraction of the reads.
+        num_genes = population.shape[1]
+        size = min(num_genes, self.sample_genes)
+        start = (num_genes - size) // 2
+        columns = slice(start, start + size)
+        within = np.count_nonzero(population[:, columns] != parent[:, columns], axis=1) * (num_genes / max(size, 1)) <= max_genes
+        if within.all():
+            return np.count_nonzero(population != parent, axis=1).astype(np.float64)
+        changed = np.full(len(population), np.inf)
+        rows = np.flatnonzero(within)
+        changed[rows] = np.count_nonzero(population[rows] != parent[rows], axis=1)
+        return changed
+
+    def evaluate_population(self, population, trip_sample, parents=None):
+        # parents: optional (parent1, parent2) arrays of genomes, one row per individual
+        if trip_sample is not self.trip_sample:
+            # The sample's route set holds on to its compiled network, so
+            # both are looked up once per sample (the staleness check of
+            # get_compiled_network walks the whole graph)
+            self.compiled = self.simulator.network.get_compiled_network()
+            self.trip_sample = trip_sample
+            self.records = []
+            self.record_index = None
+            self.draws = self.simulator.crossing_draws(trip_sample.get_route_set(self.compiled), trip_sample)
+        compiled = self.compiled
+        route_set = trip_sample.get_route_set(compiled)
+
+        # Parents worth looking up: changed genes times the mean number of
+        # trips per edge (an estimate of the affected trips) within max_affected
+        max_genes = self.max_affected * route_set.num_trips * max(compiled.num_edges, 1) / max(len(route_set.edge_ids), 1)
+        if parents is not None:
+            parents = [parent for j, parent in enumerate(parents) if all(parent is not other for other in parents[:j])]
+        changed = [self.changed_genes(population, parent, max_genes).tolist()
+                   for parent in (parents if parents is not None and self.records else ())]
+        if not any(count <= max_genes for counts in changed for count in counts):
+            changed = [] # Everything is evaluated in full below
+        else:
+            travel_times = np.empty((len(population), route_set.num_trips))
+            stops = np.empty((len(population), route_set.num_trips))
+            speeds, phases = compiled.split_genomes(np.asarray(population, dtype=np.float64))
+
+        full = []
+        for i, genome in enumerate(population):
+            # The base is the first parent with a record, fewest changed genes
+            # first (both parents of a mutation-only child are one genome)
+            base = None
+            for count, j in sorted((counts[i], j) for j, counts in enumerate(changed)):
+                if count > max_genes:
+                    break
+                record = self.find_record(parents[j][i])
+                if record is not None:
+                    base = (record, self.changed_edges(compiled, genome, parents[j][i]))
+                    break
+            trips = route_set.trips_through(base[1]) if base is not None else None
+            if trips is None or len(trips) > self.max_affected * route_set.num_trips:
+                full.append(i)
+                continue
+            (travel_times[i], stops[i]) = base[0]
+            if len(trips):
+                subset = route_set.subset(trips)
+                travel_times[i, trips] = self.simulator.trip_travel_times(subset, speeds[i], phases[i])
+                stops[i, trips] = self.simulator.trip_stops(subset, phases[i], self.draws[subset.crossing_ids])
+            self.stats['delta'] += 1
+            self.stats['trips_recomputed'] += len(trips)
+            self.stats['trips_total'] += route_set.num_trips
+        if len(full) == len(population):
+            travel_times, stops = self.full_records(population, route_set)
+        elif full:
+            travel_times[full], stops[full] = self.full_records(population[full], route_set)
+        if full:
+            self.stats['full'] += len(full)
+            self.stats['trips_recomputed'] += len(full) * route_set.num_trips
+            self.stats['trips_total'] += len(full) * route_set.num_trips
+
+        # Records of this call's genomes become the bases for the next one
+        self.records = [(genome, travel_times[i], stops[i]) for i, genome in enumerate(population)]
+        self.record_index = None
+        return self.simulator.summarize_trips(route_set.distances, travel_times, stops)
+
+    def close(self):
+        self.trip_sample = None
+        self.records = []
+        self.record_index = None
+
+class FitnessCache:
+    # Bounded LRU memo of (average_velocity, average_stops) per genome.
+    # Entries are keyed by a context (the GA passes the network_signature
+    # and simulator_signature it evaluates with), the TripSample key and a
+    # stable hash of the genome quantized to `quantum`, so a cached result
+    # is only reused on the same network, simulator, trips and stop draws
+    # it was computed with and is exactly what a fresh evaluation would
+    # return. One cache can serve runs on different networks.
+    approx_entry_bytes = 256 # key, value and OrderedDict slot overhead
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, quantum=1e-6):
+        self.max_bytes = max_bytes
+        self.quantum = quantum
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, sample_key, genome, context=()):
+        quantized = np.round(np.asarray(genome, dtype=np.float64) / self.quantum).astype(np.int64)
+        return ((*context, *sample_key), hashlib.blake2b(quantized.tobytes(), digest_size=16).digest())
+
+    def get(self, key):
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+            get_telemetry().count('fitness_cache_misses')
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        get_telemetry().count('fitness_cache_hits')
+        return result
+
+    def put(self, key, result):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) * self.approx_entry_bytes > self.max_bytes and self.entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def export_entries(self):
+        # (metadata, arrays) holding every entry, oldest first, for checkpoints
+        sample_keys = []
+        sample_index = {}
+        rows = []
+        for (sample_key, digest), (velocity, stops) in self.entries.items():
+            if sample_key not in sample_index:
+                sample_index[sample_key] = len(sample_keys)
+                sample_keys.append(list(sample_key))
+            rows.append((sample_index[sample_key], digest, velocity, stops))
+        metadata = {'max_bytes': self.max_bytes, 'quantum': self.quantum, 'sample_keys': sample_keys}
+        arrays = {
+            'cache_sample': np.array([row[0] for row in rows], dtype=np.int32),
+            'cache_digest': np.frombuffer(b''.join(row[1] for row in rows), dtype=np.uint8).reshape(-1, 16),
+            'cache_result': np.array([row[2:] for row in rows], dtype=np.float64).reshape(-1, 2),
+        }
+        return metadata, arrays
+
+    def import_entries(self, metadata, arrays):
+        sample_keys = [tuple(key) for key in metadata['sample_keys']]
+        for sample, digest, (velocity, stops) in zip(arrays['cache_sample'].tolist(), arrays['cache_digest'], arrays['cache_result'].tolist()):
+            self.put((sample_keys[sample], digest.tobytes()), (velocity, stops))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'approx_bytes': len(self.entries) * self.approx_entry_bytes,
+        }
+
+def rank_correlation(a, b):
+    # Spearman rank correlation (ties broken by position)
+    if len(a) < 2:
+        return None
+    ranks_a = np.empty(len(a))
+    ranks_a[np.argsort(a, kind='stable')] = np.arange(len(a))
+    ranks_b = np.empty(len(b))
+    ranks_b[np.argsort(b, kind='stable')] = np.arange(len(b))
+    return float(np.corrcoef(ranks_a, ranks_b)[0, 1])
+
+class SurrogateModel:
+    # Ridge regression of fitness on genome features, trained online on
+    # individuals the GA has already simulated and used to pre-screen
+    # offspring: in a screening generation only the screening_ratio best
+    # children by predicted fitness are simulated and the rest are dropped.
+    # Every retrain_every generations the whole population is simulated
+    # instead (an audit), the predictions made for it are compared with the
+    # simulated fitness (rank_correlation) and the model is refit on the
+    # latest max_samples individuals. Until min_samples individuals have
+    # been simulated nothing is screened.
+    # Screening also waits until the mean rank correlation of the last two
+    # audits reaches min_rank_correlation, and stops whenever later audits
+    # pull it below: a model that ranks children little better than chance
+    # drops good ones, and the GA ends worse than without it. (One audit of
+    # a small population is too noisy to go by, and the first audits, made
+    # with few samples, would hold the gate shut long after the model has
+    # learned.)
+    # The features are what the simulator's costs follow: the free-flow time
+    # 3.6 * length / speed of every edge and the red share
+    # red / (green + yellow + red) of every signal approach (raw genes until
+    # set_network gives the layout). The GA trains and audits the model on one
+    # trip sample, so all of its fitness values are comparable.
+    # More than num_features features are hashed into num_features signed
+    # buckets (random features), so fitting costs the same on any network.
+    # The sums of the normal equations are updated as samples come and go,
+    # so a refit is one num_features-sized solve whatever max_samples is.
+    def __init__(self, screening_ratio=0.5, retrain_every=5, alpha=10.0, num_features=512, max_samples=1000,
+                 min_samples=20, seed=0, min_rank_correlation=0.6):
+        self.screening_ratio = screening_ratio
+        self.min_rank_correlation = min_rank_correlation
+        self.retrain_every = max(1, retrain_every)
+        self.alpha = alpha
+        self.num_features = num_features
+        self.max_samples = max_samples
+        self.min_samples = min_samples
+        self.seed = seed
+        self.samples = collections.deque() # (features, fitness), at most max_samples
+        self.sums = None # (count, sum x, sum x x^T, sum x y, sum y) over samples
+        self.pending = [] # (sign, features, fitness) of samples added (+1) or dropped (-1) since the last fit
+        self.projection = None # (feature order, signs, bucket starts) when hashing
+        self.layout = None # (num_edges, 3.6 * edge_length) from set_network
+        self.weights = None
+        self.stats_counts = {'simulated': 0, 'skipped': 0, 'fits': 0, 'screened_generations': 0}
+        self.correlations = []
+
+    def set_network(self, compiled):
+        self.layout = (compiled.num_edges, 3.6 * compiled.edge_length)
+
+    def features(self, population):
+        population = np.asarray(population, dtype=np.float64)
+        if self.layout is not None:
+            num_edges, scaled_length = self.layout
+            phases = population[:, num_edges:].reshape(len(population), -1, 3)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                cycle_length = phases.sum(axis=-1)
+                red_share = np.where(cycle_length > 0, phases[..., RED] / cycle_length, 0.0)
+            population = np.concatenate([scaled_length / population[:, :num_edges], red_share], axis=1)
+        num_features = population.shape[1]
+        if num_features <= self.num_features:
+            return population
+        if self.projection is None or len(self.projection[0]) != num_features:
+            rng = np.random.default_rng(self.seed)
+            buckets = rng.integers(self.num_features, size=num_features)
+            order = np.argsort(buckets, kind='stable')
+            starts = np.searchsorted(buckets[order], np.arange(self.num_features))
+            used = np.unique(starts[starts < num_features]) # Empty buckets have nothing to sum
+            self.projection = (order, rng.choice((-1.0, 1.0), size=num_features)[order], used)
+        order, signs, starts = self.projection
+        return np.add.reduceat(population[:, order] * signs, starts, axis=1)
+
+    def add(self, population, fitness):
+        finite = np.isfinite(fitness)
+        X = self.features(np.asarray(population)[finite])
+        y = np.asarray(fitness, dtype=np.float64)[finite]
+        if self.sums is None or len(self.sums[1]) != X.shape[1]:
+            self.samples.clear()
+            self.pending = []
+            self.sums = (0, np.zeros(X.shape[1]), np.zeros((X.shape[1], X.shape[1])), np.zeros(X.shape[1]), 0.0)
+        for row, value in zip(X, y.tolist()):
+            self.samples.append((row, value))
+            self.pending.append((1.0, row, value))
+        while len(self.samples) > self.max_samples:
+            self.pending.append((-1.0,) + self.samples.popleft())
+
+    @property
+    def trained(self):
+        return self.weights is not None
+
+    def fit(self):
+        if len(self.samples) < self.min_samples:
+            return False
+        if self.pending:
+            sign = np.array([sign for sign, row, value in self.pending])
+            X = np.array([row for sign, row, value in self.pending])
+            y = np.array([value for sign, row, value in self.pending])
+            count, sum_x, sum_xx, sum_xy, sum_y = self.sums
+            self.sums = (count + int(sign.sum()), sum_x + sign @ X, sum_xx + (X.T * sign) @ X, sum_xy + (sign * y) @ X, sum_y + sign @ y)
+            self.pending = []
+        # Ridge on standardized features, solved in feature units: the
+        # centered X^T X plus alpha times each feature's variance
+        count, sum_x, sum_xx, sum_xy, sum_y = self.sums
+        mean, y_mean = sum_x / count, sum_y / count
+        gram = sum_xx - count * np.outer(mean, mean)
+        scale = np.sqrt(np.maximum(np.diag(gram), 0.0) / count)
+        scale[scale <= 1e-9 * np.maximum(np.abs(mean), 1.0)] = 1.0 # Constant features (up to rounding)
+        gram[np.diag_indices_from(gram)] += self.alpha * scale**2
+        coef = np.linalg.solve(gram, sum_xy - count * mean * y_mean) * scale
+        self.weights = (mean, scale, coef, y_mean)
+        self.stats_counts['fits'] += 1
+        return True
+
+    def predict(self, population):
+        mean, scale, coef, intercept = self.weights
+        return ((self.features(population) - mean) / scale) @ coef + intercept
+
+    def is_audit(self, generation):
+        return generation % self.retrain_every == 0
+
+    def screens(self, generation):
+        # Whether this generation's children are screened (see above)
+        return self.trained and not self.is_audit(generation) and len(self.correlations) >= 2 and \
+            np.mean(self.correlations[-2:]) >= self.min_rank_correlation
+
+    def num_simulated(self, population_size):
+        return max(1, min(population_size, int(math.ceil(self.screening_ratio * population_size))))
+
+    def record_audit(self, predicted, fitness):
+        correlation = rank_correlation(predicted, fitness)
+        if correlation is not None and np.isfinite(correlation):
+            self.correlations.append(correlation)
+
+    def stats(self):
+        return dict(self.stats_counts, samples=len(self.samples), audits=len(self.correlations),
+                    rank_correlation=float(np.mean(self.correlations)) if self.correlations else None,
+                    last_rank_correlation=self.correlations[-1] if self.correlations else None)
+
+# GA checkpoints are snapshot containers (traffic_io.write_snapshot) of kind
+# 'ga_checkpoint': the next generation's population, the generator state,
+# the best genome so far and the fitness cache entries, plus a signature of
+# the network they belong to. Surrogate models and island migration are not
+# part of a checkpoint.
+CHECKPOINT_KIND = 'ga_checkpoint'
+
+def network_signature(compiled):
+    # Changes with the topology, base speed limits, signal plan and vehicle counts
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(compiled.edges).encode('utf-8'))
+    for array in (compiled.edge_length, compiled.edge_speed_limit, compiled.approach_edge, compiled.default_phases, compiled.arrival_rate):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+def _describe(value):
+    # Stable text of a setting: arrays by content, objects by their public attributes
+    if isinstance(value, np.ndarray):
+        return f"array{value.shape}:{hashlib.blake2b(np.ascontiguousarray(value).tobytes(), digest_size=16).hexdigest()}"
+    if isinstance(value, (list, tuple)):
+        return '[' + ', '.join(_describe(item) for item in value) + ']'
+    if isinstance(value, dict):
+        return '{' + ', '.join(f"{key!r}: {_describe(item)}" for key, item in sorted(value.items())) + '}'
+    if hasattr(value, '__dict__'):
+        return type(value).__name__ + _describe({key: item for key, item in vars(value).items() if not key.startswith('_')})
+    return repr(value)
+
+def simulator_signature(simulator):
+    # Changes with the simulator class and its settings()
+    text = f"{type(simulator).__module__}.{type(simulator).__qualname__}{_describe(simulator.settings())}"
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+def write_checkpoint(path, metadata, arrays):
+    # Written beside path and renamed over it, so a run killed mid-write keeps its previous checkpoint
+    temporary = f"{os.fspath(path)}.tmp"
+    write_snapshot(temporary, dict(metadata, kind=CHECKPOINT_KIND), arrays)
+    os.replace(temporary, path)
+
+def read_checkpoint(path):
+    metadata, arrays = read_snapshot(path, mmap=False)
+    if metadata.get('kind') != CHECKPOINT_KIND:
+        raise ValueError(f"{path} is not an optimization checkpoint")
+    return metadata, arrays
+
 class TrafficOptimizer:
     def __init__(self, network, simulator):
         self.network = network
         self.simulator = simulator
-
-    def genetic_algorithm_optimize(self, generations=50, population_size=10, mutation_rate=0.1):
+        # Counters from the most recent genetic_algorithm_optimize run
+        self.run_stats = {}
+
+    # Gene ranges used for the initial population and for mutation
+    speed_limit_range = (30, 100) # km/h
+    phase_ranges = ((20, 60), (2, 5), (20, 60)) # green, yellow, red in seconds; cycle of roughly 60-120 seconds
+
+    def gene_bounds(self, compiled):
+        # Lower/upper bound per gene in CompiledNetwork genome layout
+        lower = np.concatenate([np.full(compiled.num_edges, self.speed_limit_range[0], dtype=np.float64),
+                                np.tile([low for low, high in self.phase_ranges], compiled.num_approaches)])
+        upper = np.concatenate([np.full(compiled.num_edges, self.speed_limit_range[1], dtype=np.float64),
+                                np.tile([high for low, high in self.phase_ranges], compiled.num_approaches)])
+        return lower, upper
+
+    def warm_start_population(self, plan, population_size, rng, spread=0.05):
+        # Initial population around a previous plan: the plan itself, then
+        # copies with every gene moved by Gaussian noise of spread times its
+        # range (clipped to the range). plan is a genome, a
+        # (speed_limits, traffic_light_cycles) solution or a checkpoint path,
+        # whose best genome is used.
+        compiled = self.network.get_compiled_network()
+        lower, upper = self.gene_bounds(compiled)
+        if isinstance(plan, (str, os.PathLike)):
+            metadata, arrays = read_checkpoint(plan)
+            if 'best_genome' not in arrays:
+                raise ValueError(f"{plan} holds no best solution yet")
+            plan = arrays['best_genome']
+        elif isinstance(plan, tuple):
+            plan = compiled.encode_solution(*plan)
+        plan = np.asarray(plan, dtype=np.float64)
+        if plan.shape != (compiled.num_genes,):
+            raise ValueError(f"Warm-start plan has {plan.size} genes, the network needs {compiled.num_genes}")
+        noise = rng.normal(size=(population_size - 1, compiled.num_genes)) * (spread * (upper - lower))
+        return np.concatenate([plan[np.newaxis], np.clip(plan + noise, lower, upper)])
+
+    def evaluate_population(self, population, trip_sample, evaluator=None, fitness_cache=None, parents=None, cache_context=()):
+        # Simulators with a batch API score the whole population in one call;
+        # others fall back to one evaluate_solution per decoded individual.
+        # With a fitness cache only genomes not yet scored on this trip
+        # sample are simulated, each distinct genome once; cache_context
+        # (network and simulator signatures) is part of every cache key. parents, the
+        # (parent1, parent2) genome arrays of each row, is passed on to a
+        # DeltaEvaluator.
+        if fitness_cache is None:
+            keys = list(range(len(population)))
+        else:
+            keys = [fitness_cache.key(trip_sample.key, genome, cache_context) for genome in population]
+
+        results = {}
+        pending = {} # key -> first row holding that genome
+        for row, key in enumerate(keys):
+            if key in results or key in pending: continue
+            cached = fitness_cache.get(key) if fitness_cache is not None else None
+            if cached is not None:
+                results[key] = cached
+            else:
+                pending[key] = row
+
+        if pending:
+            rows = list(pending.values())
+            if len(rows) < len(population): # No copies when every row is new
+                population = population[rows]
+                parents = [parent[rows] for parent in parents] if parents is not None else None
+            if parents is not None:
+                velocities, stops = evaluator.evaluate_population(population, trip_sample, parents)
+            elif evaluator is not None:
+                velocities, stops = evaluator.evaluate_population(population, trip_sample)
+            else:
+                velocities, stops = evaluate_on_trip_sample(self.simulator, population, trip_sample)
+            self.run_stats['evaluations'] += len(rows)
+            get_telemetry().count('evaluations', len(rows))
+            for key, velocity, stop in zip(pending, velocities.tolist(), stops.tolist()):
+                results[key] = (velocity, stop)
+                if fitness_cache is not None:
+                    fitness_cache.put(key, (velocity, stop))
+        return np.array([results[key][0] for key in keys]), np.array([results[key][1] for key in keys])
+
+    def genetic_algorithm_optimize(self, generations=50, population_size=10, mutation_rate=0.1, workers=None,
+                                   seed=None, trip_sampler=None, resample_trips=True, fitness_cache=None, incremental=False,
+                                   progress=None, telemetry=None, migration=None, surrogate=None, checkpoint_path=None,
+                                   checkpoint_every=10, resume_from=None, warm_start=None, warm_start_spread=0.05,
+                                   verbose=True, mutation_only=0.0):
         # Simplified Genetic Algorithm for demonstration
+        # Individuals are rows of a (population_size, num_genes) array in
+        # CompiledNetwork genome layout: speed limits per edge, then
+        # green/yellow/red per signal approach
+        # workers=N > 1 evaluates each generation on a pool of N processes
+        # seed makes the run reproducible; without it the random module's state is used
+        # trip_sampler (a TripSampler) sets how many trips are simulated and how they are drawn;
+        # it defaults to the simulator's own trip_sampler (MesoscopicTrafficSimulator's), else TripSampler()
+        # resample_trips=False keeps one trip sample for the whole run instead of one per generation
+        # fitness_cache (a FitnessCache) skips simulating genomes already scored on the same network,
+        # simulator settings and trips
+        # incremental=True scores children from their parents' per-trip records (see DeltaEvaluator);
+        # it applies when trips are not resampled, the simulator keeps per-trip records and
+        # evaluation runs in this process. Children of the uniform crossover below differ from
+        # both parents in too many genes to gain from it; mutation-only children do
+        # mutation_only is the share of children made without crossover: a copy of one elite parent
+        # with a single gene redrawn, scored (with incremental=True) from that parent's records
+        # progress is called after every generation with a dict of its statistics: 'generation',
+        # 'generations', 'best_fitness', 'mean_fitness', 'best_velocity', 'mean_velocity',
+        # 'best_stops', 'mean_stops', 'evaluations' and 'elapsed' (seconds since the start);
+        # when it returns True the run stops there and returns the best solution found so far
+        # telemetry (a traffic_telemetry.Telemetry) times the phases of the run and of the
+        # simulator, counts events and gets a trace record per generation; without it the
+        # active telemetry (normally the no-op one) is used
+        # migration is called after every generation but the last as migration(generation, elite,
+        # elite_fitness) with the selected top half (best first); genomes it returns replace the
+        # last children of the next population and are evaluated with it (see traffic_islands)
+        # surrogate (a SurrogateModel) simulates only the children it ranks best, except in its
+        # audit generations and while its audited rank correlation is below min_rank_correlation;
+        # selection then keeps the better half of the simulated children. A run with a surrogate
+        # keeps one trip sample (resample_trips=False)
+        # checkpoint_path writes a checkpoint there every checkpoint_every generations and after the
+        # last one; resume_from continues the run saved in a checkpoint (same network, population
+        # and trip sampling; generations is the total including the generations already run), with
+        # the same results as if it had not been interrupted
+        # warm_start seeds the initial population from a previous plan instead of random genomes
+        # (see warm_start_population), e.g. to re-optimize after a change in vehicle counts
+        # verbose=False leaves out the "Generation i/n" line printed at the start of every generation
+        if checkpoint_every < 1:
+            raise ValueError(f"checkpoint_every must be at least 1, got {checkpoint_every}")
+        if not 0 <= mutation_only <= 1:
+            raise ValueError(f"mutation_only must be between 0 and 1, got {mutation_only}")
+        compiled = self.network.get_compiled_network()
+        if surrogate is not None:
+            # The surrogate learns and is audited on one trip sample for the whole run
+            surrogate.set_network(compiled)
+            resample_trips = False
+        start_time = time.perf_counter()
+        rng = np.random.default_rng(seed) if seed is not None else numpy_rng()
+        if trip_sampler is None:
+            trip_sampler = getattr(self.simulator, 'trip_sampler', None) or TripSampler()
+        lower, upper = self.gene_bounds(compiled)
+        self.run_stats = {'evaluations': 0, 'generations': 0}
 
         # Initialize population (random speed limits and traffic light cycles)
-        population = []
-        for _ in range(population_size):
-            individual_speed_limits = {}
-            for u, v, data in self.network.graph.edges(data=True):
-                individual_speed_limits[(u, v)] = random.uniform(30, 100) # Random speed between 30-100 km/h
-
-            individual_traffic_light_cycles = {}
-            for light_node, light_info in self.network.traffic_lights.items():
-                individual_traffic_light_cycles[light_node] = {}
-                for approach in light_info['approaches']:
-                    # Ensure total cycle length is reasonable, e.g., 60-120 seconds
-                    green = random.uniform(20, 60)
-                    yellow = random.uniform(2, 5)
-                    red = random.uniform(20, 60)
-                    individual_traffic_light_cycles[light_node][approach] = {'green': green, 'yellow': yellow, 'red': red}
-            population.append((individual_speed_limits, individual_traffic_light_cycles))
-
-        best_solution = None
+        if warm_start is not None:
+            population = self.warm_start_population(warm_start, population_size, rng, warm_start_spread)
+        else:
+            population = rng.uniform(lower, upper, size=(population_size, compiled.num_genes))
+
+        best_genome = None
         best_avg_velocity = -float('inf')
         best_avg_stops = float('inf')
-
-        for generation in range(generations):
-            print(f"Generation {generation + 1}/{generations}")
-            # Evaluate population
-            evaluated_population = []
-            for speed_limits, cycles in population:
-                avg_velocity, avg_stops = self.simulator.evaluate_solution(speed_limits, cycles)
-                # Objective: Maximize avg_velocity, Minimize avg_stops
-                # Combine into a single fitness score (needs careful weighting)
-                fitness = avg_velocity - avg_stops * 0.1 # Example weighting
-                evaluated_population.append((fitness, speed_limits, cycles))
-
-            evaluated_population.sort(key=lambda x: x[0], reverse=True)
-
-            current_best_fitness, current_best_speed_limits, current_best_cycles = evaluated_population[0]
-            current_avg_velocity, current_avg_stops = self.simulator.evaluate_solution(current_best_speed_limits, current_best_cycles)
-
-            if current_avg_velocity > best_avg_velocity or \
-               (current_avg_velocity == best_avg_velocity and current_avg_stops < best_avg_stops):
-                best_avg_velocity = current_avg_velocity
-                best_avg_stops = current_avg_stops
-                best_solution = (current_best_speed_limits, current_best_cycles)
-
-            # Selection (elitism + roulette wheel/tournament)
-            selected = evaluated_population[:population_size // 2] # Elitism: take top half
-
-            # Crossover and Mutation to create new generation
-            next_population = []
-            while len(next_population) < population_size:
-                parent1_speed, parent1_cycles = random.choice(selected)[1:]
-                parent2_speed, parent2_cycles = random.choice(selected)[1:]
-
-                # Crossover for speed limits
-                child_speed = {}
-                for k in parent1_speed:
-                    child_speed[k] = random.choice([parent1_speed[k], parent2_speed[k]])
-
-                # Crossover for traffic light cycles
-                child_cycles = {}
-                for light_node in parent1_cycles:
-                    child_cycles[light_node] = {}
-                    for approach in parent1_cycles[light_node]:
-                        child_cycles[light_node][approach] = {
-                            'green': random.choice([parent1_cycles[light_node][approach]['green'], parent2_cycles[light_node][approach]['green']]),
-                            'yellow': random.choice([parent1_cycles[light_node][approach]['yellow'], parent2_cycles[light_node][approach]['yellow']]),
-                            'red': random.choice([parent1_cycles[light_node][approach]['red'], parent2_cycles[light_node][approach]['red']])
-                        }
-
-                # Mutation
-                for k in child_speed:
-                    if random.random() < mutation_rate:
-                        child_speed[k] = random.uniform(30, 100)
-
-                for light_node in child_cycles:
-                    for approach in child_cycles[light_node]:
-                        if random.random() < mutation_rate:
-                            child_cycles[light_node][approach]['green'] = random.uniform(20, 60)
-                        if random.random() < mutation_rate:
-                            child_cycles[light_node][approach]['yellow'] = random.uniform(2, 5)
-                        if random.random() < mutation_rate:
-                            child_cycles[light_node][approach]['red'] = random.uniform(20, 60)
-                
-                next_population.append((child_speed, child_cycles))
-            population = next_population
-
+        trip_sample = None
+        first_generation = 0
+        signature = network_signature(compiled) if checkpoint_path is not None or resume_from is not None or \
+            fitness_cache is not None else None
+
+        if resume_from is not None:
+            metadata, arrays = read_checkpoint(resume_from)
+            if metadata['network'] != signature:
+                raise ValueError(f"{resume_from} was saved for a different network or vehicle counts; use warm_start to start from its plan")
+            population = arrays['population'].copy()
+            population_size = len(population)
+            rng.bit_generator.state = metadata['rng_state']
+            first_generation = metadata['generation']
+            self.run_stats.update(evaluations=metadata['evaluations'], generations=first_generation)
+            best_avg_velocity, best_avg_stops = metadata['best_velocity'], metadata['best_stops']
+            if 'best_genome' in arrays:
+                best_genome = arrays['best_genome'].copy()
+            if metadata['trip_sample_seed'] is not None and not resample_trips:
+                trip_sample = trip_sampler.sample(self.network, metadata['trip_sample_seed'])
+            if metadata['fitness_cache'] is not None:
+                if fitness_cache is None:
+                    fitness_cache = FitnessCache(metadata['fitness_cache']['max_bytes'], metadata['fitness_cache']['quantum'])
+                fitness_cache.import_entries(metadata['fitness_cache'], arrays)
+        cache_context = (signature, simulator_signature(self.simulator)) if fitness_cache is not None else ()
+
+        evaluator = ParallelEvaluator(self.simulator, workers) if workers and workers > 1 else None
+        if evaluator is None and incremental and not resample_trips and getattr(self.simulator, 'fixed_routes', False) and \
+           getattr(self.simulator, 'incremental', True):
+            evaluator = DeltaEvaluator(self.simulator)
+        parents = None
+        telemetry = telemetry if telemetry is not None else get_telemetry()
+        try:
+            with use_telemetry(telemetry):
+                for generation in range(first_generation, generations):
+                    if verbose:
+                        print(f"Generation {generation + 1}/{generations}")
+                    # Evaluate population, every individual on the same trips and stop draws
+                    if trip_sample is None or resample_trips:
+                        with telemetry.timer('trip_sampling'):
+                            trip_sample = trip_sampler.sample(self.network, int(rng.integers(2**63)))
+                    predicted = None
+                    if surrogate is not None and surrogate.trained and (surrogate.is_audit(generation) or surrogate.screens(generation)):
+                        with telemetry.timer('screening'):
+                            predicted = surrogate.predict(population)
+                            if surrogate.screens(generation):
+                                keep = np.sort(np.argsort(-predicted, kind='stable')[:surrogate.num_simulated(len(population))])
+                                surrogate.stats_counts['screened_generations'] += 1
+                                surrogate.stats_counts['skipped'] += len(population) - len(keep)
+                                telemetry.count('surrogate_skipped', len(population) - len(keep))
+                                population, predicted = population[keep], predicted[keep]
+                                if parents is not None:
+                                    parents = (parents[0][keep], parents[1][keep])
+                    with telemetry.timer('evaluation'):
+                        velocities, stops = self.evaluate_population(population, trip_sample, evaluator, fitness_cache,
+                                                                     parents if isinstance(evaluator, DeltaEvaluator) else None,
+                                                                     cache_context)
+                    with telemetry.timer('selection'):
+                        # Objective: Maximize avg_velocity, Minimize avg_stops
+                        # Combine into a single fitness score (needs careful weighting)
+                        fitness = velocities - stops * 0.1 # Example weighting
+                        order = np.argsort(-fitness, kind='stable')
+
+                        # The best individual's metrics come from the same evaluation that ranked it
+                        current_best = order[0]
+                        current_avg_velocity, current_avg_stops = float(velocities[current_best]), float(stops[current_best])
+
+                        if current_avg_velocity > best_avg_velocity or \
+                           (current_avg_velocity == best_avg_velocity and current_avg_stops < best_avg_stops):
+                            best_avg_velocity = current_avg_velocity
+                            best_avg_stops = current_avg_stops
+                            best_genome = population[current_best].copy()
+
+                        # Selection (elitism + roulette wheel/tournament)
+                        selected = population[order[:max(1, len(population) // 2)]] # Elitism: take top half
+
+                    if surrogate is not None:
+                        with telemetry.timer('screening'):
+                            surrogate.stats_counts['simulated'] += len(population)
+                            surrogate.add(population, fitness)
+                            if surrogate.is_audit(generation):
+                                if predicted is not None:
+                                    surrogate.record_audit(predicted, fitness)
+                                surrogate.fit()
+
+                    self.run_stats['generations'] = generation + 1
+                    if progress is not None or telemetry.enabled:
+                        stats = {
+                            'generation': generation + 1, 'generations': generations,
+                            'best_fitness': float(fitness[current_best]), 'mean_fitness': float(fitness.mean()),
+                            'best_velocity': current_avg_velocity, 'mean_velocity': float(velocities.mean()),
+                            'best_stops': current_avg_stops, 'mean_stops': float(stops.mean()),
+                            'evaluations': self.run_stats['evaluations'], 'elapsed': time.perf_counter() - start_time}
+                        telemetry.generation(stats)
+                        if progress is not None and progress(stats):
+                            break
+
+                    with telemetry.timer('crossover'):
+                        # Crossover: each gene comes from one of two random elite parents
+                        parent1 = selected[rng.integers(len(selected), size=population_size)]
+                        parent2 = selected[rng.integers(len(selected), size=population_size)]
+                        if mutation_only > 0:
+                            # except in mutation-only children, copies of parent1 (their only parent)
+                            local = rng.random(population_size) < mutation_only
+                            parent2[local] = parent1[local]
+                            mixed, local = np.flatnonzero(~local), np.flatnonzero(local)
+                            children = parent1.copy()
+                            children[mixed] = np.where(rng.random((len(mixed), compiled.num_genes)) < 0.5, parent1[mixed], parent2[mixed])
+                        else:
+                            mixed = None
+                            children = np.where(rng.random(parent1.shape) < 0.5, parent1, parent2)
+                        parents = (parent1, parent2)
+
+                    with telemetry.timer('mutation'):
+                        # Mutation: redraw each gene from its range with probability mutation_rate;
+                        # a mutation-only child redraws a single gene
+                        if mixed is None:
+                            mutate = rng.random(children.shape) < mutation_rate
+                            population = np.where(mutate, rng.uniform(lower, upper, size=children.shape), children)
+                        else:
+                            population = children
+                            mutate = rng.random((len(mixed), compiled.num_genes)) < mutation_rate
+                            population[mixed] = np.where(mutate, rng.uniform(lower, upper, size=mutate.shape), children[mixed])
+                            genes = rng.integers(compiled.num_genes, size=len(local))
+                            population[local, genes] = rng.uniform(lower[genes], upper[genes])
+
+                    if migration is not None and generation + 1 < generations:
+                        with telemetry.timer('migration'):
+                            immigrants = migration(generation + 1, selected, fitness[order[:len(selected)]])
+                        if immigrants is not None and len(immigrants):
+                            immigrants = np.asarray(immigrants, dtype=np.float64)[:population_size]
+                            population[-len(immigrants):] = immigrants
+                            # No parent records for immigrants, so they are evaluated in full
+                            parent1[-len(immigrants):] = immigrants
+                            parent2[-len(immigrants):] = immigrants
+
+                    if checkpoint_path is not None and ((generation + 1) % checkpoint_every == 0 or generation + 1 == generations):
+                        with telemetry.timer('checkpoint'):
+                            metadata = {
+                                'generation': generation + 1, 'generations': generations, 'network': signature,
+                                'rng_state': rng.bit_generator.state, 'evaluations': self.run_stats['evaluations'],
+                                'best_velocity': best_avg_velocity, 'best_stops': best_avg_stops,
+                                'trip_sample_seed': None if resample_trips else trip_sample.key[0], 'fitness_cache': None}
+                            arrays = {'population': population}
+                            if best_genome is not None:
+                                arrays['best_genome'] = best_genome
+                            if fitness_cache is not None:
+                                metadata['fitness_cache'], cache_arrays = fitness_cache.export_entries()
+                                arrays.update(cache_arrays)
+                            write_checkpoint(checkpoint_path, metadata, arrays)
+        finally:
+            if evaluator is not None:
+                evaluator.close()
+            if fitness_cache is not None:
+                self.run_stats['fitness_cache'] = fitness_cache.stats()
+            if surrogate is not None:
+                self.run_stats['surrogate'] = surrogate.stats()
+            if isinstance(evaluator, DeltaEvaluator):
+                self.run_stats['incremental'] = dict(evaluator.stats)
+            if telemetry.enabled:
+                self.run_stats['telemetry'] = telemetry.summary()
+                telemetry.emit(dict(telemetry.summary(), type='run', run_stats={key: value for key, value in self.run_stats.items() if key != 'telemetry'}))
+
+        # Decoded once at the end: the best genome changes often in a long run
+        best_solution = compiled.decode_genome(best_genome) if best_genome is not None else None
         return best_solution, best_avg_velocity, best_avg_stops
 
 # --- Example Usage ---
@@ -287,6 +1959,19 @@ if __name__ == "__main__":
 # --- Enhancements for TrafficSimulator (More Realistic Modeling) ---
 
 class EnhancedTrafficSimulator(TrafficSimulator):
+    # Saturation flow rate (vehicles per unit time during green) - assume 1 vehicle per 2 seconds for simplicity
+    # This would ideally be calibrated with real data
+    saturation_flow_rate = 0.5 # vehicles per second
+
+    def __init__(self, network, expected_stops=False):
+        super().__init__(network)
+        # expected_stops=True counts the stop probability at each signal
+        # instead of flipping a coin, removing stop sampling noise entirely
+        self.expected_stops = expected_stops
+
+    def settings(self):
+        return {'expected_stops': self.expected_stops}
+
     def calculate_delay_at_light(self, arrival_rate, green_time, yellow_time, red_time):
         # Using a simplified M/D/1 queuing model for average delay at a signalized intersection
         # This is still a simplification, but better than just half of red time
@@ -297,15 +1982,15 @@ class EnhancedTrafficSimulator(TrafficSimulator):
         # Effective green time (considering lost time for yellow/all-red)
         effective_green = green_time + yellow_time # Assuming yellow is part of effective green for flow
 
-        # Saturation flow rate (vehicles per unit time during green) - assume 1 vehicle per 2 seconds for simplicity
-        # This would ideally be calibrated with real data
-        saturation_flow_rate = 0.5 # vehicles per second
-
         # Degree of saturation (traffic intensity)
-        if effective_green == 0: return float("inf") # No green time, infinite delay
-        x = arrival_rate * cycle_length / (saturation_flow_rate * effective_green)
+        if effective_green == 0: # No green time, infinite delay
+            get_telemetry().count('oversaturated_approaches')
+            return float("inf")
+        x = arrival_rate * cycle_length / (self.saturation_flow_rate * effective_green)
 
-        if x >= 1: return float("inf") # Congested, infinite delay
+        if x >= 1: # Congested, infinite delay
+            get_telemetry().count('oversaturated_approaches')
+            return float("inf")
 
         # Average delay per vehicle (Webster's formula approximation for uniform arrivals)
         # d = (C * (1-g/C)^2) / (2 * (1 - (g/C) * x)) + (x^2) / (2 * q * (1-x))
@@ -315,10 +2000,11 @@ class EnhancedTrafficSimulator(TrafficSimulator):
         return delay
 
     def calculate_travel_time(self, path, speed_limits, traffic_light_cycles):
+        graph = self.network.get_graph_backend()
         total_time = 0
         for i in range(len(path) - 1):
             u, v = path[i], path[i+1]
-            edge_data = self.network.graph.get_edge_data(u, v)
+            edge_data = graph.get_edge_data(u, v)
             if edge_data:
                 length = edge_data["length"]
                 speed_limit = speed_limits.get((u, v), edge_data["speed_limit"])
@@ -326,66 +2012,70 @@ class EnhancedTrafficSimulator(TrafficSimulator):
                 total_time += travel_time_segment
 
                 # Add delay at traffic lights if 'v' is a traffic light node
-                if v in self.network.traffic_lights:
-                    light_info = self.network.traffic_lights[v]
-                    # Find the approach corresponding to the current segment (u -> v)
-                    approach_key = u # Assuming 'u' is the approach node
-
-                    if approach_key in light_info["cycle_phases"]:
-                        phase = light_info["cycle_phases"][approach_key]
-                        green = phase["green"]
-                        yellow = phase["yellow"]
-                        red = phase["red"]
-
-                        # Estimate arrival rate for this approach
-                        # This is a very rough estimate; ideally, it comes from dynamic simulation
-                        arrival_rate = self.network.vehicle_counts.get(v, {}).get(approach_key, 0) / 3600 # vehicles per second
-
-                        delay = self.calculate_delay_at_light(arrival_rate, green, yellow, red)
-                        total_time += delay
+                # The approach corresponding to the current segment (u -> v) is 'u'
+                phase = self.get_phase(u, v, traffic_light_cycles)
+                if phase is not None:
+                    green = phase["green"]
+                    yellow = phase["yellow"]
+                    red = phase["red"]
+
+                    # Estimate arrival rate for this approach
+                    # This is a very rough estimate; ideally, it comes from dynamic simulation
+                    arrival_rate = self.network.vehicle_counts.get(v, {}).get(u, 0) / 3600 # vehicles per second
+
+                    delay = self.calculate_delay_at_light(arrival_rate, green, yellow, red)
+                    total_time += delay
             else:
                 return float("inf") # Invalid path
         return total_time
 
-    def calculate_stops(self, path, speed_limits, traffic_light_cycles):
-        stops = 0
+    def stop_probabilities(self, path, traffic_light_cycles):
+        # Probability of stopping at each signalized approach along the path
+        probabilities = []
         for i in range(len(path) - 1):
             u, v = path[i], path[i+1]
-            if v in self.network.traffic_lights:
-                light_info = self.network.traffic_lights[v]
-                approach_key = u
+            phase = self.get_phase(u, v, traffic_light_cycles)
+            if phase is not None:
+                # A stop is likely if a vehicle arrives during the red phase
+                # This is a probabilistic approach based on cycle times
+                cycle_length = phase["green"] + phase["yellow"] + phase["red"]
+                if cycle_length > 0:
+                    # Assuming uniform arrival, probability of stopping is prob_of_red
+                    # For a more accurate model, this would involve vehicle arrival times
+                    probabilities.append(phase["red"] / cycle_length)
+        return probabilities
+
+    def calculate_stops(self, path, speed_limits, traffic_light_cycles, rng=None):
+        if self.expected_stops:
+            return sum(self.stop_probabilities(path, traffic_light_cycles))
+        rng = rng or random
+        stops = 0
+        for prob_of_red in self.stop_probabilities(path, traffic_light_cycles):
+            if rng.random() < prob_of_red: # Simulate if a stop occurs
+                stops += 1
+        return stops
 
-                if approach_key in light_info["cycle_phases"]:
-                    phase = light_info["cycle_phases"][approach_key]
-                    green = phase["green"]
-                    yellow = phase["yellow"]
-                    red = phase["red"]
+    def path_stops(self, path, speed_limits, traffic_light_cycles, rng=None):
+        return self.calculate_stops(path, speed_limits, traffic_light_cycles, rng)
 
-                    # A stop is likely if a vehicle arrives during the red phase
-                    # This is a probabilistic approach based on cycle times
-                    cycle_length = green + yellow + red
-                    if cycle_length > 0:
-                        prob_of_red = red / cycle_length
-                        # Assuming uniform arrival, probability of stopping is prob_of_red
-                        # For a more accurate model, this would involve vehicle arrival times
-                        if random.random() < prob_of_red: # Simulate if a stop occurs
-                            stops += 1
-        return stops
+    def evaluate_solution(self, speed_limits, traffic_light_cycles, trip_sample=None):
+        if trip_sample is not None:
+            return self.evaluate_trip_sample(speed_limits, traffic_light_cycles, trip_sample)
 
-    def evaluate_solution(self, speed_limits, traffic_light_cycles):
         total_travel_time = 0
         total_stops = 0
         num_vehicles = 0
 
-        nodes = list(self.network.graph.nodes())
+        route_cache = self.network.get_route_cache()
+        nodes = route_cache.nodes
         for _ in range(200): # Simulate more vehicles for better average
             try:
                 start_node = random.choice(nodes)
                 end_node = random.choice(nodes)
                 if start_node == end_node: continue
 
-                # Find a simple path (for demonstration)
-                path = nx.shortest_path(self.network.graph, source=start_node, target=end_node, weight='length')
+                # Shortest path by length, looked up in the shared route cache
+                path = route_cache.path(start_node, end_node)
                 
                 travel_time = self.calculate_travel_time(path, speed_limits, traffic_light_cycles)
                 stops = self.calculate_stops(path, speed_limits, traffic_light_cycles) # Pass speed_limits and cycles
@@ -395,77 +2085,984 @@ class EnhancedTrafficSimulator(TrafficSimulator):
                     total_stops += stops
                     num_vehicles += 1
             except nx.NetworkXNoPath:
+                get_telemetry().count('no_path_trips')
                 continue
             except Exception as e:
                 # print(f"Error during simulation: {e}") # Uncomment for debugging
+                get_telemetry().error('EnhancedTrafficSimulator.evaluate_solution', e)
                 continue
 
         if num_vehicles == 0: return 0, 0 # Avoid division by zero
 
         # Calculate average velocity for all simulated paths
+        total_distance = self.sample_total_distance(nodes, route_cache)
+
+        average_velocity = (total_distance / total_travel_time) if total_travel_time > 0 else 0
+        average_stops = total_stops / num_vehicles
+
+        return average_velocity, average_stops
+
+    def sample_total_distance(self, nodes, route_cache, num_samples=200):
         total_distance = 0
-        for _ in range(200): # Recalculate total distance for average velocity
+        for _ in range(num_samples): # Recalculate total distance for average velocity
             try:
                 start_node = random.choice(nodes)
                 end_node = random.choice(nodes)
                 if start_node == end_node: continue
-                path = nx.shortest_path(self.network.graph, source=start_node, target=end_node, weight='length')
-                for i in range(len(path) - 1):
-                    u, v = path[i], path[i+1]
-                    edge_data = self.network.graph.get_edge_data(u, v)
-                    if edge_data: total_distance += edge_data["length"]
-            except nx.NetworkXNoPath:
-                continue
+                distance = route_cache.distance(start_node, end_node)
+                if distance != float('inf'): total_distance += distance
             except Exception as e:
+                get_telemetry().error('EnhancedTrafficSimulator.sample_total_distance', e)
+                continue
+        return total_distance
+
+class CompiledTrafficSimulator(EnhancedTrafficSimulator):
+    # EnhancedTrafficSimulator evaluated over a CompiledNetwork: the same
+    # segment time, Webster delay and stop model, but computed for all
+    # sampled trips at once with array operations instead of walking every
+    # path edge through dict lookups.
+    fixed_routes = True # Trips follow the shortest routes by length whatever the candidate
+
+    def approach_delays(self, phases, arrival_rate=None):
+        # Vectorized calculate_delay_at_light for every approach, or for the
+        # approaches whose rows phases holds when their arrival_rate is given
+        if arrival_rate is None:
+            arrival_rate = self.network.get_compiled_network().arrival_rate
+        green, yellow, red = phases[..., GREEN], phases[..., YELLOW], phases[..., RED]
+        cycle_length = green + yellow + red
+        effective_green = green + yellow
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x = arrival_rate * cycle_length / (self.saturation_flow_rate * effective_green)
+            green_ratio = effective_green / cycle_length
+            delay = (0.5 * cycle_length * (1 - green_ratio)**2) / (1 - green_ratio * x)
+        oversaturated = (effective_green == 0) | (x >= 1)
+        telemetry = get_telemetry()
+        if telemetry.enabled:
+            telemetry.count('oversaturated_approaches', int(np.count_nonzero(oversaturated & (cycle_length != 0))))
+        delay = np.where(oversaturated, np.inf, delay)
+        return np.where(cycle_length == 0, 0.0, delay)
+
+    def approach_stop_probabilities(self, phases):
+        cycle_length = phases.sum(axis=-1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(cycle_length > 0, phases[..., RED] / cycle_length, 0.0)
+
+    # Values are computed for the edges a route set uses rather than for
+    # every network edge, so the cost follows the sampled routes and not the
+    # network size, and a subset of trips can be recomputed on its own.
+
+    def edge_times(self, route_set, speeds, phases):
+        # Segment travel time plus signal delay for every edge of route_set.edges
+        times = route_set.edge_length / (speeds[..., route_set.edges] / 3.6) # Convert km/h to m/s
+        times[..., route_set.signal_edges] += self.approach_delays(phases[..., route_set.signal_approaches, :], route_set.signal_arrival_rate)
+        return times
+
+    def edge_stop_probabilities(self, route_set, phases):
+        probabilities = np.zeros(phases.shape[:-2] + (len(route_set.edges),))
+        probabilities[..., route_set.signal_edges] = self.approach_stop_probabilities(phases[..., route_set.signal_approaches, :])
+        return probabilities
+
+    def trip_travel_times(self, route_set, speeds, phases):
+        with get_telemetry().timer('travel_times'):
+            return route_set.entry_sum(self.edge_times(route_set, speeds, phases)[..., route_set.entry_edge])
+
+    def trip_stop_probabilities(self, route_set, phases):
+        return route_set.entry_sum(self.edge_stop_probabilities(route_set, phases)[..., route_set.entry_edge])
+
+    def trip_stops(self, route_set, phases, draws):
+        # draws holds one uniform number per signal crossing, as in
+        # calculate_stops. When phases holds several individuals they all
+        # share the same draws.
+        with get_telemetry().timer('stop_sampling'):
+            if self.expected_stops:
+                return self.trip_stop_probabilities(route_set, phases)
+            probabilities = self.edge_stop_probabilities(route_set, phases)[..., route_set.entry_edge[route_set.crossings]]
+            stopped = np.zeros(probabilities.shape[:-1] + (len(route_set.edge_ids),))
+            stopped[..., route_set.crossings] = draws < probabilities
+            return route_set.entry_sum(stopped)
+
+    def crossing_draws(self, route_set, trip_sample):
+        return np.random.default_rng(trip_sample.seed).random(len(route_set.crossings))
+
+    def sample_routes(self, compiled, num_vehicles=200):
+        nodes = compiled.route_cache.nodes
+        routes = []
+        for _ in range(num_vehicles):
+            start_node = random.choice(nodes)
+            end_node = random.choice(nodes)
+            if start_node == end_node: continue
+            try:
+                routes.append(compiled.route_edges(start_node, end_node))
+            except nx.NetworkXNoPath:
+                get_telemetry().count('no_path_trips')
                 continue
+        return CompiledRouteSet(compiled, routes)
+
+    def evaluate_solution(self, speed_limits, traffic_light_cycles, trip_sample=None):
+        compiled = self.network.get_compiled_network()
+        if trip_sample is not None:
+            velocities, stops = self.evaluate_population(compiled.encode_solution(speed_limits, traffic_light_cycles)[np.newaxis], trip_sample)
+            return float(velocities[0]), float(stops[0])
+
+        speeds = compiled.encode_speed_limits(speed_limits)
+        phases = compiled.encode_cycles(traffic_light_cycles)
+
+        route_set = self.sample_routes(compiled)
+        travel_times = self.trip_travel_times(route_set, speeds, phases)
+        stops = self.trip_stops(route_set, phases, numpy_rng().random(len(route_set.crossings)))
+
+        valid = np.isfinite(travel_times) # Only consider valid paths
+        num_vehicles = int(valid.sum())
+        if num_vehicles == 0: return 0, 0 # Avoid division by zero
+        total_travel_time = float(travel_times[valid].sum())
+        total_stops = float(stops[valid].sum())
+
+        total_distance = self.sample_total_distance(compiled.route_cache.nodes, compiled.route_cache)
 
         average_velocity = (total_distance / total_travel_time) if total_travel_time > 0 else 0
         average_stops = total_stops / num_vehicles
 
         return average_velocity, average_stops
 
-def generate_sample_gis_data(num_nodes=10, num_edges=20):
-    nodes = [chr(ord('A') + i) for i in range(num_nodes)]
+    def evaluate_population(self, population, trip_sample=None):
+        # Batch evaluate_solution for a (num_individuals, num_genes) array of
+        # genomes; returns (average_velocity, average_stops) vectors. All
+        # individuals are scored on the same trips and stop draws (a fresh
+        # default TripSample unless one is given), and velocity uses the
+        # distance of the trips that were actually timed.
+        if trip_sample is None:
+            trip_sample = TripSampler().sample(self.network, random.getrandbits(63))
+        travel_times, stops = self.trip_records(population, trip_sample)
+        return self.summarize_trips(trip_sample.get_route_set(self.network.get_compiled_network()).distances, travel_times, stops)
+
+    def trip_records(self, population, trip_sample):
+        # Per-trip contributions of every individual: (travel_times, stops),
+        # each of shape (num_individuals, num_trips)
+        compiled = self.network.get_compiled_network()
+        speeds, phases = compiled.split_genomes(np.asarray(population, dtype=np.float64))
+        route_set = trip_sample.get_route_set(compiled)
+        travel_times = self.trip_travel_times(route_set, speeds, phases)
+        stops = self.trip_stops(route_set, phases, self.crossing_draws(route_set, trip_sample))
+        return travel_times, stops
+
+    def summarize_trips(self, distances, travel_times, stops):
+        # (average_velocity, average_stops) vectors from per-trip records and trip distances
+        valid = np.isfinite(travel_times) # Only consider valid paths
+        num_valid = valid.sum(axis=-1)
+        total_travel_time = np.where(valid, travel_times, 0).sum(axis=-1)
+        total_stops = np.where(valid, stops, 0).sum(axis=-1)
+        total_distance = np.where(valid, distances, 0).sum(axis=-1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            average_velocity = np.where(total_travel_time > 0, total_distance / total_travel_time, 0.0)
+            average_stops = np.where(num_valid > 0, total_stops / num_valid, 0.0)
+        return average_velocity, average_stops
+
+# --- Travel-time routing ---
+
+def _hash_uniforms(seed, trips, approaches):
+    # Uniform [0, 1) number per (trip, signal approach) pair, a pure function
+    # of the seed (splitmix64 finalizer). Stop draws keyed this way stay
+    # common to all candidates even when their routes differ.
+    with np.errstate(over='ignore'):
+        x = np.uint64(seed) ^ (trips.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15) + approaches.astype(np.uint64) * np.uint64(0xD1B54A32D192ED03))
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        x = x ^ (x >> np.uint64(31))
+    return (x >> np.uint64(11)).astype(np.float64) * 2.0**-53
+
+class DynamicShortestPaths:
+    # Shortest-path trees from a set of source nodes over a CSRGraph under an
+    # edge weight vector that changes from call to call. update(weights)
+    # repairs each tree rather than recomputing it:
+    #   1. nodes below a tree edge that got heavier are detached and
+    #      reattached through their cheapest in-edge,
+    #   2. heads of edges that got lighter are offered the shorter distance,
+    #   3. a Dijkstra pass from the nodes touched in 1 and 2 settles every
+    #      node whose distance changed.
+    # Work is proportional to the part of each tree that changes. When more
+    # than max_changed of the edges change weight the trees are rebuilt from
+    # scratch instead, which is cheaper at that point.
+    # dist[row, node] is the distance from sources[row] (inf when
+    # unreachable) and pred[row, node] the edge id into node on its route.
+    def __init__(self, graph, sources, weights, max_changed=0.02):
+        self.graph = graph
+        self.max_changed = max_changed
+        self.indptr = graph.indptr.tolist()
+        self.indices = graph.indices.tolist()
+        self.in_indptr = graph.in_indptr.tolist()
+        self.in_edges = graph.in_edges.tolist()
+        self.edge_source = graph.edge_source.tolist()
+        self.weights = np.array(weights, dtype=np.float64)
+        self.sources = []
+        self.source_row = {}
+        self.dist = np.zeros((0, graph.number_of_nodes()))
+        self.pred = np.zeros((0, graph.number_of_nodes()), dtype=np.int32)
+        self.stats = {'rebuilds': 0, 'repairs': 0, 'trees_built': 0}
+        self.set_sources(sources)
+
+    def set_sources(self, sources):
+        # Keep the trees of sources already present, build the others
+        sources = list(dict.fromkeys(int(source) for source in sources))
+        rows = [self.source_row.get(source, -1) for source in sources]
+        num_nodes = self.graph.number_of_nodes()
+        dist = np.full((len(sources), num_nodes), np.inf)
+        pred = np.full((len(sources), num_nodes), -1, dtype=np.int32)
+        weights = None
+        for row, (source, old_row) in enumerate(zip(sources, rows)):
+            if old_row >= 0:
+                dist[row], pred[row] = self.dist[old_row], self.pred[old_row]
+            else:
+                weights = weights if weights is not None else self.weights.tolist()
+                self._build(dist[row], pred[row], source, weights)
+        self.sources = sources
+        self.source_row = {source: row for row, source in enumerate(sources)}
+        self.dist, self.pred = dist, pred
+
+    def _build(self, dist, pred, source, weights):
+        # Plain Dijkstra into one (dist, pred) row
+        indptr, indices = self.indptr, self.indices
+        settled = {}
+        edge_in = {}
+        seen = {source: 0.0}
+        fringe = [(0.0, source)]
+        while fringe:
+            d, u = heapq.heappop(fringe)
+            if u in settled:
+                continue
+            settled[u] = d
+            for e in range(indptr[u], indptr[u + 1]):
+                v = indices[e]
+                vu_dist = d + weights[e]
+                if vu_dist < seen.get(v, np.inf) and v not in settled:
+                    seen[v] = vu_dist
+                    edge_in[v] = e
+                    heapq.heappush(fringe, (vu_dist, v))
+        nodes = list(settled)
+        dist[nodes] = list(settled.values())
+        pred[list(edge_in)] = list(edge_in.values())
+        self.stats['trees_built'] += 1
+        get_telemetry().count('shortest_path_trees')
+
+    def update(self, weights):
+        weights = np.asarray(weights, dtype=np.float64)
+        increased = np.flatnonzero(weights > self.weights).tolist()
+        decreased = np.flatnonzero(weights < self.weights).tolist()
+        self.weights = weights.copy()
+        if not increased and not decreased:
+            return
+        if len(increased) + len(decreased) > self.max_changed * len(weights):
+            self.stats['rebuilds'] += 1
+            self.dist.fill(np.inf)
+            self.pred.fill(-1)
+            weight_list = weights.tolist()
+            for row, source in enumerate(self.sources):
+                self._build(self.dist[row], self.pred[row], source, weight_list)
+            return
+        self.stats['repairs'] += 1
+        get_telemetry().count('shortest_path_repairs', len(self.sources))
+        weight_list = weights.tolist()
+        for row in range(len(self.sources)):
+            self._repair(row, increased, decreased, weight_list)
+
+    def _repair(self, row, increased, decreased, weights):
+        indptr, indices, in_indptr, in_edges, edge_source = self.indptr, self.indices, self.in_indptr, self.in_edges, self.edge_source
+        # Row values as lists while repairing; written back below
+        dist_row, pred_row = self.dist[row], self.pred[row]
+        dist = {}
+        pred = {}
+        def get_dist(v):
+            return dist[v] if v in dist else float(dist_row[v])
+        def get_pred(v):
+            return pred[v] if v in pred else int(pred_row[v])
+
+        # 1. Detach the subtrees hanging from heavier tree edges
+        stack = [indices[e] for e in increased if get_pred(indices[e]) == e]
+        detached = []
+        detached_set = set()
+        while stack:
+            v = stack.pop()
+            if v in detached_set:
+                continue
+            detached_set.add(v)
+            detached.append(v)
+            for e in range(indptr[v], indptr[v + 1]):
+                if get_pred(indices[e]) == e:
+                    stack.append(indices[e])
+        for v in detached:
+            dist[v] = np.inf
+            pred[v] = -1
+        fringe = []
+        for v in detached:
+            best, best_edge = np.inf, -1
+            for k in range(in_indptr[v], in_indptr[v + 1]):
+                e = in_edges[k]
+                d = get_dist(edge_source[e]) + weights[e]
+                if d < best:
+                    best, best_edge = d, e
+            if best_edge >= 0:
+                dist[v], pred[v] = best, best_edge
+                heapq.heappush(fringe, (best, v))
+
+        # 2. Offer the shorter distances through lighter edges
+        for e in decreased:
+            v = indices[e]
+            d = get_dist(edge_source[e]) + weights[e]
+            if d < get_dist(v):
+                dist[v], pred[v] = d, e
+                heapq.heappush(fringe, (d, v))
+
+        # 3. Settle everything downstream of a changed distance
+        while fringe:
+            d, u = heapq.heappop(fringe)
+            if d > get_dist(u):
+                continue
+            for e in range(indptr[u], indptr[u + 1]):
+                v = indices[e]
+                vu_dist = d + weights[e]
+                if vu_dist < get_dist(v):
+                    dist[v], pred[v] = vu_dist, e
+                    heapq.heappush(fringe, (vu_dist, v))
+
+        if dist:
+            nodes = list(dist)
+            dist_row[nodes] = list(dist.values())
+            pred_row[nodes] = [pred[v] for v in nodes]
+
+class ReroutingTrafficSimulator(CompiledTrafficSimulator):
+    # CompiledTrafficSimulator where every candidate's trips take the fastest
+    # route under that candidate's own edge times: segment time at its speed
+    # limits plus the Webster delay of calculate_delay_at_light at each signal
+    # (oversaturated approaches, with infinite delay, are avoided). The
+    # shortest-path trees from the sample's origins are kept in a
+    # DynamicShortestPaths and repaired from one candidate to the next, so
+    # candidates that differ in a few genes cost a fraction of a full
+    # re-route. Stop draws are keyed by (trip, signal approach), so
+    # candidates keep common random numbers even when their routes differ.
+    fixed_routes = False
+
+    def __init__(self, network, expected_stops=False, max_changed=0.02):
+        super().__init__(network, expected_stops)
+        self.max_changed = max_changed
+        self._router = None
+        self._router_compiled = None
+
+    def settings(self):
+        return dict(super().settings(), max_changed=self.max_changed)
+
+    def network_edge_times(self, speeds, phases):
+        # Travel time of every edge of the network for one candidate
+        compiled = self.network.get_compiled_network()
+        times = compiled.edge_length / (speeds / 3.6) # Convert km/h to m/s
+        times[compiled.approach_edge] += self.approach_delays(phases)
+        return times
+
+    def get_router(self, compiled, origins, weights):
+        # Shortest-path trees from origins under weights, repaired from the
+        # previous call's when the network is unchanged
+        if self._router is None or self._router_compiled is not compiled:
+            # CSR adjacency numbers edges like the compiled network
+            self._router = DynamicShortestPaths(CSRGraph(*self.network._csr_arrays()), origins, weights, self.max_changed)
+            self._router_compiled = compiled
+        else:
+            self._router.update(weights)
+            self._router.set_sources(origins)
+        return self._router
+
+    def evaluation_order(self, weights):
+        # Visit the individuals so each differs from the previous one in as
+        # few edge weights as possible (greedy nearest neighbour, starting
+        # from the trees left by the last call): elites and lightly mutated
+        # children then cost a repair instead of a rebuild
+        previous = self._router.weights if self._router is not None and len(self._router.weights) == weights.shape[1] else None
+        remaining = list(range(len(weights)))
+        order = []
+        while remaining:
+            if previous is None:
+                best = remaining[0]
+            else:
+                changed = (weights[remaining] != previous).sum(axis=1)
+                best = remaining[int(np.argmin(changed))]
+            remaining.remove(best)
+            order.append(best)
+            previous = weights[best]
+        return order
+
+    def trip_records(self, population, trip_sample):
+        # Per-trip (travel_times, stops, distances), each (num_individuals, num_trips)
+        compiled = self.network.get_compiled_network()
+        speeds, phases = compiled.split_genomes(np.asarray(population, dtype=np.float64).reshape(-1, compiled.num_genes))
+        node_index = compiled.route_cache.node_index
+        origins = np.array([node_index[start_node] for start_node, end_node in trip_sample.od_pairs], dtype=np.int64)
+        destinations = np.array([node_index[end_node] for start_node, end_node in trip_sample.od_pairs], dtype=np.int64)
+        trip_ids = np.arange(len(origins))
+        shape = (len(speeds), len(origins))
+        travel_times, stops, distances = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+
+        telemetry = get_telemetry()
+        with telemetry.timer('travel_times'):
+            weights = np.array([self.network_edge_times(speeds[i], phases[i]) for i in range(len(speeds))]).reshape(len(speeds), compiled.num_edges)
+        for i in self.evaluation_order(weights):
+            with telemetry.timer('path_finding'):
+                router = self.get_router(compiled, origins.tolist(), weights[i])
+            graph = router.graph
+            rows = np.array([router.source_row[origin] for origin in origins.tolist()], dtype=np.int64)
+            travel_times[i] = router.dist[rows, destinations]
+            stop_probabilities = np.zeros(compiled.num_edges)
+            stop_probabilities[compiled.approach_edge] = self.approach_stop_probabilities(phases[i])
+
+            # Walk all routes back from their destinations in lockstep,
+            # collecting distance and stops
+            with telemetry.timer('stop_sampling'):
+                current = destinations.copy()
+                active = np.flatnonzero(np.isfinite(travel_times[i]) & (current != origins))
+                while len(active):
+                    edges = router.pred[rows[active], current[active]]
+                    distances[i, active] += compiled.edge_length[edges]
+                    if self.expected_stops:
+                        stops[i, active] += stop_probabilities[edges]
+                    else:
+                        crossing = compiled.edge_approach[edges] >= 0
+                        draws = _hash_uniforms(trip_sample.seed, trip_ids[active][crossing], compiled.edge_approach[edges][crossing])
+                        stops[i, active[crossing]] += draws < stop_probabilities[edges[crossing]]
+                    current[active] = graph.edge_source[edges]
+                    active = active[current[active] != origins[active]]
+        return travel_times, stops, distances
+
+    def evaluate_population(self, population, trip_sample=None):
+        if trip_sample is None:
+            trip_sample = TripSampler().sample(self.network, random.getrandbits(63))
+        travel_times, stops, distances = self.trip_records(population, trip_sample)
+        return self.summarize_trips(distances, travel_times, stops)
+
+    def evaluate_solution(self, speed_limits, traffic_light_cycles, trip_sample=None):
+        compiled = self.network.get_compiled_network()
+        velocities, stops = self.evaluate_population(compiled.encode_solution(speed_limits, traffic_light_cycles)[np.newaxis], trip_sample)
+        return float(velocities[0]), float(stops[0])
+
+# --- Time-of-day demand scenarios ---
+
+class DemandScenarios:
+    # Arrival rates (vehicles per second) of every signal approach under each
+    # of num_scenarios demand profiles, e.g. the 96 quarter-hours of a day:
+    #   rates:   float64[num_scenarios, len(approaches)]
+    #   weights: float64[num_scenarios], the vehicles of each scenario, used by
+    #            volume-weighted aggregation
+    #   labels:  one label per scenario (seconds since midnight for profiles
+    #            from a CountStore)
+    # approaches are (light_node, approach) pairs as in CompiledNetwork.
+    def __init__(self, approaches, rates, weights=None, labels=None):
+        self.approaches = list(approaches)
+        self.rates = np.asarray(rates, dtype=np.float64).reshape(-1, len(self.approaches))
+        self.num_scenarios = len(self.rates)
+        self.weights = np.asarray(weights, dtype=np.float64) if weights is not None else self.rates.sum(axis=1)
+        self.labels = list(labels) if labels is not None else list(range(self.num_scenarios))
+        self._aligned = None # (compiled, rates in its approach order)
+
+    def align(self, compiled):
+        # rates with columns in compiled's approach order; approaches the
+        # scenarios do not cover keep their static arrival rate
+        if self._aligned is None or self._aligned[0] is not compiled:
+            if self.approaches == compiled.approaches:
+                rates = self.rates
+            else:
+                rates = np.tile(compiled.arrival_rate, (self.num_scenarios, 1))
+                index = {approach: i for i, approach in enumerate(self.approaches)}
+                columns = [(j, index[approach]) for j, approach in enumerate(compiled.approaches) if approach in index]
+                if columns:
+                    targets, sources = zip(*columns)
+                    rates[:, list(targets)] = self.rates[:, list(sources)]
+            self._aligned = (compiled, rates)
+        return self._aligned[1]
+
+def scenarios_from_count_store(network, period=86400):
+    # One scenario per time-of-day bin of the network's CountStore (96 for
+    # 15-minute counts over a day): the mean count of each approach in that
+    # bin over all reported days. Bins an approach never reported fall back
+    # to its mean rate; approaches without timed counts use vehicle_counts.
+    store = network.count_store
+    if store is None:
+        raise ValueError("The network has no timed vehicle counts")
+    compiled = network.get_compiled_network()
+    slots = period // store.interval
+    slot = (store.bin_times() % period) // store.interval
+    counts = np.zeros((len(store.approaches), slots))
+    observed = np.zeros((len(store.approaches), slots))
+    np.add.at(counts.T, slot, np.where(store.observed(), store.counts(), 0).T)
+    np.add.at(observed.T, slot, store.observed().T)
+    mean_rate = store.hourly_volumes()[:, np.newaxis] / 3600
+    with np.errstate(divide='ignore', invalid='ignore'):
+        store_rates = np.where(observed > 0, counts / observed / store.interval, mean_rate)
+
+    rates = np.tile(compiled.arrival_rate, (slots, 1))
+    for i, approach in enumerate(store.approaches):
+        j = compiled.approach_index.get(approach)
+        if j is not None:
+            rates[:, j] = store_rates[i]
+    return DemandScenarios(compiled.approaches, rates, rates.sum(axis=1) * store.interval,
+                           (np.arange(slots) * store.interval).tolist())
+
+def scenarios_from_profile(network, profile, labels=None):
+    # Scenarios that scale the static vehicle_counts by each factor of
+    # profile (e.g. the share of daily traffic per hour times 24)
+    compiled = network.get_compiled_network()
+    profile = np.asarray(profile, dtype=np.float64)
+    rates = profile[:, np.newaxis] * compiled.arrival_rate[np.newaxis, :]
+    return DemandScenarios(compiled.approaches, rates, labels=labels)
+
+class ScenarioTrafficSimulator(CompiledTrafficSimulator):
+    # CompiledTrafficSimulator that scores every candidate under all demand
+    # scenarios in one vectorized pass. Routes, segment times and stops do
+    # not depend on demand, so they are computed once per candidate; only
+    # the Webster delays are evaluated per (candidate, scenario, approach)
+    # and summed per trip. evaluate_population reduces the
+    # (individuals, scenarios) results with `aggregate`:
+    #   'weighted'  volume-weighted mean over scenarios (scenarios.weights)
+    #   'mean'      plain mean over scenarios
+    #   'worst'     the scenario with the lowest fitness for each individual
+    incremental = False # No single per-trip record for DeltaEvaluator
+    aggregates = ('weighted', 'mean', 'worst')
+    max_chunk_cells = 4_000_000 # Bounds the (individuals, scenarios, crossings) delay array
+
+    def __init__(self, network, scenarios, aggregate='weighted', expected_stops=False):
+        if aggregate not in self.aggregates:
+            raise ValueError(f"Unknown scenario aggregate: {aggregate!r} (expected one of {', '.join(self.aggregates)})")
+        super().__init__(network, expected_stops)
+        self.scenarios = scenarios
+        self.aggregate = aggregate
+
+    def settings(self):
+        # The scenarios apply to other networks as they are: align() matches
+        # their rates to the network's approaches
+        return dict(super().settings(), scenarios=self.scenarios, aggregate=self.aggregate)
+
+    def evaluate_scenarios(self, population, trip_sample=None):
+        # (velocities, stops), each (num_individuals, num_scenarios)
+        if trip_sample is None:
+            trip_sample = TripSampler().sample(self.network, random.getrandbits(63))
+        compiled = self.network.get_compiled_network()
+        speeds, phases = compiled.split_genomes(np.asarray(population, dtype=np.float64).reshape(-1, compiled.num_genes))
+        route_set = trip_sample.get_route_set(compiled)
+        rates = self.scenarios.align(compiled)[:, route_set.signal_approaches] # (scenarios, route approaches)
+
+        # Demand-independent parts
+        base_times = route_set.entry_sum((route_set.edge_length / (speeds[:, route_set.edges] / 3.6))[:, route_set.entry_edge])
+        stops = self.trip_stops(route_set, phases, self.crossing_draws(route_set, trip_sample))
+
+        # Signal delay per crossing, summed per trip: crossings are entries in
+        # trip order, so trip i's are crossing_indptr[i]:crossing_indptr[i + 1]
+        crossing_signal = np.searchsorted(route_set.signal_edges, route_set.entry_edge[route_set.crossings])
+        crossing_indptr = np.searchsorted(route_set.crossings, route_set.indptr)
+        has_crossings = np.diff(crossing_indptr) > 0
+        travel_times = np.repeat(base_times[:, np.newaxis, :], self.scenarios.num_scenarios, axis=1)
+        chunk = max(1, self.max_chunk_cells // max(1, self.scenarios.num_scenarios * len(route_set.crossings)))
+        with get_telemetry().timer('travel_times'):
+            for start in range(0, len(speeds), chunk):
+                signal_phases = phases[start:start + chunk, np.newaxis][..., route_set.signal_approaches, :]
+                delays = self.approach_delays(signal_phases, rates)[..., crossing_signal]
+                # A zero column lets trips after the last crossing start at a valid index
+                delays = np.concatenate([delays, np.zeros(delays.shape[:-1] + (1,))], axis=-1)
+                trip_delays = np.add.reduceat(delays, crossing_indptr[:-1], axis=-1)
+                travel_times[start:start + chunk, :, has_crossings] += trip_delays[..., has_crossings]
+        velocities, average_stops = self.summarize_trips(route_set.distances, travel_times, stops[:, np.newaxis, :])
+        return velocities, average_stops
+
+    def aggregate_scenarios(self, velocities, stops, aggregate=None):
+        # (velocities, stops) per individual from (individuals, scenarios) results
+        aggregate = aggregate if aggregate is not None else self.aggregate
+        if aggregate == 'worst':
+            worst = np.argmin(velocities - stops * 0.1, axis=1)[:, np.newaxis] # The GA's fitness weighting
+            return np.take_along_axis(velocities, worst, axis=1)[:, 0], np.take_along_axis(stops, worst, axis=1)[:, 0]
+        weights = self.scenarios.weights if aggregate == 'weighted' else np.ones(self.scenarios.num_scenarios)
+        return velocities @ weights / weights.sum(), stops @ weights / weights.sum()
+
+    def scenario_report(self, speed_limits, traffic_light_cycles, trip_sample=None):
+        # Per-scenario velocity and stops of one plan plus every aggregate
+        compiled = self.network.get_compiled_network()
+        velocities, stops = self.evaluate_scenarios(compiled.encode_solution(speed_limits, traffic_light_cycles)[np.newaxis], trip_sample)
+        report = {'labels': self.scenarios.labels, 'velocity': velocities[0].tolist(), 'stops': stops[0].tolist()}
+        for aggregate in self.aggregates:
+            velocity, average_stops = self.aggregate_scenarios(velocities, stops, aggregate)
+            report[aggregate] = {'velocity': float(velocity[0]), 'stops': float(average_stops[0])}
+        return report
+
+    def evaluate_population(self, population, trip_sample=None):
+        return self.aggregate_scenarios(*self.evaluate_scenarios(population, trip_sample))
+
+    def evaluate_solution(self, speed_limits, traffic_light_cycles, trip_sample=None):
+        compiled = self.network.get_compiled_network()
+        velocities, stops = self.evaluate_population(compiled.encode_solution(speed_limits, traffic_light_cycles)[np.newaxis], trip_sample)
+        return float(velocities[0]), float(stops[0])
+
+# --- Mesoscopic (event-driven queue) simulation ---
+
+# Event kinds of MesoscopicTrafficSimulator
+DEPART, REACH_STOP_LINE, DISCHARGE = 0, 1, 2
+
+class MesoscopicTrafficSimulator(TrafficSimulator):
+    # Discrete-event link-queue simulation behind the usual
+    # evaluate_solution(speed_limits, traffic_light_cycles) interface.
+    # Vehicles cross each edge at the candidate speed limit, then join a
+    # FIFO queue at the stop line. An edge's queue discharges one vehicle per
+    # saturation headway while its approach shows green (always, on edges
+    # without a signal), so queues, platoons and the offsets between
+    # adjacent lights all follow from actual arrival times. An edge holds at
+    # most length / jam_spacing vehicles; a full edge blocks the queues
+    # feeding it (spillback) and holds new departures at their origin.
+    #
+    # Events are (time, sequence, kind, index) tuples in a binary heap, with
+    # the presorted departures merged in from a cursor. Edge
+    # queues are ring buffers carved out of one preallocated list, vehicle
+    # state lives in parallel preallocated lists, and per-vehicle results of
+    # the last run are kept as the structured array last_vehicles.
+    saturation_flow_rate = EnhancedTrafficSimulator.saturation_flow_rate # vehicles per second of green
+    jam_spacing = 7.5 # meters of road per stored vehicle
+    stop_delay_threshold = 2.0 # seconds waited at a stop line that count as a stop
+
+    def __init__(self, network, num_vehicles=1000, horizon=3600, trip_sampler=None, max_time=None):
+        super().__init__(network)
+        self.horizon = horizon # seconds over which departures are spread
+        self.trip_sampler = trip_sampler if trip_sampler is not None else TripSampler(num_vehicles)
+        # Vehicles still in the network at max_time are reported as incomplete
+        self.max_time = max_time if max_time is not None else 4 * horizon
+        self.last_vehicles = None
+        self.last_run = {}
+
+    def settings(self):
+        return {'horizon': self.horizon, 'trip_sampler': self.trip_sampler, 'max_time': self.max_time}
+
+    def evaluate_solution(self, speed_limits, traffic_light_cycles, trip_sample=None):
+        if trip_sample is None:
+            trip_sample = self.trip_sampler.sample(self.network, random.getrandbits(63))
+        vehicles = self.simulate(speed_limits, traffic_light_cycles, trip_sample)
+
+        completed = vehicles['arrive'] >= 0
+        if not completed.any(): return 0, 0 # Avoid division by zero
+        total_travel_time = float((vehicles['arrive'][completed] - vehicles['depart'][completed]).sum())
+        total_distance = float(vehicles['distance'][completed].sum())
+
+        average_velocity = (total_distance / total_travel_time) if total_travel_time > 0 else 0
+        average_stops = float(vehicles['stops'][completed].mean())
+
+        return average_velocity, average_stops
+
+    def simulate(self, speed_limits, traffic_light_cycles, trip_sample):
+        compiled = self.network.get_compiled_network()
+        speeds = compiled.encode_speed_limits(speed_limits)
+        phases = compiled.encode_cycles(traffic_light_cycles)
+        num_edges = compiled.num_edges
+
+        # Per-edge parameters
+        free_time = (compiled.edge_length / (speeds / 3.6)).tolist() # Convert km/h to m/s
+        capacity = np.maximum(1, (compiled.edge_length / self.jam_spacing).astype(np.int64))
+        green = np.zeros(num_edges)
+        cycle = np.zeros(num_edges) # 0 for edges without a signal
+        offset = np.zeros(num_edges)
+        green[compiled.approach_edge] = phases[:, GREEN] + phases[:, YELLOW] # Yellow is part of effective green, as in calculate_delay_at_light
+        cycle[compiled.approach_edge] = phases.sum(axis=1)
+        offset[compiled.approach_edge] = [self.network.traffic_lights[light_node].get('offset', 0) for light_node, approach in compiled.approaches]
+        green, cycle, offset = green.tolist(), cycle.tolist(), offset.tolist()
+        headway = 1 / self.saturation_flow_rate
+
+        # Edge queues: ring buffers in one preallocated list; a queue never
+        # holds more vehicles than its edge can store
+        queue_start = np.concatenate([[0], np.cumsum(capacity)[:-1]]).tolist()
+        capacity = capacity.tolist()
+        queue_buffer = [0] * sum(capacity)
+        queue_head = [0] * num_edges
+        queue_length = [0] * num_edges
+        occupancy = [0] * num_edges
+        next_service = [0.0] * num_edges
+        scheduled = [False] * num_edges
+        blocked = [False] * num_edges
+        # Edges whose head vehicle waits for space on this edge (>= 0), and
+        # vehicles waiting to depart onto it (encoded as -vehicle - 1)
+        waiters = [collections.deque() for _ in range(num_edges)]
+
+        # Vehicles: routes flattened into one edge list, position = index
+        # into it. The sample's route set is built once and reused by every
+        # candidate evaluated on the sample.
+        num_vehicles = len(trip_sample.od_pairs)
+        route_set = trip_sample.get_route_set(compiled)
+        route = route_set.edge_ids.tolist()
+        position = route_set.indptr[:-1].tolist()
+        route_end = route_set.indptr[1:].tolist()
+        depart = np.sort(np.random.default_rng(trip_sample.seed).uniform(0, self.horizon, num_vehicles)).tolist()
+        arrive = [-1.0] * num_vehicles
+        stop_line_time = [0.0] * num_vehicles
+        stops = [0] * num_vehicles
+        delay = [0.0] * num_vehicles
+
+        heap = []
+        sequence = 0
+        heappush, heappop = heapq.heappush, heapq.heappop
+        next_departure = 0 # Departures are already sorted, so they are merged in from a cursor instead of the heap
+        max_time = self.max_time
+        stop_delay_threshold = self.stop_delay_threshold
+        events = 0
+        now = 0.0
+        start = time.perf_counter()
+
+        while heap or next_departure < num_vehicles:
+            if next_departure < num_vehicles and (not heap or depart[next_departure] <= heap[0][0]):
+                t, kind, i = depart[next_departure], DEPART, next_departure
+                next_departure += 1
+            else:
+                t, _, kind, i = heappop(heap)
+            if t > max_time: break
+            events += 1
+            now = t
+
+            if kind == REACH_STOP_LINE:
+                e = route[position[i]]
+                queue_buffer[queue_start[e] + (queue_head[e] + queue_length[e]) % capacity[e]] = i
+                queue_length[e] += 1
+                stop_line_time[i] = t
+                if scheduled[e] or blocked[e]: continue
+                if next_service[e] > t:
+                    scheduled[e] = True
+                    sequence += 1
+                    heappush(heap, (next_service[e], sequence, DISCHARGE, e))
+                    continue
+                # The server is idle: serve the vehicle in this same step
+                # instead of scheduling a DISCHARGE event for time t
+                kind = DISCHARGE
+                i = e
+
+            if kind == DISCHARGE:
+                e = i
+                scheduled[e] = False
+                if queue_length[e] == 0: continue
+                c = cycle[e]
+                if c > 0:
+                    phase_time = (t - offset[e]) % c
+                    # The tolerance keeps a retry scheduled for the start of
+                    # green from landing a rounding error short of it
+                    if phase_time >= green[e] and c - phase_time > 1e-6:
+                        # Red: try again when the approach turns green
+                        scheduled[e] = True
+                        sequence += 1
+                        heappush(heap, (t + c - phase_time, sequence, DISCHARGE, e))
+                        continue
+                v = queue_buffer[queue_start[e] + queue_head[e]]
+                k = position[v] + 1
+                if k < route_end[v]:
+                    f = route[k]
+                    if occupancy[f] >= capacity[f]:
+                        # Spillback: wait until the next edge has room
+                        blocked[e] = True
+                        waiters[f].append(e)
+                        continue
+
+                queue_head[e] = (queue_head[e] + 1) % capacity[e]
+                queue_length[e] -= 1
+                occupancy[e] -= 1
+                wait = t - stop_line_time[v]
+                delay[v] += wait
+                if wait >= stop_delay_threshold:
+                    stops[v] += 1
+                if k < route_end[v]:
+                    position[v] = k
+                    occupancy[f] += 1
+                    sequence += 1
+                    heappush(heap, (t + free_time[f], sequence, REACH_STOP_LINE, v))
+                else:
+                    arrive[v] = t
+
+                next_service[e] = t + headway
+                if queue_length[e]:
+                    scheduled[e] = True
+                    sequence += 1
+                    heappush(heap, (t + headway, sequence, DISCHARGE, e))
+
+                # Room was freed on e: let waiting departures in and wake blocked upstream queues
+                waiting = waiters[e]
+                while waiting and occupancy[e] < capacity[e]:
+                    w = waiting.popleft()
+                    if w < 0:
+                        occupancy[e] += 1
+                        sequence += 1
+                        heappush(heap, (t + free_time[e], sequence, REACH_STOP_LINE, -w - 1))
+                    else:
+                        blocked[w] = False
+                        scheduled[w] = True
+                        sequence += 1
+                        heappush(heap, (t, sequence, DISCHARGE, w))
+
+            elif kind == DEPART:
+                e = route[position[i]]
+                if occupancy[e] < capacity[e] and not waiters[e]:
+                    occupancy[e] += 1
+                    sequence += 1
+                    heappush(heap, (t + free_time[e], sequence, REACH_STOP_LINE, i))
+                else:
+                    waiters[e].append(-i - 1)
+
+        elapsed = time.perf_counter() - start
+        vehicles = np.zeros(num_vehicles, dtype=[('depart', 'f8'), ('arrive', 'f8'), ('distance', 'f8'), ('stops', 'i4'), ('delay', 'f8')])
+        vehicles['depart'] = depart
+        vehicles['arrive'] = arrive
+        vehicles['distance'] = route_set.distances
+        vehicles['stops'] = stops
+        vehicles['delay'] = delay
+        completed = int((vehicles['arrive'] >= 0).sum())
+        self.last_vehicles = vehicles
+        self.last_run = {
+            'vehicles': num_vehicles,
+            'completed': completed,
+            'incomplete': num_vehicles - completed,
+            'events': events,
+            'simulated_time': now,
+            'wall_time': elapsed,
+            'events_per_sec': events / elapsed if elapsed > 0 else 0.0,
+            'vehicles_per_sec': num_vehicles / elapsed if elapsed > 0 else 0.0,
+        }
+        return vehicles
+
+# --- Sample and synthetic data ---
+# Every generator draws from rng, the random module by default; pass a
+# random.Random(seed) for reproducible data that leaves the global random
+# state alone.
+
+def _node_name(i):
+    # A, B, ..., Z, AA, AB, ... (spreadsheet column style)
+    name = ''
+    i += 1
+    while i:
+        i, remainder = divmod(i - 1, 26)
+        name = chr(ord('A') + remainder) + name
+    return name
+
+def generate_sample_gis_data(num_nodes=10, num_edges=20, rng=random):
+    # num_edges distinct one-way segments between random pairs of nodes
+    nodes = [_node_name(i) for i in range(num_nodes)]
+    num_pairs = num_nodes * (num_nodes - 1)
     gis_data = []
-    for _ in range(num_edges):
-        u = random.choice(nodes)
-        v = random.choice(nodes)
-        if u != v and not network.graph.has_edge(u, v):
-            length = random.randint(100, 1000) # meters
-            speed_limit = random.randint(30, 90) # km/h
-            gis_data.append({'from': u, 'to': v, 'length': length, 'speed_limit': speed_limit})
+    for pair in rng.sample(range(num_pairs), min(num_edges, num_pairs)):
+        i, j = divmod(pair, num_nodes - 1)
+        j += j >= i # Skip self-loops
+        length = rng.randint(100, 1000) # meters
+        speed_limit = rng.randint(30, 90) # km/h
+        gis_data.append({'from': nodes[i], 'to': nodes[j], 'length': length, 'speed_limit': speed_limit})
     return gis_data
 
-def generate_sample_traffic_light_locations(network_graph, num_lights=2):
+# The road network generators below yield two-way streets (one record per
+# direction) lazily, so even networks of 100k+ intersections stream into
+# load_gis_data chunk by chunk.
+
+def generate_grid_gis_data(rows, cols, rng=random):
+    # Manhattan grid; intersections are named "row_col"
+    for row in range(rows):
+        for col in range(cols):
+            for d_row, d_col in ((0, 1), (1, 0)):
+                if row + d_row < rows and col + d_col < cols:
+                    u, v = f"{row}_{col}", f"{row + d_row}_{col + d_col}"
+                    length = rng.randint(100, 1000)
+                    speed_limit = rng.randint(30, 90)
+                    yield {'from': u, 'to': v, 'length': length, 'speed_limit': speed_limit}
+                    yield {'from': v, 'to': u, 'length': length, 'speed_limit': speed_limit}
+
+def generate_radial_gis_data(rings, spokes, ring_spacing=300, rng=random):
+    # Ring roads crossed by spokes from a central node "C"; intersections
+    # are named "ring_spoke". Ring roads get the lower speed limits.
+    for ring in range(1, rings + 1):
+        ring_length = 2 * math.pi * ring * ring_spacing / spokes
+        for spoke in range(spokes):
+            inner = "C" if ring == 1 else f"{ring - 1}_{spoke}"
+            segments = [(inner, f"{ring}_{spoke}", ring_spacing, rng.randint(50, 90))]
+            if spokes > 2 or spoke == 0:
+                segments.append((f"{ring}_{spoke}", f"{ring}_{(spoke + 1) % spokes}", ring_length, rng.randint(30, 60)))
+            for u, v, length, speed_limit in segments:
+                length = round(length * rng.uniform(0.9, 1.1), 1)
+                yield {'from': u, 'to': v, 'length': length, 'speed_limit': speed_limit}
+                yield {'from': v, 'to': u, 'length': length, 'speed_limit': speed_limit}
+
+def generate_random_geometric_gis_data(num_nodes, mean_degree=4, spacing=250, rng=random):
+    # Intersections scattered uniformly over a square (spacing meters apart
+    # on average), with a street between every two closer than the radius
+    # that gives mean_degree neighbours. Intersections are named "g<i>";
+    # lengths are straight-line distances. The network may have
+    # disconnected parts.
+    side = spacing * math.sqrt(num_nodes)
+    radius = spacing * math.sqrt(mean_degree / math.pi)
+    points = [(rng.uniform(0, side), rng.uniform(0, side)) for _ in range(num_nodes)]
+    cells = collections.defaultdict(list) # Grid of radius-sized cells, so only neighbouring cells are searched
+    for i, (x, y) in enumerate(points):
+        cells[int(x // radius), int(y // radius)].append(i)
+    for i, (x, y) in enumerate(points):
+        cell_x, cell_y = int(x // radius), int(y // radius)
+        for d_x in (-1, 0, 1):
+            for d_y in (-1, 0, 1):
+                for j in cells.get((cell_x + d_x, cell_y + d_y), ()):
+                    if j <= i: continue
+                    length = math.hypot(points[j][0] - x, points[j][1] - y)
+                    if length <= radius:
+                        length = round(max(length, 10.0), 1)
+                        speed_limit = rng.randint(30, 90)
+                        yield {'from': f"g{i}", 'to': f"g{j}", 'length': length, 'speed_limit': speed_limit}
+                        yield {'from': f"g{j}", 'to': f"g{i}", 'length': length, 'speed_limit': speed_limit}
+
+def generate_sample_traffic_light_locations(network_graph, num_lights=2, rng=random):
+    # network_graph is a NetworkX graph or a graph backend (see get_graph_backend)
     traffic_light_locations = {}
-    possible_light_nodes = [node for node in network_graph.nodes() if network_graph.in_degree(node) > 1 and network_graph.out_degree(node) > 1]
+    possible_light_nodes = [node for node in network_graph.nodes if len(list(network_graph.predecessors(node))) > 1 and len(list(network_graph.successors(node))) > 1]
     
     # Ensure we don't try to create more lights than possible nodes
     num_lights = min(num_lights, len(possible_light_nodes))
 
-    selected_light_nodes = random.sample(possible_light_nodes, num_lights)
+    selected_light_nodes = rng.sample(possible_light_nodes, num_lights)
 
     for light_node in selected_light_nodes:
         approaches = list(network_graph.predecessors(light_node))
         cycle_phases = {}
         for approach in approaches:
-            green = random.randint(20, 60)
-            yellow = random.randint(2, 5)
-            red = random.randint(20, 60)
+            green = rng.randint(20, 60)
+            yellow = rng.randint(2, 5)
+            red = rng.randint(20, 60)
             cycle_phases[approach] = {'green': green, 'yellow': yellow, 'red': red}
         traffic_light_locations[light_node] = {'approaches': approaches, 'cycle_phases': cycle_phases}
     return traffic_light_locations
 
-def generate_sample_vehicle_count_data(traffic_light_locations, avg_daily_count=1000):
+def generate_sample_vehicle_count_data(traffic_light_locations, avg_daily_count=1000, rng=random):
     vehicle_count_data = {}
     for light_node, light_info in traffic_light_locations.items():
         vehicle_count_data[light_node] = {}
         for approach in light_info['approaches']:
             # Vary counts slightly around the average
-            count = max(100, int(avg_daily_count * random.uniform(0.8, 1.2)))
+            count = max(100, int(avg_daily_count * rng.uniform(0.8, 1.2)))
             vehicle_count_data[light_node][approach] = count
     return vehicle_count_data
 
+NETWORK_KINDS = ('grid', 'radial', 'geometric')
+
+def generate_gis_data(kind='grid', num_intersections=100, rng=random):
+    # Segments of a network of one of NETWORK_KINDS with about num_intersections intersections
+    if kind == 'grid':
+        rows = max(2, round(math.sqrt(num_intersections)))
+        return generate_grid_gis_data(rows, max(2, round(num_intersections / rows)), rng=rng)
+    if kind == 'radial':
+        spokes = max(4, round(math.sqrt(num_intersections)))
+        return generate_radial_gis_data(max(1, round((num_intersections - 1) / spokes)), spokes, rng=rng)
+    if kind == 'geometric':
+        return generate_random_geometric_gis_data(num_intersections, rng=rng)
+    raise ValueError(f"Unknown network kind: {kind}")
+
+def generate_network(kind='grid', num_intersections=100, seed=None, backend='networkx', light_fraction=1.0,
+                     avg_daily_count=1000, chunk_size=50000):
+    # A TrafficNetwork of about num_intersections intersections with signals
+    # at light_fraction of the eligible ones (two or more approaches and
+    # exits) and counts on every signal approach. The same arguments and
+    # seed always give the same network.
+    rng = random.Random(seed)
+    segments = generate_gis_data(kind, num_intersections, rng=rng)
+    network = TrafficNetwork(backend=backend)
+    network.load_gis_data(segments, chunk_size=chunk_size)
+    graph = network.get_graph_backend()
+    traffic_light_locations = generate_sample_traffic_light_locations(graph, num_lights=round(light_fraction * graph.number_of_nodes()), rng=rng)
+    network.load_traffic_light_locations(traffic_light_locations)
+    network.load_vehicle_count_data(generate_sample_vehicle_count_data(traffic_light_locations, avg_daily_count, rng=rng))
+    return network
+
 # Modify the main execution block to use generated data
 if __name__ == "__main__":
     network = TrafficNetwork()
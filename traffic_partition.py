@@ -0,0 +1,288 @@
+
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from traffic_io import lazy_import
+from traffic_optimizer import (CSRGraph, DynamicShortestPaths, ReroutingTrafficSimulator, TrafficNetwork, TrafficOptimizer,
+                               TripSample, TripSampler)
+
+nx = lazy_import('networkx')
+
+# Spatial decomposition: the network is split into districts (a balanced
+# partition with a small cut), each district is optimized by its own
+# TrafficOptimizer run on a sub-network, in parallel, and the district plans
+# are merged into one city-wide plan.
+#
+# A district owns every edge that ends at one of its nodes, together with
+# the signal approach on that edge, so every gene has exactly one owner and
+# a district's sub-network is its owned edges (incoming boundary edges
+# included). City-wide trips are routed once on the whole network and cut
+# into per-district segments; a district is optimized on its own segments,
+# which is where the boundary flows enter. A segment keeps the edges of the
+# city-wide route it was cut from, so fixed-route district simulators score
+# it along that route rather than re-routing it by length on the district.
+# (ReroutingTrafficSimulator districts route each candidate's trips by
+# travel time, as the city-wide simulator does.) Travel time and stops of a trip
+# are sums over its segments, so improving every district's segments
+# improves the city-wide objective.
+#
+# Boundary handling:
+#   'fixed'     trips follow shortest routes by length, so segments are cut
+#               once and each district is optimized once
+#   'exchange'  trips follow the fastest routes under the current city-wide
+#               plan (segment time plus signal delay, the edge times of
+#               ReroutingTrafficSimulator). After every round the
+#               district plans are merged, trips are re-routed on the merged
+#               plan and re-cut, and the districts are re-optimized starting
+#               from the merged plan (warm start); the best merged plan over
+#               all rounds is kept
+
+BOUNDARY_MODES = ('fixed', 'exchange')
+
+def _bfs_order(graph, nodes):
+    # Nodes in breadth-first order from a pseudo-peripheral node of each
+    # connected component, largest component first; prefixes of the order
+    # are compact regions
+    order = []
+    subgraph = graph.subgraph(nodes)
+    for component in sorted(nx.connected_components(subgraph), key=len, reverse=True):
+        start = min(component)
+        for _ in range(2): # The farthest node from the farthest node is close to the periphery
+            start = list(nx.bfs_tree(subgraph, start))[-1]
+        order.extend(nx.bfs_tree(subgraph, start))
+    return order
+
+def partition_network(network, num_parts, seed=0, max_iter=10):
+    # Returns {node: part} with parts 0..num_parts-1 of (nearly) equal node
+    # counts. Recursive bisection: each split starts from a breadth-first
+    # region grown from the periphery and is refined by Kernighan-Lin swaps,
+    # which keep the part sizes and reduce the number of cut edges.
+    nodes, indptr, indices = network._csr_arrays()[:3]
+    sources = np.repeat(np.arange(len(nodes)), np.diff(indptr))
+    graph = nx.Graph()
+    graph.add_nodes_from(range(len(nodes)))
+    for u, v in zip(sources.tolist(), np.asarray(indices).tolist()):
+        if u != v:
+            weight = graph[u][v]['weight'] + 1 if graph.has_edge(u, v) else 1
+            graph.add_edge(u, v, weight=weight)
+
+    assignment = np.zeros(len(nodes), dtype=np.int32)
+    pending = [(list(range(len(nodes))), 0, num_parts)] # (nodes, first part, number of parts)
+    while pending:
+        part_nodes, first_part, parts = pending.pop()
+        if parts == 1 or len(part_nodes) < 2:
+            assignment[part_nodes] = first_part
+            continue
+        left_parts = parts // 2
+        order = _bfs_order(graph, part_nodes)
+        split = int(round(len(order) * left_parts / parts))
+        left, right = nx.community.kernighan_lin_bisection(graph.subgraph(part_nodes), partition=(set(order[:split]), set(order[split:])),
+                                                          max_iter=max_iter, weight='weight', seed=seed)
+        pending.append((sorted(left), first_part, left_parts))
+        pending.append((sorted(right), first_part + left_parts, parts - left_parts))
+    return {node: int(part) for node, part in zip(nodes, assignment.tolist())}
+
+class SegmentTripSampler:
+    # TripSampler stand-in that draws a district's trips from a fixed pool of
+    # route segments (origin, destination) instead of from the whole network.
+    # routes gives each segment's edges (u, v); the samples keep them.
+    def __init__(self, segments, num_vehicles=200, pool_key=None, routes=None):
+        self.segments = segments
+        self.num_vehicles = num_vehicles
+        self.pool_key = pool_key
+        self.routes = routes
+
+    def sample(self, network, seed):
+        rng = np.random.default_rng(seed)
+        picks = rng.integers(len(self.segments), size=min(self.num_vehicles, len(self.segments))).tolist()
+        routes = [self.routes[i] for i in picks] if self.routes is not None else None
+        return TripSample([self.segments[i] for i in picks], int(rng.integers(2**63)),
+                          (seed, self.num_vehicles, 'segments', self.pool_key), routes)
+
+def _optimize_district(task):
+    # Pool worker: one district's GA run; returns its plan in label form
+    optimizer = TrafficOptimizer(task['network'], task['simulator'])
+    solution, velocity, stops = optimizer.genetic_algorithm_optimize(**task['settings'], verbose=False)
+    return task['part'], solution, velocity, stops, optimizer.run_stats
+
+class PartitionedOptimizer:
+    def __init__(self, network, simulator, num_partitions=4, assignment=None, boundary='fixed', rounds=3, workers=None,
+                 simulator_factory=None, partition_seed=0):
+        # assignment ({node: part}) fixes the districts, e.g. to planning
+        # corridors; otherwise partition_network splits the network into
+        # num_partitions. simulator scores the merged city-wide plan;
+        # districts use simulator_factory(sub_network), by default
+        # simulator.for_network(sub_network). workers is the number of
+        # district runs at a time (default: one per district, up to the CPU
+        # count).
+        if boundary not in BOUNDARY_MODES:
+            raise ValueError(f"Unknown boundary mode: {boundary!r} (expected one of {', '.join(BOUNDARY_MODES)})")
+        self.network = network
+        self.simulator = simulator
+        if assignment is not None:
+            # District labels (any values) become part numbers 0..k-1; every node needs one
+            labels = {label: part for part, label in enumerate(sorted(set(assignment.values()), key=str))}
+            assignment = {node: labels[label] for node, label in assignment.items()}
+            num_partitions = len(labels)
+        self.num_partitions = num_partitions
+        self.assignment = assignment
+        self.boundary = boundary
+        self.rounds = rounds if boundary == 'exchange' else 1
+        self.workers = workers
+        self.simulator_factory = simulator_factory
+        self.partition_seed = partition_seed
+        # Counters from the most recent run
+        self.run_stats = {}
+
+    def get_assignment(self):
+        if self.assignment is None:
+            self.assignment = partition_network(self.network, self.num_partitions, self.partition_seed)
+        return self.assignment
+
+    def edge_owners(self, compiled):
+        # District of every edge (that of its head node)
+        assignment = self.get_assignment()
+        return np.array([assignment[v] for u, v in compiled.edges], dtype=np.int32)
+
+    def district_network(self, compiled, owners, part):
+        # Sub-network of one district: its owned edges, lights and counts
+        network = TrafficNetwork(backend=self.network.backend)
+        owned = np.flatnonzero(owners == part)
+        network.load_gis_data([{'from': compiled.edges[e][0], 'to': compiled.edges[e][1], 'length': float(compiled.edge_length[e]),
+                                'speed_limit': float(compiled.edge_speed_limit[e])} for e in owned.tolist()])
+        assignment = self.get_assignment()
+        network.load_traffic_light_locations({light_node: light_info for light_node, light_info in self.network.traffic_lights.items()
+                                              if assignment.get(light_node) == part})
+        network.load_vehicle_count_data({light_node: counts for light_node, counts in self.network.vehicle_counts.items()
+                                         if assignment.get(light_node) == part})
+        return network
+
+    def trip_routes(self, compiled, od_pairs, genome):
+        # Edge ids of every routable trip: by length ('fixed') or fastest
+        # under genome's edge times ('exchange')
+        if self.boundary == 'fixed':
+            indptr, edge_ids = compiled.trip_routes(od_pairs)
+            return [route for route in np.split(edge_ids, indptr[1:-1]) if len(route)]
+        speeds, phases = compiled.split_genomes(genome)
+        timing = self.simulator if isinstance(self.simulator, ReroutingTrafficSimulator) else ReroutingTrafficSimulator(self.network)
+        weights = timing.network_edge_times(speeds, phases)
+        node_index = compiled.route_cache.node_index
+        origins = [node_index[start_node] for start_node, end_node in od_pairs]
+        router = DynamicShortestPaths(CSRGraph(*self.network._csr_arrays()), sorted(set(origins)), weights)
+        routes = []
+        for origin, (start_node, end_node) in zip(origins, od_pairs):
+            row, node = router.source_row[origin], node_index[end_node]
+            if not np.isfinite(router.dist[row, node]):
+                continue
+            route = []
+            while node != origin:
+                edge = int(router.pred[row, node])
+                route.append(edge)
+                node = router.edge_source[edge]
+            routes.append(np.array(route[::-1], dtype=np.int64))
+        return routes
+
+    def district_segments(self, compiled, owners, routes):
+        # Cuts every route where it crosses into another district; returns
+        # {part: [(start_node, end_node)]} and {part: [[(u, v), ...]]}, the
+        # edges of each segment
+        segments = {part: [] for part in range(self.num_partitions)}
+        segment_routes = {part: [] for part in range(self.num_partitions)}
+        for route in routes:
+            route_owners = owners[route]
+            starts = np.concatenate([[0], np.flatnonzero(np.diff(route_owners)) + 1])
+            ends = np.concatenate([starts[1:], [len(route)]])
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                part = int(route_owners[start])
+                segments[part].append((compiled.edges[route[start]][0], compiled.edges[route[end - 1]][1]))
+                segment_routes[part].append([compiled.edges[e] for e in route[start:end].tolist()])
+        return segments, segment_routes
+
+    def genetic_algorithm_optimize(self, generations=50, population_size=10, mutation_rate=0.1, seed=None,
+                                   trip_sampler=None, num_trips=None, resample_trips=True, warm_start_spread=0.05,
+                                   verbose=True):
+        # Optimizes every district and returns the merged plan scored on a
+        # city-wide trip sample as (best_solution, best_avg_velocity,
+        # best_avg_stops). num_trips city-wide trips (default 20 times the
+        # sampler's num_vehicles) are cut into the segment pools the district
+        # samples are drawn from. verbose=False leaves out the partition and
+        # per-round lines.
+        start_time = time.perf_counter()
+        compiled = self.network.get_compiled_network()
+        if trip_sampler is None:
+            trip_sampler = getattr(self.simulator, 'trip_sampler', None) or TripSampler()
+        root = np.random.SeedSequence(seed)
+        trip_seed, evaluation_seed = (int(state) for state in root.generate_state(2, np.uint64))
+        district_seeds = root.spawn(self.rounds * self.num_partitions)
+        owners = self.edge_owners(compiled)
+        pool_sampler = TripSampler(num_trips or 20 * trip_sampler.num_vehicles, trip_sampler.weighting, trip_sampler.stratified)
+        od_pairs = pool_sampler.sample(self.network, trip_seed).od_pairs
+        evaluation_sample = trip_sampler.sample(self.network, evaluation_seed)
+
+        districts = {}
+        for part in range(self.num_partitions):
+            network = self.district_network(compiled, owners, part)
+            simulator = self.simulator_factory(network) if self.simulator_factory is not None else self.district_simulator(network)
+            districts[part] = (network, simulator)
+        cut = int(sum(1 for (u, v), owner in zip(compiled.edges, owners.tolist()) if self.assignment[u] != owner))
+        if verbose:
+            print(f"Partitioned {compiled.num_nodes} nodes into {self.num_partitions} districts "
+                  f"({cut} of {compiled.num_edges} edges cross a boundary)")
+
+        workers = self.workers or min(self.num_partitions, os.cpu_count() or 1)
+        pool = multiprocessing.Pool(workers) if workers > 1 else None
+        plan = compiled.decode_genome(compiled.encode_solution({}, {})) # Current speed limits and signal plan
+        best = None
+        history = []
+        evaluations = 0
+        try:
+            for round_number in range(self.rounds):
+                routes = self.trip_routes(compiled, od_pairs, compiled.encode_solution(*plan))
+                segments, segment_routes = self.district_segments(compiled, owners, routes)
+                tasks = []
+                for part, (network, simulator) in districts.items():
+                    if not segments[part] or not network.get_compiled_network().num_genes:
+                        continue
+                    settings = {
+                        'generations': generations, 'population_size': population_size, 'mutation_rate': mutation_rate,
+                        'seed': int(district_seeds[round_number * self.num_partitions + part].generate_state(1, np.uint64)[0]),
+                        'trip_sampler': SegmentTripSampler(segments[part], trip_sampler.num_vehicles, (round_number, part),
+                                                           segment_routes[part]),
+                        'resample_trips': resample_trips}
+                    if round_number > 0:
+                        settings.update(warm_start=plan, warm_start_spread=warm_start_spread)
+                    tasks.append({'part': part, 'network': network, 'simulator': simulator, 'settings': settings})
+                results = pool.map(_optimize_district, tasks, chunksize=1) if pool is not None else [_optimize_district(task) for task in tasks]
+
+                speed_limits, traffic_light_cycles = dict(plan[0]), {light_node: dict(cycles) for light_node, cycles in plan[1].items()}
+                for part, (district_speeds, district_cycles), velocity, stops, run_stats in results:
+                    speed_limits.update(district_speeds)
+                    for light_node, cycles in district_cycles.items():
+                        traffic_light_cycles.setdefault(light_node, {}).update(cycles)
+                    evaluations += run_stats['evaluations']
+                plan = (speed_limits, traffic_light_cycles)
+                velocity, stops = self.simulator.evaluate_solution(*plan, trip_sample=evaluation_sample)
+                history.append({'round': round_number + 1, 'velocity': velocity, 'stops': stops,
+                                'segments': {part: len(pool_segments) for part, pool_segments in segments.items()}})
+                if verbose:
+                    print(f"Round {round_number + 1}/{self.rounds}: city-wide velocity {velocity:.2f}, stops {stops:.2f}")
+                if best is None or velocity - stops * 0.1 > best[1] - best[2] * 0.1:
+                    best = (plan, velocity, stops)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        self.run_stats = {
+            'evaluations': evaluations, 'rounds': history, 'cut_edges': cut, 'elapsed': time.perf_counter() - start_time,
+            'districts': [{'part': part, 'nodes': network.get_compiled_network().num_nodes,
+                           'genes': network.get_compiled_network().num_genes} for part, (network, simulator) in districts.items()],
+        }
+        return best
+
+    def district_simulator(self, network):
+        # Same simulator class and settings as the city-wide simulator
+        return self.simulator.for_network(network)
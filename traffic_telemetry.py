@@ -0,0 +1,172 @@
+
+import contextlib
+import json
+import time
+
+# Instrumentation for optimizer runs: phase timers, event counters and a
+# per-generation trace sent to pluggable sinks (any callable taking a dict,
+# e.g. JSONLinesSink). Instrumented code asks get_telemetry() for the active
+# Telemetry, which is NULL_TELEMETRY unless a run installed one with
+# use_telemetry(); its methods do nothing, so disabled instrumentation costs
+# a function call per phase. Work that only feeds a counter is guarded by
+# `telemetry.enabled`.
+#
+# Timers (seconds and calls per phase):
+#   trip_sampling, evaluation, selection, crossover, mutation   GA generation phases
+#   migration        island-model exchanges, including waiting for migrants
+#   screening        SurrogateModel prediction, training and pre-screening
+#   checkpoint       writing GA checkpoints
+#   path_finding     shortest-path tree builds and repairs
+#   travel_times     trip travel times (segment time plus signal delay)
+#   stop_sampling    stop counts or probabilities
+# Counters:
+#   evaluations                  genomes simulated (cache hits excluded)
+#   shortest_path_trees          single-source shortest-path trees built
+#   shortest_path_repairs        trees repaired by DynamicShortestPaths
+#   route_cache_hits / misses    RouteCache lookups served from / adding a stored tree
+#   fitness_cache_hits / misses  FitnessCache lookups
+#   no_path_trips                trips dropped because the destination is unreachable
+#   oversaturated_approaches     approach evaluations with x >= 1 or no green (infinite delay)
+#   simulation_errors            trips skipped because evaluating them raised
+#   surrogate_skipped            children the surrogate screened out without simulating
+# Counts from ParallelEvaluator worker processes stay in those processes.
+
+class _PhaseTimer:
+    __slots__ = ('telemetry', 'name', 'start')
+
+    def __init__(self, telemetry, name):
+        self.telemetry = telemetry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.telemetry.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+class Telemetry:
+    enabled = True
+
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+        self.counters = {}
+        self.timers = {} # name -> [seconds, calls]
+        self._last = ({}, {}, time.perf_counter()) # Totals at the previous generation record
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_time(self, name, seconds, calls=1):
+        timer = self.timers.get(name)
+        if timer is None:
+            self.timers[name] = [seconds, calls]
+        else:
+            timer[0] += seconds
+            timer[1] += calls
+
+    def timer(self, name):
+        # with telemetry.timer('crossover'): ...
+        return _PhaseTimer(self, name)
+
+    def error(self, where, exception):
+        self.count('simulation_errors')
+        self.emit({'type': 'error', 'where': where, 'error': f"{type(exception).__name__}: {exception}"})
+
+    def emit(self, record):
+        for sink in self.sinks:
+            sink(record)
+
+    def generation(self, stats):
+        # Emits one trace record: stats (see genetic_algorithm_optimize's
+        # progress argument) plus the time per phase and the counter
+        # increments since the previous record
+        last_counters, last_timers, last_time = self._last
+        now = time.perf_counter()
+        phases = {name: seconds - last_timers.get(name, (0, 0))[0] for name, (seconds, calls) in self.timers.items()}
+        calls = {name: calls - last_timers.get(name, (0, 0))[1] for name, (seconds, calls) in self.timers.items()}
+        counters = {name: value - last_counters.get(name, 0) for name, value in self.counters.items()}
+        evaluation_time = phases.get('evaluation', 0)
+        record = dict(stats, type='generation', wall_time=now - last_time,
+                      evaluations_per_sec=counters.get('evaluations', 0) / evaluation_time if evaluation_time > 0 else 0.0,
+                      phases=phases, calls=calls, counters=counters)
+        self._last = (dict(self.counters), {name: tuple(timer) for name, timer in self.timers.items()}, now)
+        self.emit(record)
+        return record
+
+    def summary(self):
+        return {'counters': dict(self.counters),
+                'phases': {name: {'seconds': seconds, 'calls': calls} for name, (seconds, calls) in self.timers.items()}}
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class NullTelemetry(Telemetry):
+    # Telemetry that records nothing
+    enabled = False
+
+    def __init__(self):
+        super().__init__()
+
+    def count(self, name, n=1):
+        pass
+
+    def add_time(self, name, seconds, calls=1):
+        pass
+
+    def timer(self, name):
+        return _NULL_TIMER
+
+    def error(self, where, exception):
+        pass
+
+    def emit(self, record):
+        pass
+
+    def generation(self, stats):
+        return None
+
+NULL_TELEMETRY = NullTelemetry()
+_active = NULL_TELEMETRY
+
+def get_telemetry():
+    return _active
+
+@contextlib.contextmanager
+def use_telemetry(telemetry):
+    # Makes telemetry the active instance for the duration of the block
+    global _active
+    previous = _active
+    _active = telemetry if telemetry is not None else NULL_TELEMETRY
+    try:
+        yield _active
+    finally:
+        _active = previous
+
+class JSONLinesSink:
+    # Appends every record to a JSON-lines file for offline analysis
+    def __init__(self, path, mode='a'):
+        self.file = open(path, mode)
+
+    def __call__(self, record):
+        self.file.write(json.dumps(record, default=float) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False